@@ -17,12 +17,14 @@ class LLMActionAgent(rule_agent_no_fsm.RuleAgentNoFSM):
         model: str,
         params: dict,
         max_action_history: int = 5,
+        llm=get_openai_llm_output,
     ) -> None:
         super().__init__(text_action_agent, cooking_world)
         self.action_in_progress: Union[Tuple[str, Dict], None] = ()
 
         self.model = model
         self.params = params
+        self.llm = llm
 
         self.act_turn = 1
         self.max_action_history = max_action_history
@@ -31,15 +33,13 @@ class LLMActionAgent(rule_agent_no_fsm.RuleAgentNoFSM):
 
     async def warm_start(self) -> None:
         # load models
-        return await get_openai_llm_output(
-            [{"role": "system", "content": "Hello! Who are you?"}], self.model, self.params
-        )
+        return await self.llm([{"role": "system", "content": "Hello! Who are you?"}], self.model, self.params)
 
     ## get action to take based on pre-defined rules (finite state machine) as well as assigned tasks
     async def get_action(self, scene: str) -> Tuple[str | Dict]:
         messages, goal_prompt = self.get_act_llm_input(scene)
 
-        action = await get_openai_llm_output(messages, self.model, self.params)
+        action = await self.llm(messages, self.model, self.params)
 
         if action:
             action = action.action
@@ -72,8 +72,14 @@ class LLMActionAgent(rule_agent_no_fsm.RuleAgentNoFSM):
 
         return action, goal_prompt
 
-    def store_result(self, result: str) -> None:
-        self.trajectory[-1]["Result"] = result
+    def store_result(self, result: str, index: int = -1) -> None:
+        self.trajectory[index]["Result"] = result
+
+    ## rule-based mid action for the gaps between LLM answers: the most urgent order, prepared without FSM patterns
+    def get_fallback_action(self, json_state: Dict) -> Tuple[str, Dict] | None:
+        orders = sorted(json_state["orders"], key=lambda x: x["remain_time"])
+        self.assigned_orders = [orders[0]["name"]] if orders else []
+        return super().get_action(json_state, enhanced=True)
 
     def get_message(self, json_state: Dict) -> str:
         raise NotImplementedError("ReActAgent does not support sending messages.")
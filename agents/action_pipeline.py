@@ -0,0 +1,169 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from agents.action_llm_agent import LLMActionAgent
+
+IN_PROGRESS = "In progress"
+REJECTED = "Rejected, not valid in the current state"
+
+
+class ActionPipelineStats:
+    """
+    Where the mid actions of an `ActionPipeline` came from, and the agent ticks spent without one.
+    """
+
+    def __init__(self) -> None:
+        self.llm_requests = 0
+        self.llm_used = 0
+        self.llm_rejected = 0
+        self.llm_empty = 0
+        self.llm_latency = 0.0
+        self.fallback_used = 0
+        self.ticks = 0
+        self.idle_ticks = 0
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def record_tick(self, idle: bool) -> None:
+        self.ticks += 1
+        if idle:
+            self.idle_ticks += 1
+
+    @property
+    def llm_answers(self) -> int:
+        return self.llm_used + self.llm_rejected + self.llm_empty
+
+    def as_dict(self) -> Dict:
+        return {
+            "llm_requests": self.llm_requests,
+            "llm_used": self.llm_used,
+            "llm_rejected": self.llm_rejected,
+            "llm_empty": self.llm_empty,
+            "llm_latency": self.llm_latency,
+            "fallback_used": self.fallback_used,
+            "ticks": self.ticks,
+            "idle_ticks": self.idle_ticks,
+        }
+
+    def __repr__(self) -> str:
+        mean_latency = self.llm_latency / self.llm_answers if self.llm_answers else 0.0
+        idle_share = self.idle_ticks / self.ticks if self.ticks else 0.0
+        return (
+            f"llm_requests={self.llm_requests} llm_used={self.llm_used} llm_rejected={self.llm_rejected} "
+            f"llm_empty={self.llm_empty} mean_latency={mean_latency:.2f}s fallback_used={self.fallback_used} "
+            f"idle_ticks={self.idle_ticks}/{self.ticks} ({idle_share:.1%})"
+        )
+
+
+class ActionPipeline:
+    """
+    Mid action selection of an `LLMActionAgent` that never waits for the LLM.
+
+    At most one LLM request is in flight. It is sent as soon as a mid action starts, with the scene at that time and
+    the running action marked as in progress in the agent trajectory, so that the answer is usually there when the
+    action ends. An answer is only used once the agent is free, and only if it is still a valid mid action in the state
+    at that time; otherwise it is recorded as rejected in the trajectory and a new request goes out. While there is no
+    usable answer, the rule-based `LLMActionAgent.get_fallback_action` picks the mid action.
+    """
+
+    def __init__(self, llm_agent: LLMActionAgent, fallback: bool = True) -> None:
+        self.llm_agent = llm_agent
+        self.fallback = fallback
+
+        self.request_task: asyncio.Task | None = None
+        self.answer: Tuple | None = None
+        # trajectory index of the running mid action, if it came from the LLM
+        self.running_index: int | None = None
+
+        self.responses: List[Dict] = []  # t, input, output, latency, used_at, status
+        self.stats = ActionPipelineStats()
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether an LLM answer is waiting to be checked.
+        """
+        return self.answer is not None or (self.request_task is not None and self.request_task.done())
+
+    def request(self, scene: str, t: int) -> None:
+        """
+        Ask the LLM for the next mid action in the background, unless a request or an answer is pending.
+        """
+        if self.request_task is None and self.answer is None:
+            self.request_task = asyncio.create_task(self._request(scene, t))
+            self.stats.llm_requests += 1
+
+    async def _request(self, scene: str, t: int) -> Tuple:
+        s_time = time.time()
+        mid_action, llm_input = await self.llm_agent.get_action(scene)
+        return mid_action, llm_input, len(self.llm_agent.trajectory) - 1, t, time.time() - s_time
+
+    def is_valid(self, mid_action: Tuple[str, Dict]) -> bool:
+        func, kwargs = mid_action
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        return kwargs in self.llm_agent.mid_planner.get_valid_mid_actions().get(func, [])
+
+    def select(self, scene: str, json_state: Dict, t: int) -> Tuple[Tuple[str, Dict] | None, str]:
+        """
+        Mid action for the free agent at step `t` and where it came from ("llm", "fallback" or "idle"). The next
+        request is sent with `scene` if none is pending.
+        """
+        if self.request_task is not None and self.request_task.done():
+            self.answer = self.request_task.result()
+            self.request_task = None
+
+        mid_action, source = None, "idle"
+        if self.answer is not None:
+            llm_action, llm_input, index, request_t, latency = self.answer
+            self.answer = None
+            self.stats.llm_latency += latency
+            if not llm_action:
+                status = "empty"
+                self.stats.llm_empty += 1
+            elif self.is_valid(llm_action):
+                status = "used"
+                self.stats.llm_used += 1
+                mid_action, source = llm_action, "llm"
+                self.running_index = index
+                self.llm_agent.store_result(IN_PROGRESS, index)
+            else:
+                status = "rejected"
+                self.stats.llm_rejected += 1
+                self.llm_agent.store_result(REJECTED, index)
+                logger.debug(f"LLM action {llm_action} from step {request_t} rejected at step {t}")
+            self.responses.append(
+                {
+                    "t": request_t,
+                    "input": llm_input,
+                    "output": str(llm_action),
+                    "latency": latency,
+                    "used_at": t,
+                    "status": status,
+                }
+            )
+
+        if mid_action is None and self.fallback:
+            mid_action = self.llm_agent.get_fallback_action(json_state)
+            if mid_action:
+                source = "fallback"
+                self.stats.fallback_used += 1
+
+        self.request(scene, t)
+        return mid_action, source
+
+    def finish(self, result: str) -> None:
+        """
+        Record the result of the running mid action, "Success" or "Failed", if it came from the LLM.
+        """
+        if self.running_index is not None:
+            self.llm_agent.store_result(result, self.running_index)
+            self.running_index = None
+
+    def close(self) -> None:
+        if self.request_task is not None:
+            self.request_task.cancel()
+            self.request_task = None
@@ -1,5 +1,8 @@
 import random
+import time
 from collections import defaultdict
+from functools import partial
+from types import MappingProxyType
 from typing import Callable, Dict, List, Tuple, Union
 
 from gym_cooking.cooking_world.cooking_world import CookingWorld
@@ -8,6 +11,8 @@ from loguru import logger
 from rich.pretty import pretty_repr
 
 from agents.text_agent import TextAgent
+from utils.cache_stats import CacheStats
+from utils.lazy_log import lazy
 
 
 # MARK: Have not considered whether the target is blocked by human yet.
@@ -157,6 +162,22 @@ def get_occupy_counter(agent: TextAgent, world: CookingWorld) -> List[Counter]:
     return agent.get_objects("Counter", check=lambda x: len(world.get_objects_at(x.location)) > 1)
 
 
+def freeze_forward_index(forward_index: Dict) -> MappingProxyType:
+    """
+    Read-only view of a forward index, candidate lists become tuples.
+    """
+    return MappingProxyType(
+        {
+            key: (
+                freeze_forward_index(value)
+                if isinstance(value, dict)
+                else tuple(value) if isinstance(value, list) else value
+            )
+            for key, value in forward_index.items()
+        }
+    )
+
+
 class MidPlanner:
     valid_actions = {
         "prepare": [
@@ -187,721 +208,731 @@ class MidPlanner:
         "clean_a_counter": [{"center": False}, {"center": True}],
     }
 
-    def __init__(self, agent: TextAgent, world: CookingWorld, max_n_try: int = 10):
-        self.text_agent = agent
-        self.agent = agent.agent
-        self.agent_idx = self.text_agent.agent_idx
-        self.world = world
-        self.prev_subtasks: List[str] = []
-        self.prev_task: tuple = None
-        self.max_n_try = max_n_try
-
-        self._assemble_prev_recipes: List[Tuple[str]] = []
-
-        # Two methods to check state: valid action, check function
-        self._prepare_process = {
-            "Lettuce": {
-                True: [  # priority
-                    [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_cutboard_available(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done_from_cutboard",
-                        (
-                            "get_lettuce_from_station",
-                            lambda: is_cutboard_available(self.text_agent, self.world),
-                            (),
-                        ),
-                        "put_onto_cutboard",
-                        "chop_lettuce",
-                        (
-                            "get_plate_from_station",
-                            is_cutboard_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done_from_cutboard",
-                    ],
-                    [
-                        "chop_lettuce",
-                        (
-                            "get_plate_from_station",
-                            is_cutboard_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done_from_cutboard",
-                    ],
-                    [
-                        (
-                            "get_lettuce_from_station",
-                            lambda: is_cutboard_available(self.text_agent, self.world),
-                            (),
-                        ),
-                        "put_onto_cutboard",
-                        "chop_lettuce",
-                        (
-                            "get_plate_from_station",
-                            is_cutboard_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done_from_cutboard",
-                    ],
+    # Two methods to check state: valid action, check function
+    _prepare_process = {
+        "Lettuce": {
+            True: [  # priority
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_cutboard_available(agent, world),
+                        (),
+                    ),
+                    "plate_lettuce_done_from_cutboard",
+                    (
+                        "get_lettuce_from_station",
+                        is_cutboard_available,
+                        (),
+                    ),
+                    "put_onto_cutboard",
+                    "chop_lettuce",
+                    (
+                        "get_plate_from_station",
+                        is_cutboard_ready,
+                        (),
+                    ),
+                    "plate_lettuce_done_from_cutboard",
                 ],
-                False: [
-                    [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_cutboard_available(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done_from_cutboard",
-                        (
-                            "get_lettuce_from_station",
-                            lambda: is_cutboard_available(self.text_agent, self.world),
-                            (),
-                        ),
-                        "put_onto_cutboard",
-                        "chop_lettuce",
-                    ],
+                [
+                    "chop_lettuce",
+                    (
+                        "get_plate_from_station",
+                        is_cutboard_ready,
+                        (),
+                    ),
+                    "plate_lettuce_done_from_cutboard",
+                ],
+                [
+                    (
+                        "get_lettuce_from_station",
+                        is_cutboard_available,
+                        (),
+                    ),
+                    "put_onto_cutboard",
+                    "chop_lettuce",
+                    (
+                        "get_plate_from_station",
+                        is_cutboard_ready,
+                        (),
+                    ),
+                    "plate_lettuce_done_from_cutboard",
+                ],
+            ],
+            False: [
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_cutboard_available(agent, world),
+                        (),
+                    ),
+                    "plate_lettuce_done_from_cutboard",
+                    (
+                        "get_lettuce_from_station",
+                        is_cutboard_available,
+                        (),
+                    ),
+                    "put_onto_cutboard",
+                    "chop_lettuce",
+                ],
+                [
+                    "chop_lettuce",
+                ],
+                [
+                    (
+                        "get_lettuce_from_station",
+                        is_cutboard_available,
+                        (),
+                    ),
+                    "put_onto_cutboard",
+                    "chop_lettuce",
+                ],
+            ],
+        },
+        "Beef": {
+            True: [
+                [
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                    (
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
+                    ),
+                    "plate_beef_done_from_pan",
+                ],
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_pan_available(agent, world)
+                        and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
+                        (),
+                    ),
+                    "plate_beef_overcooked_from_pan",
+                    "drop_food",
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                    (
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
+                    ),
+                    "plate_beef_done_from_pan",
+                ],
+                [  # no dustbin
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_pan_available(agent, world)
+                        and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
+                        (),
+                    ),
+                    "plate_beef_overcooked_from_pan",
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                    (
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
+                    ),
+                    "plate_beef_done_from_pan",
+                ],
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_pan_available(agent, world) and is_pan_ready(agent, world),
+                        (),
+                    ),
+                    "plate_beef_done_from_pan",
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                    (
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
+                    ),
+                    "plate_beef_done_from_pan",
+                ],
+            ],
+            False: [
+                [
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                ],
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_pan_available(agent, world)
+                        and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
+                        (),
+                    ),
+                    "plate_beef_overcooked_from_pan",
+                    "drop_food",
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                ],
+                [  # no dustbin
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_pan_available(agent, world)
+                        and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
+                        (),
+                    ),
+                    "plate_beef_overcooked_from_pan",
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                ],
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: not is_pan_available(agent, world) and is_pan_ready(agent, world),
+                        (),
+                    ),
+                    "plate_beef_done_from_pan",
+                    (
+                        "get_beef_from_station",
+                        is_pan_available,
+                        (),
+                    ),
+                    "put_onto_pan",
+                ],
+            ],
+        },
+        "Bread": {
+            True: [
+                [
+                    "get_bread_from_station",
+                    "put_onto_plate",
+                ],
+                [
+                    "get_bread_from_station",
+                    "put_onto_counter",
+                    (
+                        "get_plate_from_station",
+                        is_ingredients_available,
+                        (["Bread"], [""]),
+                    ),
+                    "plate_bread",
+                ],
+            ],
+            False: [
+                [
+                    "get_bread_from_station",
+                ]
+            ],
+        },
+    }
+
+    # MARK: priority, first bread on counter, then no bread on counter
+    _num_assemble_process = {
+        "LettuceBurger": {
+            ("Lettuce",): 7,
+        },
+        "BeefBurger": {
+            ("Beef",): 8,
+        },
+        "BeefLettuceBurger": {
+            ("Beef", "LettuceBurger"): 4,
+            ("BeefLettuce",): 3,
+            ("BeefBurger", "Lettuce"): 1,
+        },
+        "BeefLettuce": {
+            ("Beef", "Lettuce"): 4,
+        },
+    }
+    food_ingredients_index = {
+        "LettuceBurger": {
+            (): [("LettuceBurger", ["Lettuce"], ["done"])],
+            (
+                (
+                    "LettuceBurger",
+                    ("Lettuce",),
+                ),
+            ): True,
+        },
+        "BeefBurger": {
+            (): [
+                (
+                    "BeefBurger",
+                    ["Beef"],
                     [
-                        "chop_lettuce",
+                        lambda agent, world, x: is_pan_ready(agent, world) or agent.is_target_status(x, "done"),
                     ],
+                ),
+            ],
+            (
+                (
+                    "BeefBurger",
+                    ("Beef",),
+                ),
+            ): True,
+        },
+        "BeefLettuce": {
+            (): [
+                (
+                    "BeefLettuce",
+                    ["Beef", "Lettuce"],
                     [
-                        (
-                            "get_lettuce_from_station",
-                            lambda: is_cutboard_available(self.text_agent, self.world),
-                            (),
-                        ),
-                        "put_onto_cutboard",
-                        "chop_lettuce",
+                        lambda agent, world, x: is_pan_ready(agent, world) or agent.is_target_status(x, "done"),
+                        "done",
                     ],
-                ],
-            },
-            "Beef": {
-                True: [
+                ),  # make a BeefLettuce\
+            ],
+            (("BeefLettuce", ("Beef", "Lettuce")),): True,
+        },
+        "BeefLettuceBurger": {
+            (): [
+                (
+                    "BeefLettuce",
+                    ["Beef", "Lettuce"],
                     [
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done_from_pan",
-                    ],
+                        lambda agent, world, x: is_pan_ready(agent, world),
+                        "done",
+                    ],  # make a BeefLettuce
+                ),
+                (
+                    (
+                        "BeefBurger",
+                        # other conditions except for available ingredients for making this burger
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"]),
+                    ),
                     [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_pan_available(agent, world)
-                            and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_overcooked_from_pan",
-                        "drop_food",
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done_from_pan",
-                    ],
-                    [  # no dustbin
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_pan_available(agent, world)
-                            and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_overcooked_from_pan",
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done_from_pan",
+                        "Beef",
                     ],
                     [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_pan_available(agent, world) and is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done_from_pan",
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done_from_pan",
+                        lambda agent, world, x: is_pan_ready(agent, world),
                     ],
-                ],
-                False: [
+                ),
+                (
+                    "BeefLettuceBurger",
+                    ["Beef", "LettuceBurger"],
+                    [lambda agent, world, x: is_pan_ready(agent, world), ""],
+                ),
+                (
+                    "BeefLettuce",
+                    ["Beef", "Lettuce"],
                     [
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
+                        "done",
+                        "done",
                     ],
+                ),  # make a BeefLettuce
+                ("BeefLettuceBurger", ["BeefLettuce"], [""]),
+                (
+                    (
+                        "BeefBurger",
+                        # other conditions except for available ingredients for making this burger
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"]),
+                    ),
                     [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_pan_available(agent, world)
-                            and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_overcooked_from_pan",
-                        "drop_food",
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
-                    ],
-                    [  # no dustbin
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_pan_available(agent, world)
-                            and is_ingredients_available(agent, world, ["Beef"], ["overcooked"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_overcooked_from_pan",
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
+                        "Beef",
                     ],
                     [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: not is_pan_available(agent, world) and is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done_from_pan",
-                        (
-                            "get_beef_from_station",
-                            is_pan_available,
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_pan",
+                        "done",
                     ],
+                ),
+                (
+                    (
+                        "LettuceBurger",
+                        # other conditions except for available ingredients for making this burger
+                        lambda agent, world: is_ingredients_available(agent, world, ["Beef"], ["done"]),
+                    ),
+                    ["Lettuce"],
+                    ["done"],
+                ),
+                ("BeefLettuceBurger", ["BeefBurger", "Lettuce"], ["", "done"]),
+                ("BeefLettuceBurger", ["Beef", "LettuceBurger"], ["done", ""]),
+            ],
+            (("BeefLettuce", ("Beef", "Lettuce")),): [("BeefLettuceBurger", ["BeefLettuce"], [""])],
+            (
+                ("BeefLettuce", ("Beef", "Lettuce")),
+                ("BeefLettuceBurger", ("BeefLettuce",)),
+            ): True,
+            (("BeefBurger", ("Beef",)),): [("BeefLettuceBurger", ["BeefBurger", "Lettuce"], ["", "done"])],
+            (
+                ("BeefBurger", ("Beef",)),
+                ("BeefLettuceBurger", ("BeefBurger", "Lettuce")),
+            ): True,
+            (("LettuceBurger", ("Lettuce",)),): [("BeefLettuceBurger", ["Beef", "LettuceBurger"], ["done", ""])],
+            (
+                ("LettuceBurger", ("Lettuce",)),
+                ("BeefLettuceBurger", ("Beef", "LettuceBurger")),
+            ): True,
+            (("BeefLettuceBurger", ("BeefBurger", "Lettuce")),): True,
+            (("BeefLettuceBurger", ("BeefLettuce",)),): True,
+            (("BeefLettuceBurger", ("Beef", "LettuceBurger")),): True,
+        },
+    }
+    food_ingredients_urgency = {
+        "LettuceBurger": {},
+        "BeefBurger": {},
+        "BeefLettuce": {},
+        "BeefLettuceBurger": {(): [1, 1, 1, 2, 2, 2, 2, 2, 2]},
+    }
+    _assemble_process = {
+        "LettuceBurger": {
+            ("Lettuce",): [
+                [
+                    (
+                        "pickup_bread_in_plate",
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"]),
+                        (),
+                    ),
+                    "plate_lettuce_done",
                 ],
-            },
-            "Bread": {
-                True: [
-                    [
+                [
+                    (
                         "get_bread_from_station",
-                        "put_onto_plate",
-                    ],
-                    [
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
+                        (),
+                    ),
+                    "put_onto_plate_with_lettuce",
+                ],
+                [  # change to pickup bread
+                    (
                         "get_bread_from_station",
-                        "put_onto_counter",
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
+                        (),
+                    ),
+                    "plate_lettuce_done",
+                ],
+                [
+                    (
+                        "pickup_lettuce_in_plate",
+                        is_ingredients_available,
                         (
-                            "get_plate_from_station",
-                            is_ingredients_available,
-                            (self.text_agent, self.world, ["Bread"], [""]),
+                            ["Lettuce", "Bread"],
+                            ["in_plate", ""],
                         ),
-                        "plate_bread",
-                    ],
+                    ),
+                    "plate_bread",
                 ],
-                False: [
-                    [
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"])
+                        and not is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
+                        (),
+                    ),
+                    "plate_lettuce_done",
+                    "plate_bread",
+                ],
+                [
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"])
+                        and not is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
+                        (),
+                    ),
+                    "plate_lettuce_done",
+                    (
                         "get_bread_from_station",
-                    ]
+                        is_ingredients_available,
+                        (["Lettuce"], ["in_plate"]),
+                    ),
+                    "put_onto_plate_with_lettuce",
+                ],
+                [  # change to pickup bread
+                    (
+                        "get_plate_from_station",
+                        lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"])
+                        and not is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
+                        (),
+                    ),
+                    "plate_lettuce_done",
+                    (
+                        "get_bread_from_station",
+                        is_ingredients_available,
+                        (["Lettuce"], ["done"]),
+                    ),
+                    "plate_lettuce_done",
+                ],
+            ],
+        },
+        "BeefBurger": {
+            ("Beef",): [
+                [
+                    (
+                        "pickup_bread_in_plate",
+                        is_closest_to_ready_pan,
+                        ("Bread", "in_plate"),
+                    ),
+                    "plate_beef_done_from_pan",
+                ],
+                [
+                    (
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
+                    ),
+                    "plate_beef_done_from_pan",
+                    "plate_bread",
                 ],
-            },
-        }
-        assert self._check_process(self._prepare_process)
-        self._prepare_process_forward_index = self._processes_transform(self._prepare_process)
-        logger.trace("\n" + pretty_repr(self._prepare_process_forward_index))
-
-        # MARK: priority, first bread on counter, then no bread on counter
-        self._num_assemble_process = {
-            "LettuceBurger": {
-                ("Lettuce",): 7,
-            },
-            "BeefBurger": {
-                ("Beef",): 8,
-            },
-            "BeefLettuceBurger": {
-                ("Beef", "LettuceBurger"): 4,
-                ("BeefLettuce",): 3,
-                ("BeefBurger", "Lettuce"): 1,
-            },
-            "BeefLettuce": {
-                ("Beef", "Lettuce"): 4,
-            },
-        }
-        self.food_ingredients_index = {
-            "LettuceBurger": {
-                (): [("LettuceBurger", ["Lettuce"], ["done"])],
-                (
+                [
                     (
-                        "LettuceBurger",
-                        ("Lettuce",),
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
                     ),
-                ): True,
-            },
-            "BeefBurger": {
-                (): [
+                    "plate_beef_done_from_pan",
                     (
-                        "BeefBurger",
-                        ["Beef"],
-                        [
-                            lambda x: is_pan_ready(self.text_agent, self.world)
-                            or self.text_agent.is_target_status(x, "done"),
-                        ],
+                        "get_bread_from_station",
+                        is_ingredients_available,
+                        (["Beef"], ["in_plate"]),
                     ),
+                    "put_onto_plate_with_beef",
                 ],
-                (
+                [  # change to pickup
                     (
-                        "BeefBurger",
-                        ("Beef",),
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
                     ),
-                ): True,
-            },
-            "BeefLettuce": {
-                (): [
+                    "plate_beef_done_from_pan",
                     (
-                        "BeefLettuce",
-                        ["Beef", "Lettuce"],
-                        [
-                            lambda x: is_pan_ready(self.text_agent, self.world)
-                            or self.text_agent.is_target_status(x, "done"),
-                            "done",
-                        ],
-                    ),  # make a BeefLettuce\
+                        "get_bread_from_station",
+                        is_ingredients_available,
+                        (["Beef"], ["in_plate"]),
+                    ),
+                    "plate_beef_done",
                 ],
-                (("BeefLettuce", ("Beef", "Lettuce")),): True,
-            },
-            "BeefLettuceBurger": {
-                (): [
+                [
                     (
-                        "BeefLettuce",
-                        ["Beef", "Lettuce"],
-                        [
-                            lambda x: is_pan_ready(self.text_agent, self.world),
-                            "done",
-                        ],  # make a BeefLettuce
+                        "pickup_bread_in_plate",
+                        lambda agent, world: not is_pan_ready(agent, world),
+                        (),
                     ),
+                    "plate_beef_done",
+                ],
+                [
                     (
+                        "pickup_beef_done",
+                        lambda agent, world, ingredients, status_list: is_ingredients_available(
+                            agent, world, ingredients, status_list
+                        )
+                        and not is_pan_ready(agent, world),
                         (
-                            "BeefBurger",
-                            lambda: is_ingredients_available(
-                                self.text_agent, self.world, ["Lettuce"], ["done"]
-                            ),  # other conditions except for available ingredients for making this burger
+                            ["Beef", "Bread"],
+                            ["in_plate", ""],
                         ),
-                        [
-                            "Beef",
-                        ],
-                        [
-                            lambda x: is_pan_ready(self.text_agent, self.world),
-                        ],
                     ),
+                    "plate_bread",
+                ],
+                [
+                    (
+                        "get_bread_from_station",
+                        lambda agent, world: is_ingredients_available(agent, world, ["Beef"], ["in_plate"])
+                        and not is_pan_ready(agent, world),
+                        (),
+                    ),
+                    "put_onto_plate_with_beef",
+                ],
+                [
                     (
-                        "BeefLettuceBurger",
-                        ["Beef", "LettuceBurger"],
-                        [lambda x: is_pan_ready(self.text_agent, self.world), ""],
+                        "get_bread_from_station",
+                        lambda agent, world: is_ingredients_available(agent, world, ["Beef"], ["in_plate"])
+                        and not is_pan_ready(agent, world),
+                        (),
                     ),
+                    "plate_beef_done",
+                ],
+            ]
+        },
+        "BeefLettuce": {
+            ("Beef", "Lettuce"): [
+                [
                     (
-                        "BeefLettuce",
-                        ["Beef", "Lettuce"],
-                        [
-                            "done",
-                            "done",
-                        ],
-                    ),  # make a BeefLettuce
-                    ("BeefLettuceBurger", ["BeefLettuce"], [""]),
+                        "pickup_lettuce_in_plate",
+                        is_closest_to_ready_pan,
+                        ("Lettuce", "in_plate"),
+                    ),
+                    "plate_beef_done_from_pan",
+                ],
+                [
                     (
-                        (
-                            "BeefBurger",
-                            lambda: is_ingredients_available(
-                                self.text_agent, self.world, ["Lettuce"], ["done"]
-                            ),  # other conditions except for available ingredients for making this burger
-                        ),
-                        [
-                            "Beef",
-                        ],
-                        [
-                            "done",
-                        ],
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
                     ),
                     (
-                        (
-                            "LettuceBurger",
-                            lambda: is_ingredients_available(
-                                self.text_agent, self.world, ["Beef"], ["done"]
-                            ),  # other conditions except for available ingredients for making this burger
-                        ),
-                        ["Lettuce"],
-                        ["done"],
+                        "plate_beef_done_from_pan",
+                        is_ingredients_available,
+                        (["Lettuce"], ["done"]),
                     ),
-                    ("BeefLettuceBurger", ["BeefBurger", "Lettuce"], ["", "done"]),
-                    ("BeefLettuceBurger", ["Beef", "LettuceBurger"], ["done", ""]),
+                    "plate_lettuce_done",
                 ],
-                (("BeefLettuce", ("Beef", "Lettuce")),): [("BeefLettuceBurger", ["BeefLettuce"], [""])],
-                (
-                    ("BeefLettuce", ("Beef", "Lettuce")),
-                    ("BeefLettuceBurger", ("BeefLettuce",)),
-                ): True,
-                (("BeefBurger", ("Beef",)),): [("BeefLettuceBurger", ["BeefBurger", "Lettuce"], ["", "done"])],
-                (
-                    ("BeefBurger", ("Beef",)),
-                    ("BeefLettuceBurger", ("BeefBurger", "Lettuce")),
-                ): True,
-                (("LettuceBurger", ("Lettuce",)),): [("BeefLettuceBurger", ["Beef", "LettuceBurger"], ["done", ""])],
-                (
-                    ("LettuceBurger", ("Lettuce",)),
-                    ("BeefLettuceBurger", ("Beef", "LettuceBurger")),
-                ): True,
-                (("BeefLettuceBurger", ("BeefBurger", "Lettuce")),): True,
-                (("BeefLettuceBurger", ("BeefLettuce",)),): True,
-                (("BeefLettuceBurger", ("Beef", "LettuceBurger")),): True,
-            },
-        }
-        self.food_ingredients_urgency = {
-            "LettuceBurger": {},
-            "BeefBurger": {},
-            "BeefLettuce": {},
-            "BeefLettuceBurger": {(): [1, 1, 1, 2, 2, 2, 2, 2, 2]},
-        }
-        self._assemble_process = {
-            "LettuceBurger": {
-                ("Lettuce",): [
-                    [
-                        (
-                            "pickup_bread_in_plate",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done",
-                    ],
-                    [
-                        (
-                            "get_bread_from_station",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_plate_with_lettuce",
-                    ],
-                    [  # change to pickup bread
-                        (
-                            "get_bread_from_station",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done",
-                    ],
-                    [
-                        (
-                            "pickup_lettuce_in_plate",
-                            is_ingredients_available,
-                            (
-                                self.text_agent,
-                                self.world,
-                                ["Lettuce", "Bread"],
-                                ["in_plate", ""],
-                            ),
-                        ),
-                        "plate_bread",
-                    ],
-                    [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"])
-                            and not is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done",
-                        "plate_bread",
-                    ],
-                    [
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["done"])
-                            and not is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done",
-                        (
-                            "get_bread_from_station",
-                            is_ingredients_available,
-                            (self.text_agent, self.world, ["Lettuce"], ["in_plate"]),
-                        ),
-                        "put_onto_plate_with_lettuce",
-                    ],
-                    [  # change to pickup bread
-                        (
-                            "get_plate_from_station",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"])
-                            and not is_ingredients_available(agent, world, ["Lettuce"], ["in_plate"]),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done",
-                        (
-                            "get_bread_from_station",
-                            is_ingredients_available,
-                            (self.text_agent, self.world, ["Lettuce"], ["done"]),
-                        ),
-                        "plate_lettuce_done",
-                    ],
+                [
+                    (
+                        "pickup_lettuce_in_plate",
+                        lambda agent, world: not is_pan_ready(agent, world),
+                        (),
+                    ),
+                    "plate_beef_done",
                 ],
-            },
-            "BeefBurger": {
-                ("Beef",): [
-                    [
-                        (
-                            "pickup_bread_in_plate",
-                            is_closest_to_ready_pan,
-                            (self.text_agent, self.world, "Bread", "in_plate"),
-                        ),
-                        "plate_beef_done_from_pan",
-                    ],
-                    [
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (
-                                self.text_agent,
-                                self.world,
-                            ),
-                        ),
-                        "plate_beef_done_from_pan",
-                        "plate_bread",
-                    ],
-                    [
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (
-                                self.text_agent,
-                                self.world,
-                            ),
-                        ),
-                        "plate_beef_done_from_pan",
-                        (
-                            "get_bread_from_station",
-                            is_ingredients_available,
-                            (self.text_agent, self.world, ["Beef"], ["in_plate"]),
-                        ),
-                        "put_onto_plate_with_beef",
-                    ],
-                    [  # change to pickup
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (
-                                self.text_agent,
-                                self.world,
-                            ),
-                        ),
-                        "plate_beef_done_from_pan",
-                        (
-                            "get_bread_from_station",
-                            is_ingredients_available,
-                            (self.text_agent, self.world, ["Beef"], ["in_plate"]),
-                        ),
-                        "plate_beef_done",
-                    ],
-                    [
-                        (
-                            "pickup_bread_in_plate",
-                            lambda agent, world: not is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done",
-                    ],
-                    [
-                        (
-                            "pickup_beef_done",
-                            lambda agent, world, ingredients, status_list: is_ingredients_available(
-                                agent, world, ingredients, status_list
-                            )
-                            and not is_pan_ready(agent, world),
-                            (
-                                self.text_agent,
-                                self.world,
-                                ["Beef", "Bread"],
-                                ["in_plate", ""],
-                            ),
-                        ),
-                        "plate_bread",
-                    ],
-                    [
-                        (
-                            "get_bread_from_station",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Beef"], ["in_plate"])
-                            and not is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "put_onto_plate_with_beef",
-                    ],
-                    [
-                        (
-                            "get_bread_from_station",
-                            lambda agent, world: is_ingredients_available(agent, world, ["Beef"], ["in_plate"])
-                            and not is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done",
-                    ],
-                ]
-            },
-            "BeefLettuce": {
-                ("Beef", "Lettuce"): [
-                    [
-                        (
-                            "pickup_lettuce_in_plate",
-                            is_closest_to_ready_pan,
-                            (self.text_agent, self.world, "Lettuce", "in_plate"),
-                        ),
-                        "plate_beef_done_from_pan",
-                    ],
-                    [
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        (
-                            "plate_beef_done_from_pan",
-                            is_ingredients_available,
-                            (self.text_agent, self.world, ["Lettuce"], ["done"]),
-                        ),
-                        "plate_lettuce_done",
-                    ],
-                    [
-                        (
-                            "pickup_lettuce_in_plate",
-                            lambda agent, world: not is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done",
-                    ],
-                    [
-                        (
-                            "pickup_beef_done",
-                            lambda agent, world: not is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuce_done",
-                    ],
+                [
+                    (
+                        "pickup_beef_done",
+                        lambda agent, world: not is_pan_ready(agent, world),
+                        (),
+                    ),
+                    "plate_lettuce_done",
                 ],
-            },
-            "BeefLettuceBurger": {
-                ("Beef", "LettuceBurger"): [
-                    [
-                        (
-                            "pickup_lettuceburger",
-                            is_closest_to_ready_pan,
-                            (self.text_agent, self.world, "LettuceBurger", ""),
-                        ),
+            ],
+        },
+        "BeefLettuceBurger": {
+            ("Beef", "LettuceBurger"): [
+                [
+                    (
+                        "pickup_lettuceburger",
+                        is_closest_to_ready_pan,
+                        ("LettuceBurger", ""),
+                    ),
+                    "plate_beef_done_from_pan",
+                ],
+                [
+                    (
+                        "get_plate_from_station",
+                        is_pan_ready,
+                        (),
+                    ),
+                    (
                         "plate_beef_done_from_pan",
-                    ],
-                    [
-                        (
-                            "get_plate_from_station",
-                            is_pan_ready,
-                            (self.text_agent, self.world),
-                        ),
-                        (
-                            "plate_beef_done_from_pan",
-                            is_ingredients_available,
-                            (agent, world, ["LettuceBurger"], [""]),
-                        ),
-                        "plate_lettuceburger",
-                    ],
-                    [
-                        (
-                            "pickup_lettuceburger",
-                            lambda agent, world: not is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_beef_done",
-                    ],
-                    [
-                        (
-                            "pickup_beef_done",
-                            lambda agent, world: not is_pan_ready(agent, world),
-                            (self.text_agent, self.world),
-                        ),
-                        "plate_lettuceburger",
-                    ],
+                        is_ingredients_available,
+                        (["LettuceBurger"], [""]),
+                    ),
+                    "plate_lettuceburger",
                 ],
-                ("BeefLettuce",): [
-                    [
-                        "get_bread_from_station",
-                        "put_onto_plate_with_beeflettuce",
-                    ],
-                    [
-                        "get_bread_from_station",
-                        "plate_beeflettuce",
-                    ],  # change to pickup
-                    [
-                        (
-                            "pickup_beeflettuce",
-                            is_ingredients_available,
-                            (self.text_agent, self.world, ["Bread"], [""]),
-                        ),
-                        "plate_bread",
-                    ],
+                [
+                    (
+                        "pickup_lettuceburger",
+                        lambda agent, world: not is_pan_ready(agent, world),
+                        (),
+                    ),
+                    "plate_beef_done",
+                ],
+                [
+                    (
+                        "pickup_beef_done",
+                        lambda agent, world: not is_pan_ready(agent, world),
+                        (),
+                    ),
+                    "plate_lettuceburger",
                 ],
-                ("BeefBurger", "Lettuce"): [
-                    ["pickup_beefburger", "plate_lettuce_done"],
+            ],
+            ("BeefLettuce",): [
+                [
+                    "get_bread_from_station",
+                    "put_onto_plate_with_beeflettuce",
                 ],
-            },
-        }
+                [
+                    "get_bread_from_station",
+                    "plate_beeflettuce",
+                ],  # change to pickup
+                [
+                    (
+                        "pickup_beeflettuce",
+                        is_ingredients_available,
+                        (["Bread"], [""]),
+                    ),
+                    "plate_bread",
+                ],
+            ],
+            ("BeefBurger", "Lettuce"): [
+                ["pickup_beefburger", "plate_lettuce_done"],
+            ],
+        },
+    }
 
-        assert self._check_process(self._assemble_process)
-        for burger, ingredients_dict in self._num_assemble_process.items():
-            for ingredient, num in ingredients_dict.items():
-                assert (
-                    len(self._assemble_process[burger][ingredient]) == num
-                ), f"num error in processes for assemble {burger} using {ingredient}"
-        self._assemble_process_forward_index = self._processes_transform(self._assemble_process)
-        logger.trace("\n" + pretty_repr(self._assemble_process_forward_index))
-        logger.trace("\n" + pretty_repr(self.food_ingredients_index))
+    _serve_process = {
+        food: [["pickup_" + CapToText[food], "deliver"]]
+        for food in ["BeefBurger", "LettuceBurger", "BeefLettuceBurger"]
+    }
+    _putout_fire_process = {"fire": [[("pickup_fireextinguisher", is_on_fire, ()), "put_out_fire"]]}
+
+    def __init__(self, agent: TextAgent, world: CookingWorld, max_n_try: int = 10):
+        self.text_agent = agent
+        self.agent = agent.agent
+        self.agent_idx = self.text_agent.agent_idx
+        self.world = world
+        self.prev_subtasks: List[str] = []
+        self.prev_task: tuple = None
+        self.max_n_try = max_n_try
+
+        self._assemble_prev_recipes: List[Tuple[str]] = []
+
+        # get_valid_mid_actions runs every planner, so it is memoized on the world fingerprint
+        self._valid_mid_actions_key = None
+        self._valid_mid_actions = None
+        self.valid_mid_actions_stats = CacheStats()
 
+        # per-call tables built from the request parameters
         self._pass_on_process_forward_index = {}
-        self._serve_process_forward_index = {}
-        self._putout_fire_forward_index = {}
         self._clean_a_counter_forward_index = {}
 
+        self._compile_processes()
+
         # with open("examples/mid_valid_actions.json", "w", encoding="utf-8") as f:
         #     json.dump(self.valid_actions, f)
 
+    @classmethod
+    def _compile_processes(cls):
+        """
+        Check the process specifications and build their forward indexes. Runs once per class, the compiled tables
+        are shared read-only by every planner instance; predicates get the agent and world when they are called.
+        """
+        if "_prepare_process_forward_index" in cls.__dict__:
+            return
+        assert cls._check_process(cls._prepare_process)
+        cls._prepare_process_forward_index = freeze_forward_index(cls._processes_transform(cls._prepare_process))
+        lazy.trace("\n{}", lambda: pretty_repr(cls._prepare_process_forward_index))
+
+        assert cls._check_process(cls._assemble_process)
+        for burger, ingredients_dict in cls._num_assemble_process.items():
+            for ingredient, num in ingredients_dict.items():
+                assert (
+                    len(cls._assemble_process[burger][ingredient]) == num
+                ), f"num error in processes for assemble {burger} using {ingredient}"
+        cls._assemble_process_forward_index = freeze_forward_index(cls._processes_transform(cls._assemble_process))
+        lazy.trace("\n{}", lambda: pretty_repr(cls._assemble_process_forward_index))
+        lazy.trace("\n{}", lambda: pretty_repr(cls.food_ingredients_index))
+
+        assert cls._check_process(cls._serve_process)
+        cls._serve_process_forward_index = freeze_forward_index(cls._processes_transform(cls._serve_process))
+        assert cls._check_process(cls._putout_fire_process)
+        cls._putout_fire_forward_index = freeze_forward_index(cls._processes_transform(cls._putout_fire_process))
+
     def update(self, agent: TextAgent, world: CookingWorld):
         self.text_agent = agent
         self.agent = agent.agent
         self.agent_idx = self.text_agent.agent_idx
         self.world = world
+        self._valid_mid_actions_key = None
+        self._valid_mid_actions = None
 
     def reset(self):
         self.prev_subtasks: List[str] = []
@@ -909,6 +940,16 @@ class MidPlanner:
         self._assemble_prev_recipes: List[Tuple[str]] = []
 
     def get_valid_mid_actions(self):
+        s_time = time.perf_counter()
+        key = (self.world.state_fingerprint(), self.agent_idx)
+        hit = key == self._valid_mid_actions_key
+        if not hit:
+            self._valid_mid_actions = self._get_valid_mid_actions()
+            self._valid_mid_actions_key = key
+        self.valid_mid_actions_stats.record(hit, time.perf_counter() - s_time)
+        return {action: list(params) for action, params in self._valid_mid_actions.items()}
+
+    def _get_valid_mid_actions(self):
         _valid_actions = {
             "prepare": [],
             "assemble": [],
@@ -928,18 +969,19 @@ class MidPlanner:
                     _valid_actions[action].append(params)
         return _valid_actions
 
-    def _check_process(self, process: Union[Dict, List]) -> bool:
+    @classmethod
+    def _check_process(cls, process: Union[Dict, List]) -> bool:
         """
         Check whether the process is legal.
         """
         if isinstance(process, dict):
             for target, target_iter in process.items():
                 if isinstance(target_iter, dict):
-                    if not self._check_process(target_iter):
+                    if not cls._check_process(target_iter):
                         logger.warning(f"Check process {target} failed!")
                         return False
                 elif isinstance(target_iter, list):
-                    if not self._check_process(target_iter):
+                    if not cls._check_process(target_iter):
                         logger.warning(f"Check process {target} failed!")
                         return False
                 else:
@@ -948,7 +990,7 @@ class MidPlanner:
         else:  # list
             for target in process:
                 if isinstance(target, list):
-                    if not self._check_process(target):
+                    if not cls._check_process(target):
                         return False
                 elif isinstance(target, tuple):
                     if target[0] not in TextAgent.legal_text_actions:
@@ -966,7 +1008,8 @@ class MidPlanner:
 
         return True
 
-    def _processes_transform(self, process) -> Dict:
+    @classmethod
+    def _processes_transform(cls, process) -> Dict:
         """
         Generate:
         - A forward index dict (previous subtasks -> possible next subtasks) for each process
@@ -974,7 +1017,7 @@ class MidPlanner:
         forward_index = {}
         for task, _p in process.items():
             if isinstance(_p, dict):
-                forward_index[task] = self._processes_transform(_p)
+                forward_index[task] = cls._processes_transform(_p)
             elif isinstance(_p, list):
                 _index = {}
                 for _sp in _p:
@@ -1090,7 +1133,7 @@ class MidPlanner:
             possible_cands = []
             for n_st in next_subtask_cands:
                 logger.trace(f"n_st {n_st}")
-                if n_st[0] in valid_actions and (n_st[1] is None or n_st[1](*n_st[2])):
+                if n_st[0] in valid_actions and (n_st[1] is None or n_st[1](self.text_agent, self.world, *n_st[2])):
                     logger.trace(f"{n_st[0]} valid")
                     possible_cands.append(n_st)
                     # current_subtask = n_st[0]
@@ -1168,17 +1211,19 @@ class MidPlanner:
             ingredient_list: List[str],
             ingredient_status_list: List[Union[str, Callable]],
         ) -> bool:
-            food_status = food[1] if isinstance(food, tuple) else lambda: True
+            food_status = food[1] if isinstance(food, tuple) else lambda agent, world: True
             food = food[0] if isinstance(food, tuple) else food
-            if (
-                is_ingredients_available(
-                    self.text_agent,
-                    self.world,
-                    ingredient_list,
-                    ingredient_status_list,
-                )
-                and food_status()
-            ):
+            # class-level status predicates take the agent and world first
+            ingredient_status_list = [
+                t_s if isinstance(t_s, str) else partial(t_s, self.text_agent, self.world)
+                for t_s in ingredient_status_list
+            ]
+            if is_ingredients_available(
+                self.text_agent,
+                self.world,
+                ingredient_list,
+                ingredient_status_list,
+            ) and food_status(self.text_agent, self.world):
                 return True
             return False
 
@@ -1188,7 +1233,7 @@ class MidPlanner:
         logger.trace(f"assemble {food}")
         logger.trace(f"recipes {self._assemble_prev_recipes}")
         logger.trace(f"traj {self.prev_subtasks}")
-        if not prev_subtask_succeeded:
+        if not prev_subtask_succeeded and len(self.prev_subtasks) > 0:
             self.prev_subtasks.pop()
             logger.trace(f"previous subtask failed, traj: {self.prev_subtasks}")
 
@@ -1279,7 +1324,7 @@ class MidPlanner:
                 possible_cands = []
                 for n_st in next_subtask_cands:
                     logger.trace(f"n_st {n_st}")
-                    if n_st[0] in valid_actions and (n_st[1] is None or n_st[1](*n_st[2])):
+                    if n_st[0] in valid_actions and (n_st[1] is None or n_st[1](self.text_agent, self.world, *n_st[2])):
                         logger.trace(f"n_st {n_st} valid")
                         possible_cands.append(n_st)
                         # current_subtask = n_st[0]
@@ -1417,7 +1462,7 @@ class MidPlanner:
                                 ["Counter"],
                                 [is_valid_center_counter],
                             ),
-                            (self.text_agent, self.world),
+                            (),
                         ),
                         "put_onto_center_counter",
                     ]
@@ -1429,8 +1474,6 @@ class MidPlanner:
                             "get_plate_from_station",
                             is_ingredients_available,
                             (
-                                self.text_agent,
-                                self.world,
                                 [thing, "Counter"],
                                 [
                                     lambda x: self.text_agent.is_target_status(x, thing_status)
@@ -1445,9 +1488,9 @@ class MidPlanner:
                     [
                         (
                             "pickup_" + CapToText[thing] + "_" + thing_status,
-                            lambda: is_ingredients_available(
-                                self.text_agent,
-                                self.world,
+                            lambda agent, world: is_ingredients_available(
+                                agent,
+                                world,
                                 ["Counter", thing],
                                 [
                                     is_valid_center_counter,
@@ -1469,9 +1512,9 @@ class MidPlanner:
                                 if thing_status != ""
                                 else "pickup_" + CapToText[thing]
                             ),
-                            lambda: is_ingredients_available(
-                                self.text_agent,
-                                self.world,
+                            lambda agent, world: is_ingredients_available(
+                                agent,
+                                world,
                                 ["Counter", thing],
                                 [
                                     is_valid_center_counter,
@@ -1492,8 +1535,11 @@ class MidPlanner:
             assert self._check_process(pass_on_subtasks)
             self._pass_on_process_forward_index = self._processes_transform(pass_on_subtasks)
 
-            logger.debug(
-                f"pass_on {thing} {thing_status} forward index:\n {pretty_repr(self._pass_on_process_forward_index)}"
+            lazy.debug(
+                "pass_on {} {} forward index:\n {}",
+                lambda: thing,
+                lambda: thing_status,
+                lambda: pretty_repr(self._pass_on_process_forward_index),
             )
 
         if not prev_subtask_succeeded and len(self.prev_subtasks) > 0:
@@ -1514,7 +1560,7 @@ class MidPlanner:
             else:
                 for n_t in next_subtask_cands:
                     next_subtask = n_t[0]
-                    next_subtask_cond = n_t[1] is None or n_t[1](*n_t[2])
+                    next_subtask_cond = n_t[1] is None or n_t[1](self.text_agent, self.world, *n_t[2])
                     if next_subtask in valid_actions and next_subtask_cond:
                         current_subtask = next_subtask
                         break
@@ -1599,14 +1645,6 @@ class MidPlanner:
         legal_foods = ["BeefBurger", "LettuceBurger", "BeefLettuceBurger"]
         assert food in legal_foods, food
 
-        if food not in self._serve_process_forward_index:
-            serve_subtasks = [["pickup_" + CapToText[food], "deliver"]]
-            serve_subtasks = {food: serve_subtasks}
-
-            assert self._check_process(serve_subtasks)
-            self._serve_process_forward_index = self._processes_transform(serve_subtasks)
-            logger.debug(f"serve {food} forward index:\n {pretty_repr(self._serve_process_forward_index)}")
-
         if not prev_subtask_succeeded and len(self.prev_subtasks) > 0:
             self.prev_subtasks.pop()
             logger.trace(f"previous subtask failed, traj: {self.prev_subtasks}")
@@ -1627,7 +1665,7 @@ class MidPlanner:
             else:
                 for n_t in next_subtask_cands:
                     next_subtask = n_t[0]
-                    next_subtask_cond = n_t[1] is None or n_t[1](*n_t[2])
+                    next_subtask_cond = n_t[1] is None or n_t[1](self.text_agent, self.world, *n_t[2])
                     if next_subtask in valid_actions and next_subtask_cond:
                         current_subtask = next_subtask
                         break
@@ -1667,18 +1705,6 @@ class MidPlanner:
         current_subtask = None
         logger.trace(f"traj {self.prev_subtasks}")
 
-        if "fire" not in self._putout_fire_forward_index:
-            putout_fire_subtasks = [
-                [
-                    ("pickup_fireextinguisher", is_on_fire, (self.text_agent, self.world)),
-                    "put_out_fire",
-                ]
-            ]
-            putout_fire_subtasks = {"fire": putout_fire_subtasks}
-            assert self._check_process(putout_fire_subtasks)
-            self._putout_fire_forward_index = self._processes_transform(putout_fire_subtasks)
-            logger.debug(f"putout fire forward index:\n {pretty_repr(self._serve_process_forward_index)}")
-
         if not prev_subtask_succeeded and len(self.prev_subtasks) > 0:
             self.prev_subtasks.pop()
             logger.trace(f"previous subtask failed, traj: {self.prev_subtasks}")
@@ -1698,7 +1724,7 @@ class MidPlanner:
             else:
                 for n_t in next_subtask_cands:
                     next_subtask = n_t[0]
-                    next_subtask_cond = n_t[1] is None or n_t[1](*n_t[2])
+                    next_subtask_cond = n_t[1] is None or n_t[1](self.text_agent, self.world, *n_t[2])
                     if next_subtask in valid_actions and next_subtask_cond:
                         current_subtask = next_subtask
                         break
@@ -1828,7 +1854,9 @@ class MidPlanner:
                 clean_a_counter_subtasks = {(o_class_str, obj_sta[1]): [clean_a_counter_subtasks]}
                 assert self._check_process(clean_a_counter_subtasks)
                 self._clean_a_counter_forward_index = self._processes_transform(clean_a_counter_subtasks)
-                logger.debug(f"clean a counter forward index:\n {pretty_repr(self._clean_a_counter_forward_index)}")
+                lazy.debug(
+                    "clean a counter forward index:\n {}", lambda: pretty_repr(self._clean_a_counter_forward_index)
+                )
             else:
                 self.prev_task = None
                 self._clean_a_counter_forward_index = {}
@@ -1845,7 +1873,7 @@ class MidPlanner:
                 else:
                     for n_t in next_subtask_cands:
                         next_subtask = n_t[0]
-                        next_subtask_cond = n_t[1] is None or n_t[1](*n_t[2])
+                        next_subtask_cond = n_t[1] is None or n_t[1](self.text_agent, self.world, *n_t[2])
                         if next_subtask in valid_actions and next_subtask_cond:
                             current_subtask = next_subtask
                             break
@@ -9,6 +9,7 @@ from loguru import logger
 
 from agents.mid_planner import MidPlanner, get_empty_counter
 from agents.text_agent import TextAgent
+from utils.lazy_log import lazy
 
 
 class RuleAgent:
@@ -151,7 +152,7 @@ class RuleAgent:
                 self.controlled_by_fsm = True
 
         # complete orders
-        logger.debug("json state:\n" + pformat(json_state))
+        lazy.debug("json state:\n{}", lambda: pformat(json_state))
         if not self.assigned_orders:
             orders = sorted(json_state["orders"], key=lambda x: x["remain_time"])
             orders = [o["name"] for o in orders]
@@ -174,6 +175,8 @@ class RuleAgent:
             for precond, action in self.action_patterns.items():
                 if (precond, action) not in self.assigned_actions:
                     self.assigned_actions.append((precond, action))
+        # fire / counter actions are not assigned ones
+        precond, action = None, mid_action
         while len(self.assigned_actions) > 0:
             action = self.assigned_actions.pop(0)
             precond, action = action
@@ -190,7 +193,7 @@ class RuleAgent:
         }
         if mid_action:
             log_data["assigned action"] = (precond, action)
-        logger.debug("process info:\n" + pformat(log_data))
+        lazy.debug("process info:\n{}", lambda: pformat(log_data))
 
         if mid_action:
             # assert mid_action[1] in MidPlanner.valid_actions[mid_action[0]], "Invalid mid action"
@@ -203,8 +206,10 @@ class RuleAgent:
                 for o_t in order_tuples:
                     if orders[: len(o_t)] == list(o_t):
                         self.matched_pattern = (o_t, deepcopy(self.order_patterns[o_t]))
-                        logger.debug(
-                            f"Preparing orders {self.matched_pattern[0]} using\n{pformat(self.matched_pattern[1])}"
+                        lazy.debug(
+                            "Preparing orders {} using\n{}",
+                            lambda: self.matched_pattern[0],
+                            lambda: pformat(self.matched_pattern[1]),
                         )
                         self.order_in_progress = list(self.matched_pattern[0])
                         break
@@ -6,6 +6,7 @@ from loguru import logger
 
 from agents import rule_agent
 from agents.mid_planner import get_empty_counter
+from utils.lazy_log import lazy
 
 
 class RuleAgentNoFSM(rule_agent.RuleAgent):
@@ -89,7 +90,7 @@ class RuleAgentNoFSM(rule_agent.RuleAgent):
         # complete orders
         ## when there are no assigned orders: get orders that are not in other's inventory
         ## the orders are sorted based on remaining time
-        logger.debug("json state:\n" + pformat(json_state))
+        lazy.debug("json state:\n{}", lambda: pformat(json_state))
         if not self.assigned_orders:
             """
             orders = sorted(json_state["orders"], key=lambda x: x["remain_time"])
@@ -115,6 +116,8 @@ class RuleAgentNoFSM(rule_agent.RuleAgent):
                 if (precond, action) not in self.assigned_actions:
                     self.assigned_actions.append((precond, action))
 
+        # fire / counter actions are not assigned ones
+        precond, action = None, mid_action
         ## first complete all assigned actions
         while len(self.assigned_actions) > 0:
             action = self.assigned_actions.pop(0)
@@ -136,7 +139,7 @@ class RuleAgentNoFSM(rule_agent.RuleAgent):
         }
         if mid_action:
             log_data["assigned action"] = (precond, action)
-        logger.debug("process info:\n" + pformat(log_data))
+        lazy.debug("process info:\n{}", lambda: pformat(log_data))
 
         if mid_action:
             # assert mid_action[1] in MidPlanner.valid_actions[mid_action[0]], "Invalid mid action"
@@ -149,8 +152,10 @@ class RuleAgentNoFSM(rule_agent.RuleAgent):
                 for o_t in order_tuples:
                     if orders[: len(o_t)] == list(o_t):
                         self.matched_pattern = (o_t, deepcopy(self.order_patterns[o_t]))
-                        logger.debug(
-                            f"Preparing orders {self.matched_pattern[0]} using\n{pformat(self.matched_pattern[1])}"
+                        lazy.debug(
+                            "Preparing orders {} using\n{}",
+                            lambda: self.matched_pattern[0],
+                            lambda: pformat(self.matched_pattern[1]),
                         )
                         self.order_in_progress = list(self.matched_pattern[0])
                         break
@@ -1,4 +1,5 @@
 import random
+import time
 from collections import Counter as Cnter
 from copy import deepcopy
 from typing import Callable, List, Tuple
@@ -11,6 +12,10 @@ from gym_cooking.cooking_world.cooking_world import (
 from gym_cooking.cooking_world.world_objects import *
 
 from utils.astar import *
+from utils.cache_stats import CacheStats
+from utils.distance_field import DistanceField, get_neighbor_position
+from utils.interaction_tiles import get_interaction_tiles
+from utils.reservation_planner import ReservationTable
 
 TEXT_ACTION_SUCCESS = -1
 TEXT_ACTION_FAILURE = -2
@@ -25,11 +30,6 @@ ORIENTATION_TO_SHIFT = {
 }
 
 
-def get_neighbor_position(position: Tuple[int, int]):
-    (x, y) = position
-    return [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
-
-
 class TextAgent:
     legal_text_actions = [
         # Get ingredients from station
@@ -141,7 +141,9 @@ class TextAgent:
     legal_drop_targets: List[Tuple[str, str]] = [("Dustbin", "")]
     legal_deliver_targets: List[Tuple[str, str]] = [("DeliverSquare", "")]
 
-    def __init__(self, world: CookingWorld, agent_idx, real_time_plan: bool = True) -> None:
+    def __init__(
+        self, world: CookingWorld, agent_idx, real_time_plan: bool = True, reservations: ReservationTable = None
+    ) -> None:
         self.current_task: Callable = None
         self.destination = None
         self.target = ""
@@ -174,6 +176,23 @@ class TextAgent:
         self.last_position = None
         self.last_destination = None
 
+        # get_valid_actions is memoized on the world fingerprint, it is called many times per tick
+        self._valid_actions_key = None
+        self._valid_actions = None
+        self.valid_actions_stats = CacheStats()
+
+        # distances from the agent for target selection, recomputed only when an agent moves
+        self._distance_field_key = None
+        self._distance_field = None
+        self.distance_field_stats = CacheStats()
+
+        # floor tiles next to every counter / station and the connected floor regions of the level
+        self.interaction_tiles = get_interaction_tiles(world.level_array)
+
+        # if set, move_to plans in space-time around the paths of the other agents instead of using find_path,
+        # agents planned by the same process share one table
+        self.reservations = reservations
+
     def update_agent(self, world: CookingWorld, agent_idx):
         self.current_task: Callable = None
         self.destination = None
@@ -205,44 +224,76 @@ class TextAgent:
         self.last_position = None
         self.last_destination = None
 
+        self._valid_actions_key = None
+        self._valid_actions = None
+
+        self._distance_field_key = None
+        self._distance_field = None
+
+        self.interaction_tiles = get_interaction_tiles(world.level_array)
+
+        if self.reservations is not None:
+            self.reservations.clear()
+
+    def other_agent_locations(self) -> List[Tuple[int, int]]:
+        return [tuple(agent.location) for agent in self.world.agents if agent != self.agent]
+
+    def staying_agent_locations(self) -> List[Tuple[int, int]]:
+        """
+        Tiles of the other agents that are not about to leave them: all of them without reservations, with
+        reservations the ones without a planned path (e.g. a human partner, or an agent working at a counter). The
+        agents with a path move on, or give way if they have a lower priority.
+        """
+        if self.reservations is None:
+            return self.other_agent_locations()
+        return [
+            tuple(agent.location)
+            for idx, agent in enumerate(self.world.agents)
+            if agent != self.agent and idx not in self.reservations.paths
+        ]
+
+    def blocking_agent_locations(self) -> List[Tuple[int, int]]:
+        """
+        Tiles of the other agents, to walk around. With reservations the other agents are waited for instead.
+        """
+        if self.reservations is not None:
+            return []
+        return self.other_agent_locations()
+
+    def is_blocked(self, position, for_find_path=False) -> bool:
+        """
+        Whether `position` is 1 in `update_level_array(for_find_path)`, without copying the level array.
+        """
+        (x, y) = position
+        if self.world.level_array[x][y] == 1:
+            return True
+        return for_find_path and (x, y) in self.blocking_agent_locations()
+
     def search_valid_position(self, position, for_find_path=False):  # , search_step_left):
         (x, y) = position if position else self.destination
-        level_array = self.update_level_array(for_find_path=for_find_path)
-        valid_pos_list = []
-        for pos in get_neighbor_position((x, y)):
-            if pos[0] < 0 or pos[0] >= self.world.width or pos[1] < 0 or pos[1] >= self.world.height:
-                continue
-            valid_pos_list.append(pos)
-        sorted_valid_pos_list = sorted(
-            valid_pos_list,
-            key=lambda x: (
-                level_array[x[0]][x[1]],
-                self.distance(x, self.agent.location),
-            ),
-        )
-        for pos in sorted_valid_pos_list:
-            if level_array[pos[0]][pos[1]] == 0:
-                return pos
-            if level_array[pos[0]][pos[1]] == 2:
-                return self.search_valid_position(pos)
+        tiles = [tile for tile, _ in self.interaction_tiles.interaction_tiles((x, y))]
+        # with reservations, an agent passing by is waited for, but waiting for one that stays would take forever
+        others = self.staying_agent_locations()
+        free_tiles = [tile for tile in tiles if tile not in others]
+        if free_tiles:
+            return min(free_tiles, key=lambda tile: self.distance(tile, self.agent.location))
+        if tiles and not for_find_path:
+            # all taken by other agents, look next to the closest of them
+            return self.search_valid_position(min(tiles, key=lambda tile: self.distance(tile, self.agent.location)))
         return None
 
     def is_valid_position(self, position=None, search=True, for_find_path=False):  # , max_search_step = 10):
         (x, y) = position if position else self.destination
         # print(self.agent.location, (x, y))
         #        max_search_step = max_search_step if for_find_path else 1
-        if self.update_level_array(for_find_path=for_find_path)[x][y] == 1:
+        if not self.interaction_tiles.can_reach(self.agent.location, (x, y)):
+            return None
+        if self.is_blocked((x, y), for_find_path=for_find_path):
             res = self.search_valid_position((x, y)) if search else None
-            if res:
-                path = find_path(self.agent.location, res, self.update_level_array())
-                if len(path) == 0:
-                    return None
-                else:
-                    return res
-            else:
-                return None
-        path = find_path(self.agent.location, (x, y), self.update_level_array())
-        if len(path) == 0:
+            if res and self.distance_field().reachable(res):
+                return res
+            return None
+        if not self.distance_field().reachable((x, y)):
             return None
         return (x, y)
 
@@ -252,18 +303,14 @@ class TextAgent:
         # if len(path) == 0:
         #     return None
         #        max_search_step = max_search_step if for_find_path else 1
-        if self.update_level_array(for_find_path=for_find_path)[x][y] == 1:
+        if not self.interaction_tiles.can_reach(self.agent.location, (x, y)):
+            return None
+        if self.is_blocked((x, y), for_find_path=for_find_path):
             res = self.search_valid_position((x, y), for_find_path) if search else None
-            if res:
-                path = find_path(self.agent.location, res, self.update_level_array())
-                if len(path) == 0:
-                    return None
-                else:
-                    return res
-            else:
-                return None
-        path = find_path(self.agent.location, (x, y), self.update_level_array())
-        if len(path) == 0:
+            if res and self.distance_field().reachable(res):
+                return res
+            return None
+        if not self.distance_field().reachable((x, y)):
             return None
         return (x, y)
 
@@ -283,6 +330,35 @@ class TextAgent:
             return 0
         return -2
 
+    def distance_field(self) -> DistanceField:
+        """
+        BFS distances from the agent with the other agents as walls, the same obstacles as `find_path` on
+        `update_level_array()`, recomputed only when an agent has moved.
+        """
+        s_time = time.perf_counter()
+        key = (id(self.world), tuple(agent.location for agent in self.world.agents))
+        hit = key == self._distance_field_key
+        if not hit:
+            others = self.blocking_agent_locations()
+            self._distance_field = DistanceField(self.world.level_array, self.agent.location, others)
+            self._distance_field_key = key
+        self.distance_field_stats.record(hit, time.perf_counter() - s_time)
+        return self._distance_field
+
+    def path_distance(self, location: Tuple[int, int]) -> int:
+        """
+        Moves the agent needs to be able to interact with the object at `location` (0 for what it holds). Objects it
+        cannot reach rank after all reachable ones, by Manhattan distance.
+        """
+        if location == self.agent.location:
+            return 0
+        distance = None
+        if self.interaction_tiles.can_reach(self.agent.location, location):
+            distance = self.distance_field().interaction_distance(location)
+        if distance is None:
+            return self.world.width * self.world.height + self.distance(location, self.agent.location)
+        return distance
+
     def update_level_array(self, for_find_path=True):
         level_array = deepcopy(self.world.level_array)
         for agent in self.world.agents:
@@ -400,7 +476,20 @@ class TextAgent:
             return [obj for obj in self.world.world_objects[target] if check(obj)]
         return [obj for obj in self.world.world_objects[target] if self.is_target(obj, target, target_status)]
 
-    def get_valid_actions(self):
+    def get_valid_actions(self) -> List[str]:
+        """
+        Text actions the agent can take in the current state, recomputed only when the world fingerprint changes.
+        """
+        s_time = time.perf_counter()
+        key = (self.world.state_fingerprint(), self.agent_idx)
+        hit = key == self._valid_actions_key
+        if not hit:
+            self._valid_actions = self._get_valid_actions()
+            self._valid_actions_key = key
+        self.valid_actions_stats.record(hit, time.perf_counter() - s_time)
+        return list(self._valid_actions)
+
+    def _get_valid_actions(self) -> List[str]:
         # since put_onto_counter is automatic, get and pickup will not check agent.holding
         valid_actions = [
             # "get_plate_from_station",
@@ -726,9 +815,11 @@ class TextAgent:
         return abs(location1[0] - location2[0]) + abs(location1[1] - location2[1])
 
     def sort_object_by_distance(self, objects, source_location=None):
-        target_location = self.agent.location
-
-        objects.sort(key=lambda x: self.distance(x.location, target_location))
+        if source_location is None or source_location == self.agent.location:
+            # walking distance from the agent, unreachable objects last
+            objects.sort(key=lambda x: self.path_distance(x.location))
+        else:
+            objects.sort(key=lambda x: self.distance(x.location, source_location))
         # objects.sort(
         #     key=lambda x: len(
         #         self.findpath(
@@ -766,6 +857,8 @@ class TextAgent:
         # return closet_object, len(
         #     self.findpath(closet_object.location, target_location)
         # )
+        if target_location == self.agent.location:
+            return closet_object, self.path_distance(closet_object.location)
         return closet_object, self.distance(closet_object.location, target_location)
 
     def is_target(self, holding, target: str, target_status: str = "", station: bool = False) -> bool:
@@ -966,22 +1059,7 @@ class TextAgent:
         if self.destination in get_neighbor_position(self.agent.location):
             return self.turn(self.destination)
         else:
-            if self.is_valid_position(for_find_path=True):
-                # print("valid_position", self.is_valid_position(for_find_path=True))
-                path: List[Tuple[int, int]] = find_path(
-                    self.agent.location,
-                    self.is_valid_position(for_find_path=True),
-                    self.update_level_array(),
-                )
-                if len(path) == 1:
-                    return 0
-                if len(path) == 0:
-                    # raise
-                    return -2
-                # return self.move_to(path[1])
-                return self.move_to(self.is_valid_position(for_find_path=True))
-            else:
-                return 0
+            return self.approach_destination()
 
     def plate(self, target, target_status: str):
         """
@@ -1100,21 +1178,7 @@ class TextAgent:
         if self.destination in get_neighbor_position(self.agent.location):
             return self.turn(self.destination)
         else:
-            if self.is_valid_position(for_find_path=True):
-                path: List[Tuple[int, int]] = find_path(
-                    self.agent.location,
-                    self.is_valid_position(for_find_path=True),
-                    self.update_level_array(),
-                )
-                if len(path) == 1:
-                    return 0
-                if len(path) == 0:
-                    # raise
-                    return -2
-                # return self.move_to(path[1])
-                return self.move_to(self.is_valid_position(for_find_path=True))
-            else:
-                return 0
+            return self.approach_destination()
 
     def drop(self, target):
         """
@@ -1188,21 +1252,7 @@ class TextAgent:
         if self.destination in get_neighbor_position(self.agent.location):
             return self.turn(self.destination)
         else:
-            if self.is_valid_position(for_find_path=True):
-                path: List[Tuple[int, int]] = find_path(
-                    self.agent.location,
-                    self.is_valid_position(for_find_path=True),
-                    self.update_level_array(),
-                )
-                if len(path) == 1:
-                    return 0
-                if len(path) == 0:
-                    # raise
-                    return -2
-                # return self.move_to(path[1])
-                return self.move_to(self.is_valid_position(for_find_path=True))
-            else:
-                return 0
+            return self.approach_destination()
 
     def chop(self, target):
         """
@@ -1278,21 +1328,7 @@ class TextAgent:
         if self.destination in get_neighbor_position(self.agent.location):
             return self.turn(self.destination)
         else:
-            if self.is_valid_position(for_find_path=True):
-                path: List[Tuple[int, int]] = find_path(
-                    self.agent.location,
-                    self.is_valid_position(for_find_path=True),
-                    self.update_level_array(),
-                )
-                if len(path) == 1:
-                    return 0
-                if len(path) == 0:
-                    # raise
-                    return -2
-                # return self.move_to(path[1])
-                return self.move_to(self.is_valid_position(for_find_path=True))
-            else:
-                return 0
+            return self.approach_destination()
 
     def putout(self, target):
         """
@@ -1359,21 +1395,7 @@ class TextAgent:
         if self.destination in get_neighbor_position(self.agent.location):
             return self.turn(self.destination)
         else:
-            if self.is_valid_position(for_find_path=True):
-                path: List[Tuple[int, int]] = find_path(
-                    self.agent.location,
-                    self.is_valid_position(for_find_path=True),
-                    self.update_level_array(),
-                )
-                if len(path) == 1:
-                    return 0
-                if len(path) == 0:
-                    # raise
-                    return -2
-                # return self.move_to(path[1])
-                return self.move_to(self.is_valid_position(for_find_path=True))
-            else:
-                return 0
+            return self.approach_destination()
 
     def serve(self, target):
         """
@@ -1436,21 +1458,7 @@ class TextAgent:
         if self.destination in get_neighbor_position(self.agent.location):
             return self.turn(self.destination)
         else:
-            if self.is_valid_position(for_find_path=True):
-                path: List[Tuple[int, int]] = find_path(
-                    self.agent.location,
-                    self.is_valid_position(for_find_path=True),
-                    self.update_level_array(),
-                )
-                if len(path) == 1:
-                    return 0
-                if len(path) == 0:
-                    # raise
-                    return -2
-                # return self.move_to(path[1])
-                return self.move_to(self.is_valid_position(for_find_path=True))
-            else:
-                return 0
+            return self.approach_destination()
 
     # def put_onto_center(self, target):
     #     return self.put_onto(target, for_passon=True, is_center=True)
@@ -1558,21 +1566,7 @@ class TextAgent:
         if self.destination in get_neighbor_position(self.agent.location):
             return self.turn(self.destination)
         else:
-            if self.is_valid_position(for_find_path=True):
-                path: List[Tuple[int, int]] = find_path(
-                    self.agent.location,
-                    self.is_valid_position(for_find_path=True),
-                    self.update_level_array(),
-                )
-                if len(path) == 1:
-                    return 0
-                if len(path) == 0:
-                    # raise
-                    return -2
-                # return self.move_to(path[1])
-                return self.move_to(self.is_valid_position(for_find_path=True))
-            else:
-                return 0
+            return self.approach_destination()
 
     def move_to(self, destination: Tuple[int, int]) -> bool:
         """move to the specified destination
@@ -1581,6 +1575,8 @@ class TextAgent:
         Returns:
             bool: True when the agent has reached the destination
         """
+        if self.reservations is not None and destination == self.agent.location:
+            self.reservations.release(self.agent_idx)
         if not self.destination:
             if destination == self.agent.location:
                 # print("arrived")
@@ -1596,6 +1592,13 @@ class TextAgent:
                 return -2
         if destination == self.agent.location:
             return 0
+        if self.reservations is not None:
+            action = self.move_with_reservations(destination)
+            if self.current_task == self.move_to and self.last_destination == destination:
+                self.current_task = None
+                self.prev_task = None
+                self.destination = None
+            return action
         if destination in get_neighbor_position(self.agent.location):
             for agent in self.world.agents:
                 if agent == self.agent:
@@ -1635,6 +1638,39 @@ class TextAgent:
         self.last_destination = path[1]
         return self.turn(path[1])
 
+    def approach_destination(self):
+        """
+        Next move towards a free tile next to `self.destination`, 0 if there is none for now.
+        """
+        goal = self.is_valid_position(for_find_path=True)
+        if not goal:
+            return 0
+        if self.reservations is None:
+            path: List[Tuple[int, int]] = find_path(self.agent.location, goal, self.update_level_array())
+            if len(path) == 1:
+                return 0
+            if len(path) == 0:
+                # raise
+                return -2
+        return self.move_to(goal)
+
+    def move_with_reservations(self, goal: Tuple[int, int]):
+        """
+        Next move to `goal` planned with `self.reservations`, 0 to wait for another agent to pass.
+        """
+        if goal is None:
+            self.reservations.release(self.agent_idx)
+            return -2
+        others = [(idx, agent.location) for idx, agent in enumerate(self.world.agents) if agent != self.agent]
+        path = self.reservations.plan(self.world.level_array, self.agent_idx, self.agent.location, goal, others)
+        if len(path) == 0:
+            return -2
+        self.last_position = self.agent.location
+        self.last_destination = path[1] if len(path) > 1 else self.agent.location
+        if self.last_destination == self.agent.location:
+            return 0
+        return self.turn(self.last_destination)
+
     def wait(self, target):
         if target <= 0:
             self.current_task = None
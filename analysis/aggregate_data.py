@@ -5,7 +5,7 @@ Data Aggregation Script
 
 This script merges game data with eyetracking data by:
 1. Reading parsed game data and extracted gaze data
-2. Converting game timesteps to real timestamps using 0.25s intervals
+2. Converting game timesteps to real timestamps (recorded wall-clock times, or 0.25s intervals for older logs)
 3. Aggregating eyetracking metrics for each game timestep
 4. Computing non-zero averages for all eye metrics
 5. Generating final merged dataset for analysis
@@ -14,6 +14,9 @@ Time Conversion:
 - Game timestep 0 → Real time = round_start_time + (0 * 0.25)
 - Game timestep 1 → Real time = round_start_time + (1 * 0.25)
 - Each timestep covers a 0.25 second window
+- Logs that record the wall-clock time of each step ('wall_time') are mapped with
+  round_start_time + (wall_time - wall_time of the first step of the round) instead,
+  so that ticks delayed by the game server do not shift the later timesteps
 """
 
 import pandas as pd
@@ -21,6 +24,14 @@ import numpy as np
 from pathlib import Path
 import sys 
 
+# Eye metric columns to aggregate
+EYE_COLUMNS = [
+    'LPCX', 'LPCY', 'LPD', 'LPS', 'LPV',     # Left eye
+    'RPCX', 'RPCY', 'RPD', 'RPS', 'RPV',     # Right eye
+    'SACCADE_MAG', 'SACCADE_DIR',             # Saccade
+    'BKID', 'BKDUR', 'BKPMIN'                 # Blink
+]
+
 def aggregate_eye_metrics(eye_data_window):
     """
     Aggregate eyetracking data for a single game timestep window.
@@ -67,6 +78,87 @@ def aggregate_eye_metrics(eye_data_window):
     
     return metrics
 
+def aggregate_eye_windows(eye_df, round_ids, real_timestamps, time_window):
+    """
+    Aggregate eyetracking data for all game timesteps at once, as aggregate_eye_metrics does for one window.
+    
+    The samples of each round are sorted by timestamp once, the window [t - time_window, t + time_window] of each
+    timestep becomes a range of the sorted samples with searchsorted, and the non-zero mean/std/count of every metric
+    are grouped reductions over the samples of all windows (windows may overlap).
+    
+    Args:
+        eye_df: DataFrame with eyetracking data (first column is timestamp)
+        round_ids: Round of each timestep
+        real_timestamps: Real timestamp of each timestep, NaN for rounds without eyetracking data
+        time_window: Half width of the window around each timestep
+        
+    Returns:
+        DataFrame: Aggregated eye metrics of each timestep, with the columns of aggregate_eye_metrics
+    """
+    round_ids = np.asarray(round_ids)
+    real_timestamps = np.asarray(real_timestamps, dtype=float)
+    n_rows = len(round_ids)
+    timestamps = eye_df.iloc[:, 0].to_numpy(dtype=float)  # First column is timestamp
+    eye_round_ids = eye_df['Round_ID'].to_numpy()
+    
+    # Window of each timestep as [start, end) in the samples sorted by round and timestamp
+    sorted_samples = []
+    starts = np.zeros(n_rows, dtype=np.int64)
+    ends = np.zeros(n_rows, dtype=np.int64)
+    offset = 0
+    for round_id in np.unique(round_ids):
+        rows = np.flatnonzero((round_ids == round_id) & ~np.isnan(real_timestamps))
+        samples = np.flatnonzero(eye_round_ids == round_id)
+        samples = samples[np.argsort(timestamps[samples], kind='stable')]
+        round_timestamps = timestamps[samples]
+        starts[rows] = offset + np.searchsorted(round_timestamps, real_timestamps[rows] - time_window, side='left')
+        ends[rows] = offset + np.searchsorted(round_timestamps, real_timestamps[rows] + time_window, side='right')
+        sorted_samples.append(samples)
+        offset += len(samples)
+    sorted_samples = np.concatenate(sorted_samples) if sorted_samples else np.zeros(0, dtype=np.int64)
+    
+    # Expand the windows into (timestep, sample) pairs
+    lengths = ends - starts
+    empty = lengths == 0
+    window_rows = np.repeat(np.arange(n_rows), lengths)
+    window_samples = sorted_samples[np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)]
+    
+    metrics = {}
+    for col in EYE_COLUMNS:
+        name = col.lower()
+        if col not in eye_df.columns:
+            # aggregate_eye_metrics leaves the metric out of windows with samples
+            metrics[f'avg_{name}'] = np.nan
+            metrics[f'std_{name}'] = np.nan
+            metrics[f'count_{name}'] = np.where(empty, 0, np.nan)
+            continue
+        
+        # Non-zero values of the samples of all windows
+        values = eye_df[col].to_numpy(dtype=float)[window_samples]
+        non_zero = (values != 0) & ~np.isnan(values)
+        rows = window_rows[non_zero]
+        values = values[non_zero]
+        
+        count = np.bincount(rows, minlength=n_rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.bincount(rows, weights=values, minlength=n_rows) / count
+            deviation = values - avg[rows]
+            std = np.sqrt(np.bincount(rows, weights=deviation * deviation, minlength=n_rows) / (count - 1))
+        
+        # 0 for windows without non-zero values, NaN for timesteps without samples
+        metrics[f'avg_{name}'] = np.where(empty, np.nan, np.where(count > 0, avg, 0))
+        metrics[f'std_{name}'] = np.where(empty, np.nan, np.where(count > 0, std, 0))
+        metrics[f'count_{name}'] = count
+    
+    # Add window-level statistics
+    first = sorted_samples[np.minimum(starts, len(sorted_samples) - 1)] if len(sorted_samples) else starts
+    last = sorted_samples[np.maximum(ends - 1, 0)] if len(sorted_samples) else ends
+    metrics['total_samples'] = lengths
+    metrics['window_start'] = np.where(empty, np.nan, timestamps[first] if len(timestamps) else np.nan)
+    metrics['window_end'] = np.where(empty, np.nan, timestamps[last] if len(timestamps) else np.nan)
+    
+    return pd.DataFrame(metrics, index=range(n_rows))
+
 def get_empty_eye_metrics():
     """Return empty eye metrics for timesteps with no eyetracking data"""
     eye_columns = [
@@ -176,10 +268,14 @@ def analyze_data_compatibility(participant_id=3):
         print(f"❌ Error analyzing data: {e}")
         return False
 
-def aggregate_game_eyetracking_data(participant_id=3):
+def aggregate_game_eyetracking_data(participant_id=3, use_store=False):
     """
     Main function to aggregate game and eyetracking data.
     
+    Args:
+        participant_id: Participant to aggregate
+        use_store: Read the parsed game data from the trajectory store and save the result to it
+        
     Returns:
         bool: Success status
     """
@@ -190,13 +286,17 @@ def aggregate_game_eyetracking_data(participant_id=3):
     
     print(f"🔄 Starting Data Aggregation for Participant {participant_id}...")
     
-    # Check data compatibility first
-    if not analyze_data_compatibility():
+    # Check data compatibility first (of the CSV files, which the store replaces)
+    if not use_store and not analyze_data_compatibility(participant_id):
         return False
     
     # Load data
     try:
-        game_df = pd.read_csv(game_file)
+        if use_store:
+            from trajectory_store import read_table
+            game_df = read_table("parsed", participant_id=participant_id)
+        else:
+            game_df = pd.read_csv(game_file)
         eye_df = pd.read_csv(eye_file)
         
         if len(game_df) == 0:
@@ -236,56 +336,37 @@ def aggregate_game_eyetracking_data(participant_id=3):
     print(f"  Step interval: {STEP_INTERVAL}s")
     print(f"  Time window: ±{TIME_WINDOW}s")
     
-    # Aggregate data
-    aggregated_rows = []
-    
-    for _, game_row in game_df.iterrows():
-        round_id = game_row['round_id']
-        timestep = game_row['timestep']
-        
-        # Start with game data
-        agg_row = game_row.to_dict()
+    # Calculate the real timestamp of every game timestep
+    real_timestamps = np.full(len(game_df), np.nan)
+    for round_id, round_info in time_mapping.items():
+        round_mask = (game_df['round_id'] == round_id).to_numpy()
+        if not round_mask.any():
+            continue
+        round_df = game_df[round_mask]
         
-        if round_id in time_mapping:
-            # Calculate real timestamp for this game timestep
-            round_info = time_mapping[round_id]
-            
-            # Linear mapping: distribute game timesteps across actual duration
-            max_timestep = game_df[game_df['round_id'] == round_id]['timestep'].max()
-            time_ratio = timestep / max_timestep if max_timestep > 0 else 0
-            real_timestamp = round_info['min_timestamp'] + (time_ratio * round_info['duration'])
-            
-            # Find eyetracking samples in time window
-            eye_mask = (
-                (eye_df['Round_ID'] == round_id) &
-                (eye_df.iloc[:, 0] >= real_timestamp - TIME_WINDOW) &  # First column is timestamp
-                (eye_df.iloc[:, 0] <= real_timestamp + TIME_WINDOW)
-            )
-            
-            matching_eye_data = eye_df[eye_mask]
-            
-            # Aggregate eye metrics
-            eye_metrics = aggregate_eye_metrics(matching_eye_data)
-            agg_row.update(eye_metrics)
-            
-            # Add timing info
-            agg_row['real_timestamp'] = real_timestamp
-            agg_row['has_eye_data'] = len(matching_eye_data) > 0
-            
+        if 'wall_time' in game_df and round_df['wall_time'].notna().all():
+            # Recorded mapping: offset of each step from the first step of the round
+            round_timestamps = round_info['min_timestamp'] + (round_df['wall_time'] - round_df['wall_time'].min())
         else:
-            # No eyetracking data for this round
-            eye_metrics = get_empty_eye_metrics()
-            agg_row.update(eye_metrics)
-            agg_row['real_timestamp'] = np.nan
-            agg_row['has_eye_data'] = False
-        
-        aggregated_rows.append(agg_row)
+            # Linear mapping: distribute game timesteps across actual duration
+            max_timestep = round_df['timestep'].max()
+            time_ratio = round_df['timestep'] / max_timestep if max_timestep > 0 else 0 * round_df['timestep']
+            round_timestamps = round_info['min_timestamp'] + (time_ratio * round_info['duration'])
+        real_timestamps[round_mask] = round_timestamps
     
-    # Create final DataFrame
-    aggregated_df = pd.DataFrame(aggregated_rows)
+    # Aggregate eye metrics over the time window of every timestep
+    eye_metrics = aggregate_eye_windows(eye_df, game_df['round_id'], real_timestamps, TIME_WINDOW)
+    
+    # Create final DataFrame: game data, eye metrics and timing info
+    aggregated_df = pd.concat([game_df.reset_index(drop=True), eye_metrics], axis=1)
+    aggregated_df['real_timestamp'] = real_timestamps
+    aggregated_df['has_eye_data'] = eye_metrics['total_samples'].to_numpy() > 0
     
     # Save results
     aggregated_df.to_csv(output_file, index=False)
+    if use_store:
+        from trajectory_store import write_table
+        write_table("aggregated", aggregated_df)
     
     # Generate summary
     print(f"\n📊 Aggregation Results:")
@@ -336,10 +417,14 @@ if __name__ == "__main__":
     print("🔄 Game-Eyetracking Data Aggregation Tool")
     print("=" * 50)
 
+    # --store: use the trajectory store (see trajectory_store.py)
+    use_store = '--store' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--store']
+
     # Get participant ID from command line arguments
-    if len(sys.argv) > 1:
+    if len(args) > 0:
         try:
-            participant_id = int(sys.argv[1])
+            participant_id = int(args[0])
         except ValueError:
             print("❌ Invalid participant ID. Please provide a number.")
             sys.exit(1)
@@ -349,7 +434,7 @@ if __name__ == "__main__":
         print(f"⚠️ No participant ID provided, using default: {participant_id}")
     
     print(f"🎯 Processing participant: {participant_id}")
-    success = aggregate_game_eyetracking_data(participant_id)
+    success = aggregate_game_eyetracking_data(participant_id, use_store=use_store)
     
     if success:
         print("\n✅ Data aggregation completed successfully!")
@@ -21,13 +21,40 @@ Data Quality Features:
 - Validates pupil diameter ranges (2-8mm)
 - Verifies gaze coordinates within screen bounds
 - Calculates comprehensive data quality metrics
+
+The gaze CSV is streamed in chunks of GAZE_CHUNK_ROWS rows, reading only the
+columns above, so memory does not grow with the length or width of a session.
+
+Several participants ("3,5,7" or "all") are processed in parallel, one process each.
 """
 
 import pandas as pd
 import numpy as np
+import contextlib
+import io
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from scipy import stats
+
+# Columns to keep for cognitive load analysis, besides the TIME column
+REQUIRED_COLUMNS = [
+    'LPCX', 'LPCY', 'LPD', 'LPS', 'LPV',  # Left pupil
+    'RPCX', 'RPCY', 'RPD', 'RPS', 'RPV',  # Right pupil  
+    'SACCADE_MAG', 'SACCADE_DIR',         # Saccade
+    'BKID', 'BKDUR', 'BKPMIN'             # Blink
+]
+# Flag and count columns, restored to integers when they have no missing values
+INTEGER_COLUMNS = ['LPV', 'RPV', 'BKID', 'BKPMIN']
+# Rows of the gaze CSV read at a time
+GAZE_CHUNK_ROWS = 100_000
+# Outlier threshold of each cleaning method by sensitivity
+OUTLIER_THRESHOLDS = {
+    'rolling': {'high': 1.5, 'medium': 2.0, 'low': 2.5},  # k rolling standard deviations
+    'iqr': {'high': 1.0, 'medium': 1.5, 'low': 2.0},      # k interquartile ranges
+    'zscore': {'high': 2.5, 'medium': 3.0, 'low': 4.0},   # |z-score|
+    'mad': {'high': 2.5, 'medium': 3.5, 'low': 4.5},      # |modified z-score|
+}
 
 def filter_invalid_samples(df, time_column):
     
@@ -62,6 +89,43 @@ def filter_invalid_samples(df, time_column):
     return df, quality_report
 
 
+def rolling_mean_std(values, window_size=100):
+    """
+    Centered rolling mean and standard deviation, as pandas rolling(window_size, center=True)
+    followed by back and forward filling of the incomplete windows at the edges.
+    
+    Both come from one pass of cumulative sums over the values, centered on their mean
+    to keep the sums of squares accurate.
+    
+    Args:
+        values: 1-D array without NaN
+        window_size: Size of rolling window
+        
+    Returns:
+        tuple: (rolling mean, rolling standard deviation), NaN if there are fewer values than the window
+    """
+    n = len(values)
+    if n < window_size:
+        return np.full(n, np.nan), np.full(n, np.nan)
+    
+    offset = values.mean()
+    centered = values - offset
+    sums = np.concatenate(([0.0], np.cumsum(centered)))
+    squares = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    window_sums = sums[window_size:] - sums[:-window_size]
+    window_squares = squares[window_size:] - squares[:-window_size]
+    
+    window_means = window_sums / window_size
+    window_vars = np.maximum(window_squares - window_sums * window_means, 0) / (window_size - 1)
+    
+    # Window [i, i + window_size) is centered on i + window_size // 2, edges take the nearest window
+    first = window_size // 2
+    pad = (first, n - len(window_means) - first)
+    rolling_mean = np.pad(window_means + offset, pad, mode='edge')
+    rolling_std = np.pad(np.sqrt(window_vars), pad, mode='edge')
+    return rolling_mean, rolling_std
+
+
 def detect_rolling_outliers(data, window_size=100, k=1.5):
     """
     Detect outliers using rolling window statistics.
@@ -75,18 +139,68 @@ def detect_rolling_outliers(data, window_size=100, k=1.5):
     Returns:
         boolean mask: True for outliers, False for normal data
     """
-    rolling_mean = data.rolling(window=window_size, center=True).mean()
-    rolling_std = data.rolling(window=window_size, center=True).std()
+    values = np.asarray(data, dtype=float)
+    rolling_mean, rolling_std = rolling_mean_std(values, window_size)
+    outliers = (values < rolling_mean - k * rolling_std) | (values > rolling_mean + k * rolling_std)
+    return pd.Series(outliers, index=data.index) if isinstance(data, pd.Series) else outliers
+
+
+def compute_pupil_stats(values, methods=tuple(OUTLIER_THRESHOLDS), window_size=100):
+    """
+    Compute the statistics used by the given cleaning methods, so that these methods can
+    be applied to a column at any sensitivity without going over the data again.
     
-    # Handle NaN values at edges
-    rolling_mean = rolling_mean.fillna(method='bfill').fillna(method='ffill')
-    rolling_std = rolling_std.fillna(method='bfill').fillna(method='ffill')
+    Args:
+        values: 1-D array of valid (non-zero, non-NaN) pupil measurements
+        methods: Cleaning methods to compute the statistics of (default: all)
+        window_size: Size of rolling window
+        
+    Returns:
+        dict: Rolling mean/std, quartiles, mean/std and median absolute deviation, as needed
+    """
+    pupil_stats = {}
+    if 'rolling' in methods:
+        pupil_stats['rolling_mean'], pupil_stats['rolling_std'] = rolling_mean_std(values, window_size)
+    if 'iqr' in methods or 'mad' in methods:
+        pupil_stats['q1'], pupil_stats['median'], pupil_stats['q3'] = np.quantile(values, [0.25, 0.5, 0.75])
+    if 'mad' in methods:
+        pupil_stats['mad'] = np.median(np.abs(values - pupil_stats['median']))
+    if 'zscore' in methods:
+        pupil_stats['mean'] = values.mean()
+        pupil_stats['std'] = values.std()
+    return pupil_stats
+
+
+def detect_outliers(values, pupil_stats, method='rolling', sensitivity='high'):
+    """
+    Detect outliers with one cleaning method from precomputed statistics.
     
-    lower_bound = rolling_mean - k * rolling_std
-    upper_bound = rolling_mean + k * rolling_std
+    Args:
+        values: 1-D array of valid pupil measurements
+        pupil_stats: Statistics of the values from compute_pupil_stats
+        method: 'rolling', 'iqr', 'zscore', 'mad'
+        sensitivity: 'low', 'medium', 'high'
+        
+    Returns:
+        boolean array: True for outliers, False for normal data
+    """
+    threshold = OUTLIER_THRESHOLDS[method][sensitivity]
     
-    outliers = (data < lower_bound) | (data > upper_bound)
-    return outliers
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'rolling':
+            deviation = threshold * pupil_stats['rolling_std']
+            return (values < pupil_stats['rolling_mean'] - deviation) | (values > pupil_stats['rolling_mean'] + deviation)
+        
+        if method == 'iqr':
+            iqr = pupil_stats['q3'] - pupil_stats['q1']
+            return (values < pupil_stats['q1'] - threshold * iqr) | (values > pupil_stats['q3'] + threshold * iqr)
+        
+        if method == 'zscore':
+            return np.abs((values - pupil_stats['mean']) / pupil_stats['std']) > threshold
+        
+        # mad
+        modified_z_scores = 0.6745 * (values - pupil_stats['median']) / pupil_stats['mad']
+        return np.abs(modified_z_scores) > threshold
 
 
 def clean_pupil_outliers(df, method='rolling', sensitivity='high', pupil_cols=['LPD', 'RPD']):
@@ -118,83 +232,31 @@ def clean_pupil_outliers(df, method='rolling', sensitivity='high', pupil_cols=['
         print("-" * 20)
         
         # Get valid data
-        valid_mask = (df_clean[col] != 0) & (df_clean[col].notna())
-        valid_data = df_clean.loc[valid_mask, col]
+        values = df_clean[col].to_numpy(dtype=float, copy=True)
+        valid_positions = np.flatnonzero((values != 0) & ~np.isnan(values))
+        valid_data = values[valid_positions]
         
         if len(valid_data) == 0:
             print("  ⚠️ No valid data to clean")
             continue
         
         # Detect outliers based on method and sensitivity
-        outlier_mask = None
+        outlier_mask = detect_outliers(valid_data, compute_pupil_stats(valid_data, [method]), method, sensitivity)
         
-        if method == 'rolling':
-            if sensitivity == 'high':
-                k = 1.5
-            elif sensitivity == 'medium':
-                k = 2.0
-            else:  # low
-                k = 2.5
-            outlier_mask = detect_rolling_outliers(valid_data, window_size=100, k=k)
-            
-        elif method == 'iqr':
-            Q1 = valid_data.quantile(0.25)
-            Q3 = valid_data.quantile(0.75)
-            IQR = Q3 - Q1
-            
-            if sensitivity == 'high':
-                k = 1.0
-            elif sensitivity == 'medium':
-                k = 1.5
-            else:  # low
-                k = 2.0
-                
-            lower_bound = Q1 - k * IQR
-            upper_bound = Q3 + k * IQR
-            outlier_mask = (valid_data < lower_bound) | (valid_data > upper_bound)
-            
-        elif method == 'zscore':
-            if sensitivity == 'high':
-                threshold = 2.5
-            elif sensitivity == 'medium':
-                threshold = 3.0
-            else:  # low
-                threshold = 4.0
-                
-            z_scores = np.abs(stats.zscore(valid_data))
-            outlier_mask = z_scores > threshold
-            
-        elif method == 'mad':
-            median = valid_data.median()
-            mad = np.median(np.abs(valid_data - median))
-            modified_z_scores = 0.6745 * (valid_data - median) / mad
-            
-            if sensitivity == 'high':
-                threshold = 2.5
-            elif sensitivity == 'medium':
-                threshold = 3.5
-            else:  # low
-                threshold = 4.5
-                
-            outlier_mask = np.abs(modified_z_scores) > threshold
+        # Remove outliers
+        values[valid_positions[outlier_mask]] = np.nan
+        df_clean[col] = values
         
-        if outlier_mask is not None:
-            # Get indices of outliers in the original dataframe
-            outlier_indices = valid_data[outlier_mask].index
-            
-            # Remove outliers
-            df_clean.loc[outlier_indices, col] = np.nan
-            
-            removed_count = len(outlier_indices)
-            print(f"  Original valid samples: {len(valid_data)}")
-            print(f"  Outliers detected: {removed_count}")
-            print(f"  Outlier percentage: {removed_count/len(valid_data)*100:.1f}%")
-            
-            cleaning_stats[col] = {
-                'original_valid': len(valid_data),
-                'outliers_removed': removed_count,
-                'outlier_percentage': removed_count/len(valid_data)*100
-            }
+        removed_count = int(outlier_mask.sum())
+        print(f"  Original valid samples: {len(valid_data)}")
+        print(f"  Outliers detected: {removed_count}")
+        print(f"  Outlier percentage: {removed_count/len(valid_data)*100:.1f}%")
+        
+        cleaning_stats[col] = {
+            'original_valid': len(valid_data),
+            'outliers_removed': removed_count,
+            'outlier_percentage': removed_count/len(valid_data)*100
+        }
     
     # Summary
     print(f"\n📊 Cleaning Summary:")
@@ -204,6 +266,89 @@ def clean_pupil_outliers(df, method='rolling', sensitivity='high', pupil_cols=['
     return df_clean, cleaning_stats
 
 
+def select_gaze_columns(gaze_data_path):
+    """
+    Find the TIME column and the required columns in the header of a gaze CSV.
+    
+    Args:
+        gaze_data_path: Path of the gaze CSV
+        
+    Returns:
+        tuple: (time_column, columns_to_keep, missing_columns), time_column is None if not found
+    """
+    available_columns = list(pd.read_csv(gaze_data_path, nrows=0).columns)
+    print(f"Available columns: {available_columns[:10]}...")  # Show first 10 columns
+    
+    # Look for any column that starts with 'TIME' (including formatted ones)
+    time_column = next((col for col in available_columns if col.upper().startswith('TIME')), None)
+    if time_column is None:
+        return None, [], REQUIRED_COLUMNS
+    print(f"✅ Found TIME column: {time_column}")
+    
+    columns_to_keep = [time_column]  # Always keep the time column
+    missing_columns = []
+    for req_col in REQUIRED_COLUMNS:
+        col = next((col for col in available_columns if col.upper() == req_col.upper()), None)
+        if col is None:
+            missing_columns.append(req_col)
+        else:
+            columns_to_keep.append(col)
+    
+    return time_column, columns_to_keep, missing_columns
+
+
+def stream_interval_samples(gaze_data_path, time_column, columns_to_keep, intervals, chunk_rows=GAZE_CHUNK_ROWS):
+    """
+    Read the samples of each time interval from a gaze CSV, one chunk of rows at a time.
+    
+    Only the columns to keep are parsed, as floats, and only the samples inside an
+    interval are kept, so memory is bounded by the chunk and the extracted samples.
+    
+    Args:
+        gaze_data_path: Path of the gaze CSV
+        time_column: Name of the TIME column
+        columns_to_keep: Columns to read, in output order
+        intervals: List of (start_time_s, end_time_s), bounds included
+        chunk_rows: Rows read at a time
+        
+    Returns:
+        tuple: (list of DataFrames with the samples of each interval, reading statistics)
+    """
+    interval_chunks = [[] for _ in intervals]
+    read_stats = {'records': 0, 'chunks': 0, 'time_min': np.nan, 'time_max': np.nan}
+    
+    start = time.perf_counter()
+    reader = pd.read_csv(
+        gaze_data_path,
+        usecols=columns_to_keep,
+        dtype={col: 'float64' for col in columns_to_keep},
+        chunksize=chunk_rows,
+    )
+    for chunk in reader:
+        chunk = chunk[columns_to_keep]  # usecols keeps the file order
+        times = chunk[time_column].to_numpy()
+        for i, (start_time_s, end_time_s) in enumerate(intervals):
+            mask = (times >= start_time_s) & (times <= end_time_s)
+            if mask.any():
+                interval_chunks[i].append(chunk[mask])
+        
+        read_stats['records'] += len(chunk)
+        read_stats['chunks'] += 1
+        read_stats['time_min'] = np.fmin(read_stats['time_min'], np.nanmin(times, initial=np.inf))
+        read_stats['time_max'] = np.fmax(read_stats['time_max'], np.nanmax(times, initial=-np.inf))
+    read_stats['seconds'] = time.perf_counter() - start
+    
+    interval_samples = []
+    for chunks in interval_chunks:
+        samples = pd.concat(chunks) if chunks else pd.DataFrame(columns=columns_to_keep, dtype='float64')
+        for col in samples.columns.intersection(INTEGER_COLUMNS, sort=False):
+            if samples[col].notna().all():
+                samples[col] = samples[col].astype('int64')
+        interval_samples.append(samples)
+    
+    return interval_samples, read_stats
+
+
 def extract_gaze_data(participant_id=3, enable_outlier_cleaning=True, cleaning_method='rolling', cleaning_sensitivity='high'):
     """Extract gaze data with only cognitive load relevant columns."""
 
@@ -261,57 +406,26 @@ def extract_gaze_data(participant_id=3, enable_outlier_cleaning=True, cleaning_m
         print(f"❌ Error loading time intervals: {e}")
         return False
     
-    print(f"\n👁️ Loading gaze data...")
+    print(f"\n👁️ Streaming gaze data...")
     try:
-        # Load gaze data
-        gaze_data = pd.read_csv(gaze_data_path)
-        print(f"✅ Loaded gaze data with {len(gaze_data)} records")
-        
-        # Find the correct TIME column - look for any column starting with 'TIME'
-        time_column = None
-        available_columns = list(gaze_data.columns)
-        print(f"Available columns: {available_columns[:10]}...")  # Show first 10 columns
-        
-        # Look for any column that starts with 'TIME' (including formatted ones)  
-        for col in gaze_data.columns:
-            if col.upper().startswith('TIME'):
-                time_column = col
-                print(f"✅ Found TIME column: {col}")
-                break
-        
+        time_column, columns_to_keep, missing_columns = select_gaze_columns(gaze_data_path)
         if time_column is None:
             print("❌ No TIME column found!")
             return False
         
-        # Define ONLY the columns we want to keep for cognitive load analysis
-        required_columns = [
-            'LPCX', 'LPCY', 'LPD', 'LPS', 'LPV',  # Left pupil
-            'RPCX', 'RPCY', 'RPD', 'RPS', 'RPV',  # Right pupil  
-            'SACCADE_MAG', 'SACCADE_DIR',         # Saccade
-            'BKID', 'BKDUR', 'BKPMIN'             # Blink
-        ]
-        
-        # Find which columns exist in the data
-        columns_to_keep = [time_column]  # Always keep the time column
-        missing_columns = []
-        
-        for req_col in required_columns:
-            found = False
-            for col in available_columns:
-                if col.upper() == req_col.upper():
-                    columns_to_keep.append(col)
-                    found = True
-                    break
-            if not found:
-                missing_columns.append(req_col)
-        
         print(f"\n📋 Column Selection Summary:")
         print(f"✅ Columns to keep ({len(columns_to_keep)}): {columns_to_keep}")
         if missing_columns:
             print(f"⚠️ Missing columns ({len(missing_columns)}): {missing_columns}")
         
+        intervals = list(zip(time_intervals['Start_Time_s'], time_intervals['End_Time_s']))
+        interval_samples, read_stats = stream_interval_samples(gaze_data_path, time_column, columns_to_keep, intervals)
+        print(f"✅ Loaded gaze data with {read_stats['records']} records")
+        print(f"⚡ Streamed {read_stats['chunks']} chunks in {read_stats['seconds']:.2f}s "
+              f"({read_stats['records'] / max(read_stats['seconds'], 1e-9):.0f} records/s)")
+        
         print(f"Using time column: {time_column}")
-        print(f"Time range in data: {gaze_data[time_column].min():.3f} - {gaze_data[time_column].max():.3f} seconds")
+        print(f"Time range in data: {read_stats['time_min']:.3f} - {read_stats['time_max']:.3f} seconds")
         
     except FileNotFoundError:
         print(f"❌ Error: {gaze_data_path} not found")
@@ -327,7 +441,7 @@ def extract_gaze_data(participant_id=3, enable_outlier_cleaning=True, cleaning_m
     all_quality_reports = []
     
     # Extract data for each time interval
-    for i, row in time_intervals.iterrows():
+    for (_, row), interval_data in zip(time_intervals.iterrows(), interval_samples):
         round_id = row['Round_ID']
         segment_id = row['Segment_ID'] if pd.notna(row['Segment_ID']) else 'Unknown'
         start_time_s = row['Start_Time_s']
@@ -335,15 +449,8 @@ def extract_gaze_data(participant_id=3, enable_outlier_cleaning=True, cleaning_m
         
         print(f"  Extracting Round {round_id}, Segment {segment_id}: {start_time_s}s - {end_time_s}s")
         
-        # Filter gaze data for this time interval using the correct time column
-        mask = (gaze_data[time_column] >= start_time_s) & (gaze_data[time_column] <= end_time_s)
-        interval_data = gaze_data[mask].copy()
-        
         if len(interval_data) > 0:
-            # Keep ONLY the specified columns for cognitive load analysis
-            interval_data_filtered = interval_data[columns_to_keep].copy()
-            
-            interval_data_clean, quality_report = filter_invalid_samples(interval_data_filtered, time_column)
+            interval_data_clean, quality_report = filter_invalid_samples(interval_data, time_column)
             
             if len(interval_data_clean) > 0:
             # Add metadata columns to identify which interval this data belongs to
@@ -394,8 +501,8 @@ def extract_gaze_data(participant_id=3, enable_outlier_cleaning=True, cleaning_m
     
     print(f"\n🎉 Success! Extracted data saved to: {output_path}")
     print(f"📊 Total extracted records: {len(extracted_df)}")
-    print(f"📊 Original data records: {len(gaze_data)}")
-    print(f"📊 Extraction ratio: {len(extracted_df)/len(gaze_data)*100:.1f}%")
+    print(f"📊 Original data records: {read_stats['records']}")
+    print(f"📊 Extraction ratio: {len(extracted_df)/read_stats['records']*100:.1f}%")
     print(f"📊 Final columns ({len(extracted_df.columns)}): {list(extracted_df.columns)}")
     
     # Verify participant_id column
@@ -441,12 +548,49 @@ def extract_gaze_data(participant_id=3, enable_outlier_cleaning=True, cleaning_m
     return True
 
 
+def _extract_gaze_data_quietly(args):
+    """Run extract_gaze_data in a worker process and return its output instead of printing it."""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        success = extract_gaze_data(*args)
+    return success, log.getvalue()
+
+
+def extract_gaze_data_parallel(participant_ids, enable_outlier_cleaning=True, cleaning_method='rolling', cleaning_sensitivity='high', workers=None):
+    """
+    Extract the gaze data of several participants in parallel, one process per participant.
+    The output of each participant is printed once it is done, in order.
+    
+    Args:
+        participant_ids: Participant IDs
+        workers: Number of worker processes (default: number of CPUs)
+        
+    Returns:
+        list: IDs of the participants whose extraction failed
+    """
+    jobs = [(participant_id, enable_outlier_cleaning, cleaning_method, cleaning_sensitivity) for participant_id in participant_ids]
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for participant_id, (success, log) in zip(participant_ids, executor.map(_extract_gaze_data_quietly, jobs)):
+            print(log)
+            if not success:
+                failed.append(participant_id)
+    return failed
+
+
+def find_gaze_participants():
+    """IDs of the participants with a gaze data file"""
+    gaze_files = Path("Participants").glob("User *_all_gaze.csv")
+    return sorted(int(f.name[len("User "):-len("_all_gaze.csv")]) for f in gaze_files)
+
+
 def print_usage():
     """Print usage instructions."""
     print("Usage: python extract_gaze_data_fixed.py [participant_id] [cleaning_method] [sensitivity]")
     print("")
     print("Arguments:")
-    print("  participant_id    Participant ID (default: 3)")
+    print("  participant_id    Participant ID (default: 3), several IDs like 3,5,7 or 'all',")
+    print("                    processed in parallel")
     print("  cleaning_method   Outlier cleaning method:")
     print("                    - rolling (default, recommended for time series)")
     print("                    - iqr (interquartile range)")
@@ -463,6 +607,7 @@ def print_usage():
     print("  python extract_gaze_data_fixed.py 5 rolling high")
     print("  python extract_gaze_data_fixed.py 3 iqr medium")
     print("  python extract_gaze_data_fixed.py 3 none")
+    print("  python extract_gaze_data_fixed.py all rolling high")
 
 
 if __name__ == "__main__":
@@ -470,7 +615,7 @@ if __name__ == "__main__":
     print("============================================\n")
     
     # Parse command line arguments
-    participant_id = 3  # Default value
+    participant_ids = [3]  # Default value
     enable_cleaning = True
     cleaning_method = 'rolling'
     cleaning_sensitivity = 'high'
@@ -480,16 +625,19 @@ if __name__ == "__main__":
         print_usage()
         sys.exit(0)
     
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == 'all':
+        participant_ids = find_gaze_participants()
+        print(f"🎯 Using all participant IDs with gaze data: {participant_ids}")
+    elif len(sys.argv) > 1:
         try:
-            participant_id = int(sys.argv[1])
-            print(f"🎯 Using participant ID from command line: {participant_id}")
+            participant_ids = [int(arg) for arg in sys.argv[1].split(',')]
+            print(f"🎯 Using participant IDs from command line: {participant_ids}")
         except ValueError:
             print("❌ Error: Participant ID must be an integer")
             print_usage()
             sys.exit(1)
     else:
-        print(f"🎯 Using default participant ID: {participant_id}")
+        print(f"🎯 Using default participant ID: {participant_ids[0]}")
         print("💡 Tip: You can specify participant ID like: python extract_gaze_data_fixed.py 3")
     
     # Parse cleaning options
@@ -512,7 +660,13 @@ if __name__ == "__main__":
         else:
             print(f"⚠️ Unknown sensitivity: {sensitivity_arg}, using default: high")
     
-    success = extract_gaze_data(participant_id, enable_cleaning, cleaning_method, cleaning_sensitivity)
+    if len(participant_ids) == 1:
+        success = extract_gaze_data(participant_ids[0], enable_cleaning, cleaning_method, cleaning_sensitivity)
+    else:
+        failed = extract_gaze_data_parallel(participant_ids, enable_cleaning, cleaning_method, cleaning_sensitivity)
+        if failed:
+            print(f"❌ Extraction failed for participants: {failed}")
+        success = len(failed) < len(participant_ids)
     
     if success:
         print("\n✅ Data extraction completed successfully!")
@@ -4,19 +4,69 @@ Parse Game Logs
 Extract structured data from JSON game logs for analysis
 """
 
+import hashlib
 import json
+import pickle
+import time
 import pandas as pd
 import numpy as np
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+# Bump when the output of parse_game_log changes, so that cached results are parsed again
+PARSER_VERSION = 2
+PARSE_CACHE_DIR = Path("Participants") / ".parse_cache"
+
+# The trajectory reader of the game server, from utils/ at the repository root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.state_record import OBJECT_FIELDS
+from utils.trajectory_log import load_trajectory
+
+def parse_state_records(data):
+    """Parse the trajectory of a log with typed state records (utils.state_record) column-wise, without eval"""
+    
+    traj = data['traj']
+    state_fields = data['state_fields'][0]
+    states = pd.DataFrame([entry['state_record'] for entry in traj], columns=state_fields)
+    actions = [entry.get('action', [None, None]) for entry in traj]
+    messages = [entry.get('message', []) for entry in traj]
+    assigned_tasks = [entry.get('assigned_tasks', []) for entry in traj]
+    n_assigned_tasks = np.array([len(tasks) for tasks in assigned_tasks], dtype=int)
+    
+    return pd.DataFrame({
+        'timestep': [entry['t'] for entry in traj],
+        'wall_time': [entry.get('wall_time', np.nan) for entry in traj],
+        'score': [entry['score'] for entry in traj],
+        'total_score': states['total_score'],
+        'n_orders': states['n_orders'],
+        'n_objects': sum(field in OBJECT_FIELDS for field in state_fields),  # object kinds of the state
+        'n_messages': [len(message) for message in messages],
+        'human_action': [action[0] for action in actions],
+        'ai_action': [action[1] for action in actions],
+        'has_assigned_tasks': n_assigned_tasks > 0,
+        'n_assigned_tasks': n_assigned_tasks,
+        'messages': messages,
+        'assigned_tasks': assigned_tasks,
+    })
+
 def parse_game_log(json_file_path):
     """Parse a single game log file"""
     
-    with open(json_file_path, 'r') as f:
-        data = json.load(f)
+    data = load_trajectory(str(json_file_path))
+    
+    # Parse other event data
+    events_data = {
+        'urgent_responses': data.get('urgent_response', []),
+        'reflections': data.get('reflection', []),
+        'text_actions': data.get('text_action', [])
+    }
+    
+    if 'state_fields' in data:
+        return parse_state_records(data), events_data
     
-    # Parse trajectory data
+    # Parse trajectory data of older logs, which store the state as str(dict)
     traj_data = []
     for entry in data['traj']:
         try:
@@ -27,6 +77,7 @@ def parse_game_log(json_file_path):
             # Extract key information
             parsed_entry = {
                 'timestep': entry['t'],
+                'wall_time': entry.get('wall_time', np.nan),  # only in logs recorded with the tick scheduler
                 'score': entry['score'],
                 'total_score': state_dict.get('total_score', 0),
                 'n_orders': len(state_dict.get('orders', [])),
@@ -46,15 +97,76 @@ def parse_game_log(json_file_path):
             print(f"  ⚠️ Error parsing timestep {entry['t']}: {e}")
             continue
     
-    # Parse other event data
-    events_data = {
-        'urgent_responses': data.get('urgent_response', []),
-        'reflections': data.get('reflection', []),
-        'text_actions': data.get('text_action', [])
-    }
-    
     return pd.DataFrame(traj_data), events_data
 
+def _parse_cache_path(file_path):
+    """Cache file of a game log, keyed on its content and the parser version"""
+    with open(file_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return PARSE_CACHE_DIR / f"{digest}_v{PARSER_VERSION}.pkl"
+
+def parse_game_logs_cached(file_paths, workers=None):
+    """
+    Parse game log files in a process pool, reusing the cached results of files parsed before.
+    
+    Args:
+        file_paths: Game log files
+        workers: Number of worker processes (default: number of CPUs)
+        
+    Returns:
+        dict: File path to (game DataFrame, events data) of parse_game_log, or to the exception raised by a file
+            that could not be parsed, which is not cached
+    """
+    start_time = time.perf_counter()
+    PARSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    
+    results = {}
+    misses = {}
+    n_hits = 0
+    for file_path in file_paths:
+        try:
+            cache_path = _parse_cache_path(file_path)
+        except OSError as e:
+            results[file_path] = e
+            continue
+        try:
+            with open(cache_path, 'rb') as f:
+                results[file_path] = pickle.load(f)
+            n_hits += 1
+        except Exception:
+            misses[file_path] = cache_path  # not cached, or written by another pandas version
+    
+    parsed = []
+    if len(misses) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(parse_game_log, file_path) for file_path in misses]
+            for future in futures:
+                try:
+                    parsed.append(future.result())
+                except Exception as e:  # raised by the file, or a crash of the worker
+                    parsed.append(e)
+    else:
+        for file_path in misses:
+            try:
+                parsed.append(parse_game_log(file_path))
+            except Exception as e:
+                parsed.append(e)
+    for (file_path, cache_path), result in zip(misses.items(), parsed):
+        results[file_path] = result
+        if isinstance(result, Exception):
+            continue
+        with open(cache_path, 'wb') as f:
+            pickle.dump(result, f)
+    
+    elapsed = time.perf_counter() - start_time
+    n_files = len(file_paths)
+    n_failed = sum(isinstance(result, Exception) for result in results.values())
+    if n_files > 0:
+        print(f"  ⚡ Parsed {n_files} game logs in {elapsed:.2f}s ({n_files / elapsed:.1f} files/s), "
+              f"cache hit rate {n_hits / n_files:.0%}"
+              + (f", {n_failed} failed" if n_failed else ""))
+    return results
+
 def add_round_dependent_columns(df, participant_id):
     """Add round-dependent columns to the DataFrame"""
     
@@ -87,7 +199,7 @@ def add_round_dependent_columns(df, participant_id):
     if mode_switch_file.exists():
         print(f"  📊 Loading mode switches for participant {participant_id}...")
         try:
-            all_switches_df = pd.read_csv(mode_switch_file)
+            all_switches_df = load_mode_switches()
             switches_df = all_switches_df[all_switches_df['participant_id'] == participant_id]
 
             print(f"    Found {len(switches_df)} switches for participant {participant_id}")
@@ -151,26 +263,11 @@ def add_round_dependent_columns(df, participant_id):
         print(f"  📝 No mode_switch.csv found - using default initial modes only")
 
         # Initialize the new columns
-    df['n_human_message'] = 0
-    df['n_ai_message'] = 0
-    
-    # Calculate message counts based on Current_Mode
-    for idx, row in df.iterrows():
-        current_mode = row['Current_Mode']
-        n_messages = row['n_messages']
-        
-        if pd.isna(current_mode):
-            # If mode is NaN, don't assign messages to either category
-            df.loc[idx, 'n_human_message'] = 0
-            df.loc[idx, 'n_ai_message'] = 0
-        elif current_mode == 0:
-            # Human-led mode: all messages count as human messages
-            df.loc[idx, 'n_human_message'] = n_messages
-            df.loc[idx, 'n_ai_message'] = 0
-        elif current_mode == 1:
-            # AI-led mode: all messages count as AI messages
-            df.loc[idx, 'n_human_message'] = 0
-            df.loc[idx, 'n_ai_message'] = n_messages
+    # Calculate message counts based on Current_Mode (no messages are assigned if the mode is NaN)
+    # Human-led mode: all messages count as human messages
+    df['n_human_message'] = np.where(df['Current_Mode'] == 0, df['n_messages'], 0)
+    # AI-led mode: all messages count as AI messages
+    df['n_ai_message'] = np.where(df['Current_Mode'] == 1, df['n_messages'], 0)
     
     # Show summary of message distribution
     total_human_messages = df['n_human_message'].sum()
@@ -179,6 +276,19 @@ def add_round_dependent_columns(df, participant_id):
     
     return df
 
+@lru_cache(maxsize=None)
+def load_mode_switches():
+    """Load mode_switch.csv once per run"""
+    return pd.read_csv(Path("Participants") / "mode_switch.csv")
+
+@lru_cache(maxsize=None)
+def load_participant_mapping():
+    """Load participant_mapping.csv once per run"""
+    mapping_df = pd.read_csv(Path("Participants") / "participant_mapping.csv")
+    # Remove any extra spaces from column names
+    mapping_df.columns = mapping_df.columns.str.strip()
+    return mapping_df
+
 def get_participant_name(participant_id):
     """Get participant name from mapping file"""
     participants_dir = Path("Participants")
@@ -186,9 +296,7 @@ def get_participant_name(participant_id):
     
     if mapping_file.exists():
         try:
-            mapping_df = pd.read_csv(mapping_file)
-            # Remove any extra spaces from column names
-            mapping_df.columns = mapping_df.columns.str.strip()
+            mapping_df = load_participant_mapping()
             
             participant_row = mapping_df[mapping_df['participant_id'] == participant_id]
             if not participant_row.empty:
@@ -208,9 +316,9 @@ def find_game_files(participant_name, participants_dir):
     target_rounds = [0, 9, 10, 11, 12]
     
     for round_id in target_rounds:
-        # Look for files matching pattern: {name}_*_{round}_*.json
+        # Look for files matching pattern: {name}_*_{round}_*.json (or .jsonl)
         pattern = f"{participant_name}_*_{round_id}_*.json"
-        matching_files = list(participants_dir.glob(pattern))
+        matching_files = list(participants_dir.glob(pattern)) + list(participants_dir.glob(pattern + "l"))
         
         if matching_files:
             # Use the first matching file
@@ -288,8 +396,8 @@ def extract_subjective_cognitive_load(questionnaire_data, round_id):
     
     return None
 
-def parse_all_game_logs(participant_id=3):
-    """Parse all game log files for a given participant"""
+def parse_all_game_logs(participant_id=3, use_store=False):
+    """Parse all game log files for a given participant (from the trajectory store if use_store)"""
     
     participants_dir = Path("Participants")
     
@@ -313,6 +421,16 @@ def parse_all_game_logs(participant_id=3):
     all_game_data = []
     all_events_data = {}
     
+    if use_store:
+        # Only the new or changed logs are parsed, the others are read from the store
+        from trajectory_store import ingest_game_logs, read_table, write_table
+        ingest_game_logs([participant_id])
+        stored_df = read_table("game", participant_id=participant_id)
+    else:
+        existing_files = [participants_dir / filename for filename in game_files.values()
+                          if (participants_dir / filename).exists()]
+        parsed_logs = parse_game_logs_cached(existing_files)
+    
     print(f"🎮 Parsing Game Logs for Participant {participant_id}...")
     
     for round_id, filename in game_files.items():
@@ -325,7 +443,15 @@ def parse_all_game_logs(participant_id=3):
         print(f"  📊 Parsing Round {round_id}...")
         
         try:
-            game_df, events = parse_game_log(file_path)
+            if use_store:
+                game_df = stored_df[stored_df['source'] == filename].reset_index(drop=True)
+                game_df = game_df.drop(columns=['source', 'participant_id', 'round_id'])
+                events = {}  # the store only holds the timesteps
+            else:
+                parsed_log = parsed_logs[file_path]
+                if isinstance(parsed_log, Exception):
+                    raise parsed_log
+                game_df, events = parsed_log
             
             # Add round identifier
             game_df['round_id'] = round_id
@@ -369,6 +495,9 @@ def parse_all_game_logs(participant_id=3):
         output_path = participants_dir / "outputs" / f"parsed_game_data_{participant_id}.csv"
         combined_game_df.to_csv(output_path, index=False)
         print(f"\n💾 Saved parsed game data to: {output_path}")
+        if use_store:
+            write_table("parsed", combined_game_df)
+            print(f"💾 Saved parsed game data to the trajectory store")
         print(f"📊 Total {len(combined_game_df)} game timesteps across all rounds")
         
         # Show questionnaire summary
@@ -407,14 +536,32 @@ def parse_all_game_logs(participant_id=3):
 
 if __name__ == "__main__":
 
-    if len(sys.argv) > 1:
-        participant_id = int(sys.argv[1])
-        print(f"🎯 Using participant ID from command line: {participant_id}")
+    # --store: read the game logs through the trajectory store (see trajectory_store.py)
+    use_store = '--store' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--store']
+
+    # One or more participant IDs, or "all" for every participant in participant_mapping.csv
+    if args == ['all']:
+        participant_ids = load_participant_mapping()['participant_id'].tolist()
+        print(f"🎯 Using all participant IDs: {participant_ids}")
+    elif len(args) > 0:
+        participant_ids = [int(arg) for arg in args]
+        print(f"🎯 Using participant IDs from command line: {participant_ids}")
     else:
-        participant_id = 3  # Default value
-        print(f"🎯 Using default participant ID: {participant_id}")
+        participant_ids = [3]  # Default value
+        print(f"🎯 Using default participant ID: {participant_ids[0]}")
+
+    if len(participant_ids) > 1 and not use_store:
+        # Parse the logs of all participants in one process pool, the runs below then hit the cache
+        participants_dir = Path("Participants")
+        all_files = []
+        for participant_id in participant_ids:
+            game_files = find_game_files(get_participant_name(participant_id), participants_dir)
+            all_files += [participants_dir / filename for filename in game_files.values()]
+        parse_game_logs_cached(all_files)
 
-    game_df, events = parse_all_game_logs(participant_id)
-    if game_df is not None:
-        print(f"\n✅ Game log parsing completed successfully for participant {participant_id}!")
-        print(f"📄 Output file: Participants/parsed_game_data_participant_{participant_id}.csv")
\ No newline at end of file
+    for participant_id in participant_ids:
+        game_df, events = parse_all_game_logs(participant_id, use_store=use_store)
+        if game_df is not None:
+            print(f"\n✅ Game log parsing completed successfully for participant {participant_id}!")
+            print(f"📄 Output file: Participants/parsed_game_data_participant_{participant_id}.csv")
\ No newline at end of file
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Analysis Pipeline
+=================
+
+Run the analysis scripts as one task graph, skipping the stages whose inputs did not change.
+
+Stages of each participant (participants run in parallel):
+- extract_gaze:<id>  extract_gaze_data_fixed.py  User <id>_all_gaze.csv -> outputs/extracted_gaze_data_<id>.csv
+- parse:<id>         parse_game_logs.py          'game' table -> 'parsed' table
+- aggregate:<id>     aggregate_data.py           'parsed' table + extracted gaze data -> 'aggregated' table
+
+Stages of all participants:
+- ingest             trajectory_store.py                  game logs -> 'game' table
+- combine            simple_aggregate.py                  'aggregated' table -> combined_aggregated_data.csv
+- zscore             zscore_0to10_cognitive_load.py       -> combined_aggregated_data_zscore_0to10_cognitive_load.csv
+- patterns           analyze_cognitive_load_patterns.py
+- ideal_modes        ideal_mode_preference_analysis.py    -> ideal_mode_preference_analysis.png
+
+A stage is skipped when the SHA-256 of its input files (data and scripts) is the same as in its
+last successful run and its outputs exist. Stages exchange the game data through the Parquet
+tables of the trajectory store (see trajectory_store.py) instead of the CSV files, which the
+scripts still write.
+
+The hashes are kept in Participants/.pipeline/state.json, the output of every stage in
+Participants/.pipeline/logs/<stage>.log. Requires pyarrow.
+
+Usage:
+    python analysis/pipeline.py                 # all participants with gaze data
+    python analysis/pipeline.py 3 17            # only participants 3 and 17
+    python analysis/pipeline.py --dry-run       # list the stages that would run
+    python analysis/pipeline.py --force         # run all stages
+    python analysis/pipeline.py --workers 4     # number of worker processes
+"""
+
+import contextlib
+import glob
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+PARTICIPANTS_DIR = Path("Participants")
+OUTPUTS_DIR = PARTICIPANTS_DIR / "outputs"
+STORE_DIR = PARTICIPANTS_DIR / "store"
+PIPELINE_DIR = PARTICIPANTS_DIR / ".pipeline"
+STATE_FILE = PIPELINE_DIR / "state.json"
+LOGS_DIR = PIPELINE_DIR / "logs"
+SCRIPTS_DIR = Path(__file__).parent
+
+
+@dataclass
+class Stage:
+    """A function of an analysis script, with the files it reads and writes"""
+
+    name: str
+    module: str
+    function: str
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    inputs: list = field(default_factory=list)  # glob patterns, the script of the module is always an input
+    outputs: list = field(default_factory=list)  # files or directories written by every successful run
+    deps: list = field(default_factory=list)  # names of the stages to run first
+
+
+def build_stages(participant_ids):
+    """
+    Declare the stages of the pipeline for the given participants.
+
+    Args:
+        participant_ids: Participants to extract, parse and aggregate
+
+    Returns:
+        list: Stages
+    """
+    from parse_game_logs import get_participant_name
+
+    stages = [
+        Stage(
+            "ingest",
+            "trajectory_store",
+            "ingest_game_logs",
+            args=(list(participant_ids),),
+            inputs=[str(PARTICIPANTS_DIR / "participant_mapping.csv")]
+            + [str(PARTICIPANTS_DIR / f"{get_participant_name(pid)}_*.json*") for pid in participant_ids],
+            outputs=[str(STORE_DIR / "_manifest.json")],
+        ),
+    ]
+
+    for pid in participant_ids:
+        participant_name = get_participant_name(pid)
+        extracted_file = str(OUTPUTS_DIR / f"extracted_gaze_data_{pid}.csv")
+        stages += [
+            Stage(
+                f"extract_gaze:{pid}",
+                "extract_gaze_data_fixed",
+                "extract_gaze_data",
+                args=(pid,),
+                inputs=[
+                    str(PARTICIPANTS_DIR / f"User {pid}_all_gaze.csv"),
+                    str(PARTICIPANTS_DIR / "Eyetracking_log.csv"),
+                ],
+                outputs=[extracted_file],
+            ),
+            Stage(
+                f"parse:{pid}",
+                "parse_game_logs",
+                "parse_all_game_logs",
+                args=(pid,),
+                kwargs={"use_store": True},
+                inputs=[
+                    str(STORE_DIR / "game" / f"participant_id={pid}" / "*" / "*.parquet"),
+                    str(PARTICIPANTS_DIR / f"{participant_name}_*.json"),  # questionnaire
+                    str(PARTICIPANTS_DIR / "participant_mapping.csv"),
+                    str(PARTICIPANTS_DIR / "mode_switch.csv"),
+                ],
+                outputs=[str(STORE_DIR / "parsed" / f"participant_id={pid}")],
+                deps=["ingest"],
+            ),
+            Stage(
+                f"aggregate:{pid}",
+                "aggregate_data",
+                "aggregate_game_eyetracking_data",
+                args=(pid,),
+                kwargs={"use_store": True},
+                inputs=[str(STORE_DIR / "parsed" / f"participant_id={pid}" / "*" / "*.parquet"), extracted_file],
+                outputs=[str(STORE_DIR / "aggregated" / f"participant_id={pid}")],
+                deps=[f"parse:{pid}", f"extract_gaze:{pid}"],
+            ),
+        ]
+
+    zscore_file = "combined_aggregated_data_zscore_0to10_cognitive_load.csv"
+    stages += [
+        Stage(
+            "combine",
+            "simple_aggregate",
+            "aggregate_data",
+            kwargs={"use_store": True},
+            inputs=[str(STORE_DIR / "aggregated" / "*" / "*" / "*.parquet")],
+            outputs=["combined_aggregated_data.csv"],
+            deps=[f"aggregate:{pid}" for pid in participant_ids],
+        ),
+        Stage(
+            "zscore",
+            "zscore_0to10_cognitive_load",
+            "main",
+            inputs=["combined_aggregated_data.csv", str(OUTPUTS_DIR / "extracted_gaze_data_*.csv")],
+            outputs=[zscore_file, "baseline_pupil_data_zscore_0to10.csv"],
+            deps=["combine"] + [f"extract_gaze:{pid}" for pid in participant_ids],
+        ),
+        Stage("patterns", "analyze_cognitive_load_patterns", "main", inputs=[zscore_file], deps=["zscore"]),
+        Stage(
+            "ideal_modes",
+            "ideal_mode_preference_analysis",
+            "main",
+            inputs=[zscore_file],
+            outputs=["ideal_mode_preference_analysis.png"],
+            deps=["zscore"],
+        ),
+    ]
+    return stages
+
+
+def file_digest(path, file_hashes):
+    """SHA-256 of a file, reused while its size and modification time do not change"""
+    file_stat = os.stat(path)
+    cached = file_hashes.get(path)
+    if cached and cached[:2] == [file_stat.st_size, file_stat.st_mtime_ns]:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    file_hashes[path] = [file_stat.st_size, file_stat.st_mtime_ns, digest.hexdigest()]
+    return file_hashes[path][2]
+
+
+def hash_inputs(stage, file_hashes):
+    """Hash of the stage call and of the contents of its input files"""
+    digest = hashlib.sha256(repr((stage.module, stage.function, stage.args, stage.kwargs)).encode())
+    paths = {str(SCRIPTS_DIR / f"{stage.module}.py")}
+    for pattern in stage.inputs:
+        paths.update(glob.glob(pattern))
+    for path in sorted(paths):
+        digest.update(f"{path}\0{file_digest(path, file_hashes)}\n".encode())
+    return digest.hexdigest()
+
+
+def load_state():
+    if STATE_FILE.exists():
+        with open(STATE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {"stages": {}, "files": {}}
+
+
+def save_state(state):
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = STATE_FILE.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def _run_stage(module, function, args, kwargs, log_path):
+    """Run a stage function in a worker process, with its output in the stage log"""
+    with open(log_path, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            result = getattr(importlib.import_module(module), function)(*args, **kwargs)
+        except Exception:
+            traceback.print_exc()
+            return False
+    return result is not False
+
+
+def run_pipeline(stages, force=False, dry_run=False, workers=None):
+    """
+    Run the stages in dependency order, independent stages in parallel.
+
+    A stage succeeds if its function did not raise or return False and it rewrote all of its
+    outputs. The stages depending on a failed stage are not run.
+
+    Args:
+        stages: Stages from build_stages
+        force: Run the stages even if their inputs did not change
+        dry_run: Only print which stages would run
+        workers: Number of worker processes (default: number of CPUs)
+
+    Returns:
+        dict: Stage name to 'ran', 'skipped', 'failed', 'blocked' or 'stale' (would run, dry run only)
+    """
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = set(stage.deps) - names
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {sorted(unknown)}")
+
+    state = load_state()
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    pending = {stage.name: stage for stage in stages}
+    status = {}
+    running = {}
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for stage in list(pending.values()):
+                if any(status.get(dep) in ("failed", "blocked") for dep in stage.deps):
+                    status[stage.name] = "blocked"
+                    del pending[stage.name]
+                    print(f"  ⛔ {stage.name}: blocked by a failed stage")
+                    continue
+                if not all(dep in status for dep in stage.deps):
+                    continue
+                del pending[stage.name]
+
+                input_hash = hash_inputs(stage, state["files"])
+                stale = (
+                    force
+                    or state["stages"].get(stage.name) != input_hash
+                    or not all(os.path.exists(output) for output in stage.outputs)
+                    # in a dry run the inputs written by the stale dependencies are not there yet
+                    or any(status[dep] == "stale" for dep in stage.deps)
+                )
+                if not stale:
+                    status[stage.name] = "skipped"
+                    print(f"  ⏭️ {stage.name}: up to date")
+                elif dry_run:
+                    status[stage.name] = "stale"
+                    print(f"  🔄 {stage.name}: would run")
+                else:
+                    print(f"  🔄 {stage.name}: running")
+                    log_path = str(LOGS_DIR / f"{stage.name.replace(':', '_')}.log")
+                    future = executor.submit(
+                        _run_stage, stage.module, stage.function, stage.args, stage.kwargs, log_path
+                    )
+                    running[future] = (stage, time.time(), time.perf_counter())
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, started_at, stage_start = running.pop(future)
+                rewritten = all(
+                    os.path.exists(output) and os.stat(output).st_mtime >= started_at for output in stage.outputs
+                )
+                elapsed = time.perf_counter() - stage_start
+                if future.result() and rewritten:
+                    status[stage.name] = "ran"
+                    # Hash the inputs again, as the stage may have changed them
+                    state["stages"][stage.name] = hash_inputs(stage, state["files"])
+                    save_state(state)
+                    print(f"  ✅ {stage.name}: done in {elapsed:.1f}s")
+                else:
+                    status[stage.name] = "failed"
+                    state["stages"].pop(stage.name, None)
+                    save_state(state)
+                    print(
+                        f"  ❌ {stage.name}: failed after {elapsed:.1f}s, see {LOGS_DIR / stage.name.replace(':', '_')}.log"
+                    )
+
+    counts = {key: list(status.values()).count(key) for key in ("stale", "ran", "skipped", "failed", "blocked")}
+    print(
+        f"\n⚡ Pipeline finished in {time.perf_counter() - start_time:.1f}s: "
+        + ", ".join(f"{count} {key}" for key, count in counts.items() if count or key != "stale")
+    )
+    return status
+
+
+if __name__ == "__main__":
+    print("🔗 Analysis Pipeline")
+    print("=" * 50)
+
+    force = "--force" in sys.argv[1:]
+    dry_run = "--dry-run" in sys.argv[1:]
+    workers = None
+    args = [arg for arg in sys.argv[1:] if arg not in ("--force", "--dry-run")]
+    if "--workers" in args:
+        index = args.index("--workers")
+        workers = int(args[index + 1])
+        del args[index : index + 2]
+
+    if args:
+        participant_ids = [int(arg) for arg in args]
+        print(f"🎯 Using participant IDs from command line: {participant_ids}")
+    else:
+        from extract_gaze_data_fixed import find_gaze_participants
+        from parse_game_logs import load_participant_mapping
+
+        mapped_ids = set(load_participant_mapping()["participant_id"])
+        participant_ids = [pid for pid in find_gaze_participants() if pid in mapped_ids]
+        print(f"🎯 Using all participant IDs with gaze data: {participant_ids}")
+
+    status = run_pipeline(build_stages(participant_ids), force=force, dry_run=dry_run, workers=workers)
+    sys.exit(1 if "failed" in status.values() else 0)
@@ -9,10 +9,20 @@ Aggregate all aggregated_data_*.csv files with participant_id as first column.
 import pandas as pd
 import glob
 import os
+import sys
 from pathlib import Path
 
-def aggregate_data():
-    """Aggregate all aggregated_data_*.csv files."""
+def aggregate_data(use_store=False):
+    """Aggregate all aggregated_data_*.csv files (or the 'aggregated' table of the trajectory store)."""
+    
+    if use_store:
+        from trajectory_store import read_table
+        print("📁 Reading the aggregated table of the trajectory store")
+        combined = read_table("aggregated")
+        if len(combined) == 0:
+            print("❌ No aggregated data in the trajectory store!")
+            return None
+        return save_combined(combined)
     
     # Look for files in current directory and Participants/outputs
     search_paths = [".", "Participants/outputs"]
@@ -54,6 +64,10 @@ def aggregate_data():
     # Combine all dataframes
     print(f"\n🔗 Combining {len(dfs)} dataframes...")
     combined = pd.concat(dfs, ignore_index=True)
+    return save_combined(combined)
+
+def save_combined(combined):
+    """Save the combined data with participant_id as first column."""
     
     # Reorder columns to put participant_id first
     if 'participant_id' in combined.columns:
@@ -86,7 +100,8 @@ if __name__ == "__main__":
     print("🔍 CSV Aggregation Tool")
     print("=" * 30)
     
-    result = aggregate_data()
+    # --store: read the 'aggregated' table of the trajectory store (see trajectory_store.py)
+    result = aggregate_data(use_store='--store' in sys.argv[1:])
     
     if result is not None:
         print(f"\n🎉 Aggregation completed successfully!")
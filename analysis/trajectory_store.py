@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Trajectory Store
+================
+
+Columnar store of the game data, so that the analysis scripts do not re-parse the JSON game logs on every run.
+
+Layout (one Parquet file per partition, rows in timestep order):
+    Participants/store/<table>/participant_id=<id>/round_id=<round>/<name>.parquet
+
+Tables:
+- game:       rows of parse_game_log for every game log, ingested by this script
+- parsed:     output of parse_all_game_logs (python analysis/parse_game_logs.py <id> --store)
+- aggregated: output of aggregate_game_eyetracking_data (python analysis/aggregate_data.py <id> --store)
+
+Reads only open the partitions matching participant_id / round_id, and filters on other columns are pushed down to
+the Parquet row groups, e.g.
+    read_table("aggregated", round_id=9, columns=["timestep", "avg_lpd"], filters=[("has_eye_data", "==", True)])
+
+Ingestion is incremental: _manifest.json records the size and mtime of every ingested game log (.json or the .jsonl
+streamed by the game server), and only new or changed logs are parsed.
+
+Requires pyarrow.
+
+Usage:
+    python analysis/trajectory_store.py              # ingest new logs of all participants
+    python analysis/trajectory_store.py 3 4          # ingest new logs of participants 3 and 4
+    python analysis/trajectory_store.py --rebuild    # ingest all logs again
+"""
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARTICIPANTS_DIR = Path("Participants")
+STORE_DIR = PARTICIPANTS_DIR / "store"
+MANIFEST_FILE = STORE_DIR / "_manifest.json"
+
+# Columns holding lists, saved as JSON strings
+LIST_COLUMNS = ["messages", "assigned_tasks"]
+
+
+def _partition_dir(table, participant_id, round_id):
+    return STORE_DIR / table / f"participant_id={participant_id}" / f"round_id={round_id}"
+
+
+def _partition_value(path):
+    return int(path.name.split("=", 1)[1])
+
+
+def _to_arrow(df):
+    """Convert a DataFrame to an Arrow table, with list columns as JSON and columns of mixed objects as strings"""
+    df = df.copy()
+    for column in LIST_COLUMNS:
+        if column in df.columns:
+            df[column] = [json.dumps(value, ensure_ascii=False) for value in df[column]]
+    for column in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            df[column] = df[column].astype(str)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_partitions(table, df, name="data"):
+    """
+    Write the rows of a DataFrame with participant_id and round_id columns into the partitions of a table,
+    replacing the file `name` of each partition.
+    """
+    for (participant_id, round_id), part_df in df.groupby(["participant_id", "round_id"], sort=False):
+        partition_dir = _partition_dir(table, participant_id, round_id)
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        pq.write_table(_to_arrow(part_df), partition_dir / f"{name}.parquet")
+
+
+def write_table(table, df):
+    """Replace the data of the participants in the DataFrame in a table"""
+    for participant_id in df["participant_id"].unique():
+        shutil.rmtree(STORE_DIR / table / f"participant_id={participant_id}", ignore_errors=True)
+    write_partitions(table, df)
+
+
+def read_table(table, participant_id=None, round_id=None, columns=None, filters=None):
+    """
+    Read a table, or the partitions of one participant and/or round of it.
+
+    Args:
+        table: Table name ('game', 'parsed' or 'aggregated')
+        participant_id: Only read this participant
+        round_id: Only read this round
+        columns: Only read these columns
+        filters: pyarrow filters on the other columns, e.g. [('timestep', '<', 100)]
+
+    Returns:
+        DataFrame: Rows ordered by participant, round and timestep
+    """
+    table_dir = STORE_DIR / table
+    participant_dirs = sorted(table_dir.glob("participant_id=*"), key=_partition_value) if table_dir.exists() else []
+    if participant_id is not None:
+        participant_dirs = [d for d in participant_dirs if _partition_value(d) == participant_id]
+
+    dfs = []
+    for participant_dir in participant_dirs:
+        round_dirs = sorted(participant_dir.glob("round_id=*"), key=_partition_value)
+        if round_id is not None:
+            round_dirs = [d for d in round_dirs if _partition_value(d) == round_id]
+        for round_dir in round_dirs:
+            for path in sorted(round_dir.glob("*.parquet")):
+                dfs.append(pq.read_table(path, columns=columns, filters=filters).to_pandas())
+
+    if not dfs:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(dfs, ignore_index=True)
+    for column in LIST_COLUMNS:
+        if column in df.columns:
+            df[column] = [json.loads(value) for value in df[column]]
+    return df
+
+
+def load_manifest():
+    if MANIFEST_FILE.exists():
+        with open(MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def ingest_game_logs(participant_ids=None, rebuild=False):
+    """
+    Parse the game logs of the given participants (default: all in participant_mapping.csv) into the 'game' table.
+
+    Returns:
+        int: Number of game logs parsed
+    """
+    # Reuse the file discovery and parsing of parse_game_logs
+    from parse_game_logs import find_game_files, get_participant_name, parse_game_log
+
+    if rebuild:
+        shutil.rmtree(STORE_DIR / "game", ignore_errors=True)
+        manifest = {}
+    else:
+        manifest = load_manifest()
+
+    if participant_ids is None:
+        mapping_df = pd.read_csv(PARTICIPANTS_DIR / "participant_mapping.csv", skipinitialspace=True)
+        participant_ids = mapping_df["participant_id"].tolist()
+
+    n_parsed = 0
+    for participant_id in participant_ids:
+        participant_name = get_participant_name(participant_id)
+        game_files = find_game_files(participant_name, PARTICIPANTS_DIR)
+        for round_id, filename in game_files.items():
+            file_stat = (PARTICIPANTS_DIR / filename).stat()
+            entry = {
+                "size": file_stat.st_size,
+                "mtime_ns": file_stat.st_mtime_ns,
+                "participant_id": int(participant_id),
+                "round_id": int(round_id),
+            }
+            if manifest.get(filename) == entry:
+                continue
+
+            game_df, _ = parse_game_log(PARTICIPANTS_DIR / filename)
+            game_df["source"] = filename
+            game_df["participant_id"] = participant_id
+            game_df["round_id"] = round_id
+            # A participant has one log per round, drop the one of an older run of the round
+            shutil.rmtree(_partition_dir("game", participant_id, round_id), ignore_errors=True)
+            write_partitions("game", game_df, name=Path(filename).stem)
+
+            manifest[filename] = entry
+            n_parsed += 1
+            print(f"  📥 Ingested {filename}: {len(game_df)} timesteps")
+
+    # Replace the manifest in one step, other processes may be reading it (see pipeline.py)
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = MANIFEST_FILE.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, MANIFEST_FILE)
+    return n_parsed
+
+
+if __name__ == "__main__":
+    rebuild = "--rebuild" in sys.argv[1:]
+    ids = [int(arg) for arg in sys.argv[1:] if arg != "--rebuild"]
+
+    print(f"🗄️ Ingesting game logs into {STORE_DIR}...")
+    n_parsed = ingest_game_logs(ids or None, rebuild=rebuild)
+    print(f"\n✅ Ingested {n_parsed} new or changed game logs")
@@ -0,0 +1,167 @@
+"""
+Idle ticks and score of the ACT agent (`LLMActionAgent`) when every mid action waits for the LLM, as in
+`llm_agent_run_act.py --blocking`, versus `agents.action_pipeline.ActionPipeline`.
+
+The LLM is simulated: it answers what the FSM `RuleAgent` would do in the state at the time of the request, after a
+random latency of 0.5 to 1.5 times `--latency` ticks. The partner is an FSM agent. Games run on a fixed `--tick`
+(shorter than the 0.25s of the runners) so that the latency is counted in ticks.
+
+Usage:
+    python -m benchmarks.act_pipeline --levels burger burger_aa --latencies 2 8 20 --steps 300
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+from loguru import logger
+from pydantic import ValidationError
+
+from agents.action_llm_agent import LLMActionAgent
+from agents.action_pipeline import ActionPipeline, ActionPipelineStats
+from agents.mid_agent import MidAgent
+from agents.rule_agent import RuleAgent
+from agents.text_agent import TextAgent
+from benchmarks.population_eval import step_mid_agent
+from benchmarks.valid_action_cache import RECIPES, get_json_state_simple
+from llms.get_llm_output_act import Action
+from utils.history import History
+from utils.tick_scheduler import TickScheduler
+
+PARTNER_IDX = 0
+AGENT_IDX = 1
+
+
+def to_llm_action(mid_action) -> Action | None:
+    if not mid_action:
+        return None
+    func, kwargs = mid_action
+    if func == "pass_on":
+        kwargs = {"thing_status_pair": f"{kwargs['thing']}_{kwargs.get('thing_status', '')}"}
+    try:
+        return Action.model_validate({"action": {"type": func, **kwargs}})
+    except ValidationError:
+        return None
+
+
+def make_simulated_llm(env, oracle: RuleAgent, latency: float, rng: random.Random):
+    async def llm(messages, model, params):
+        mid_action = oracle.get_action(get_json_state_simple(env, AGENT_IDX))
+        await asyncio.sleep(latency * rng.uniform(0.5, 1.5))
+        return to_llm_action(mid_action)
+
+    return llm
+
+
+async def play_game(level: str, steps: int, seed: int, latency: int, tick: float, pipeline: bool):
+    rng = random.Random(seed)
+    random.seed(seed)
+    np.random.seed(seed)
+    env = CookingEnvironment(level, 2, False, steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+    world = env.world
+
+    text_agents = [TextAgent(world, i) for i in range(2)]
+    mid_agents = [MidAgent(text_agent, world) for text_agent in text_agents]
+    partner = RuleAgent(text_agents[PARTNER_IDX], world)
+    oracle = RuleAgent(text_agents[AGENT_IDX], world)
+    llm = make_simulated_llm(env, oracle, latency * tick, rng)
+    agent = LLMActionAgent(text_agents[AGENT_IDX], world, "simulated", None, llm=llm)
+    action_pipeline = ActionPipeline(agent) if pipeline else None
+    stats = action_pipeline.stats if pipeline else ActionPipelineStats()
+
+    history = History(max_steps=steps)
+    history_actions = {}
+    mid_actions = [None, None]
+    n_execution = 0
+    step = 0
+
+    async def decide():
+        decision_step = None
+        while step < steps:
+            if not mid_actions[AGENT_IDX] and (step != decision_step or (pipeline and action_pipeline.ready)):
+                decision_step = step
+                json_state = get_json_state_simple(env, AGENT_IDX)
+                history.add(step, json_state, {}, history_actions)
+                scene = history.get_formatted_history(1, AGENT_IDX)
+                if pipeline:
+                    mid_actions[AGENT_IDX], _ = action_pipeline.select(scene, json_state, step)
+                else:
+                    mid_actions[AGENT_IDX], _ = await agent.get_action(scene)
+            await asyncio.sleep(tick / 10)
+        if pipeline:
+            action_pipeline.close()
+
+    async def game():
+        nonlocal step, n_execution
+        ticker = TickScheduler(tick)
+        for step in range(steps):
+            actions = [0, 0]
+            if not mid_actions[PARTNER_IDX]:
+                mid_actions[PARTNER_IDX] = partner.get_action(get_json_state_simple(env, PARTNER_IDX))
+            if mid_actions[PARTNER_IDX]:
+                actions[PARTNER_IDX], mid_actions[PARTNER_IDX], n_execution = step_mid_agent(
+                    mid_agents[PARTNER_IDX], mid_actions[PARTNER_IDX], n_execution
+                )
+
+            stats.record_tick(idle=not mid_actions[AGENT_IDX])
+            if mid_actions[AGENT_IDX]:
+                end, actions[AGENT_IDX], status = mid_agents[AGENT_IDX].get_action(
+                    mid_actions[AGENT_IDX][0], **mid_actions[AGENT_IDX][1]
+                )
+                if end:
+                    mid_actions[AGENT_IDX] = None
+                    result = "Failed" if "Failed" in status else "Success"
+                    if pipeline:
+                        action_pipeline.finish(result)
+                    else:
+                        agent.store_result(result)
+
+            for action in actions:
+                env.step(action)
+            await ticker.wait()
+        step = steps
+
+    await asyncio.gather(game(), decide())
+    return env.total_score, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", type=str, nargs="+", default=["burger", "burger_aa"])
+    parser.add_argument("--latencies", type=int, nargs="+", default=[2, 8, 20], help="mean LLM latency in ticks")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--tick", type=float, default=0.02)
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"steps={args.steps} tick={args.tick * 1e3:.0f}ms seeds={args.seeds}")
+    print(
+        f"{'level':>12} {'latency':>7} {'mode':>9} {'score':>14} {'idle':>6} "
+        f"{'llm used':>8} {'rejected':>8} {'fallback':>8}"
+    )
+    for level in args.levels:
+        for latency in args.latencies:
+            for pipeline in [False, True]:
+                scores, games = [], []
+                for seed in args.seeds:
+                    score, stats = asyncio.run(play_game(level, args.steps, seed, latency, args.tick, pipeline))
+                    scores.append(score)
+                    games.append(stats)
+                idle = sum(s.idle_ticks for s in games) / sum(s.ticks for s in games)
+                mode = "pipeline" if pipeline else "blocking"
+                std = statistics.stdev(scores) if len(scores) > 1 else 0.0
+                print(
+                    f"{level:>12} {latency:>7} {mode:>9} {statistics.mean(scores):>7.1f}±{std:<6.1f} {idle:>6.1%} "
+                    f"{sum(s.llm_used for s in games) if pipeline else '-':>8} "
+                    f"{sum(s.llm_rejected for s in games) if pipeline else '-':>8} "
+                    f"{sum(s.fallback_used for s in games) if pipeline else '-':>8}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark for the interaction-reward bookkeeping in `CookingEnvironment.compute_rewards`.
+
+Runs random-policy episodes and reports the mean `compute_rewards` time per block of steps together with
+the number of rewarded (agent, object, state) combinations, so a per-step cost that grows with the
+episode length shows up as an increasing column.
+
+Usage:
+    python -m benchmarks.held_obj_rewards --level burger --episodes 5 --steps 1000
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+
+RECIPES = ["BeefBurgerDeliver", "LettuceBurgerDeliver", "BeefLettuceBurgerDeliver"]
+# interact is over-represented so that agents pick things up often
+ACTIONS = [0, 1, 2, 3, 4, 5, 5, 5]
+
+
+def run_episode(level: str, steps: int, seed: int, block: int):
+    random.seed(seed)
+    np.random.seed(seed)
+    env = CookingEnvironment(level, 2, False, steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+
+    timings = []
+    compute_rewards = env.compute_rewards
+
+    def timed_compute_rewards():
+        s_time = time.perf_counter()
+        out = compute_rewards()
+        timings.append(time.perf_counter() - s_time)
+        return out
+
+    env.compute_rewards = timed_compute_rewards
+
+    rng = random.Random(seed)
+    n_held = []
+    for _ in range(steps):
+        for _ in env.agents:
+            env.step(rng.choice(ACTIONS))
+        n_held.append(len(env.held_obj))
+
+    blocks = []
+    for start in range(0, steps, block):
+        block_timings = timings[start : start + block]
+        blocks.append((start, np.mean(block_timings) * 1e6, n_held[min(start + block, steps) - 1]))
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--level", type=str, default="burger")
+    parser.add_argument("--episodes", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--block", type=int, default=100)
+    args = parser.parse_args()
+
+    results = [run_episode(args.level, args.steps, seed, args.block) for seed in range(args.episodes)]
+
+    print(f"level={args.level} episodes={args.episodes} steps={args.steps}")
+    print(f"{'steps':>11} {'compute_rewards (us)':>22} {'rewarded combos':>16}")
+    for i, (start, _, _) in enumerate(results[0]):
+        mean_us = np.mean([r[i][1] for r in results])
+        mean_held = np.mean([r[i][2] for r in results])
+        print(f"{start:>5}-{start + args.block - 1:<5} {mean_us:>22.1f} {mean_held:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
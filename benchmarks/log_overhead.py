@@ -0,0 +1,99 @@
+"""
+Per-step time of two FSM agents (`RuleAgent` driving `MidAgent`, as in the runners) with the sinks of the runners:
+    SUCCESS         a SUCCESS console only (written to os.devnull)
+    TRACE file      and the detailed TRACE log file, written, rotated and compressed on the game loop
+    TRACE enqueued  and the detailed TRACE log file, written, rotated and compressed by the background thread of
+                    `utils.log_setup`
+The log files are written to a temporary directory and rotated at `--rotation`.
+
+Usage:
+    python -m benchmarks.log_overhead --levels burger burger_aa --steps 500
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pprint import pformat
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+from loguru import logger
+
+from agents.mid_agent import MidAgent
+from agents.rule_agent import RuleAgent
+from agents.text_agent import TextAgent
+from benchmarks.valid_action_cache import RECIPES, get_json_state_simple
+from utils.history import History
+from utils.lazy_log import lazy
+from utils.log_setup import add_file_sink
+
+
+def run_episode(level: str, steps: int, seed: int):
+    """
+    Mean and longest step time.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    env = CookingEnvironment(level, 2, False, steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+    world = env.world
+
+    text_agents = [TextAgent(world, i) for i in range(2)]
+    mid_agents = [MidAgent(text_agent, world) for text_agent in text_agents]
+    rule_agents = [RuleAgent(text_agent, world) for text_agent in text_agents]
+    history = History(max_steps=steps)
+    history_actions = {}
+    mid_actions = [None, None]
+
+    step_times = []
+    for step in range(steps):
+        s_time = time.perf_counter()
+        actions = [0, 0]
+        for i in range(2):
+            if not mid_actions[i]:
+                json_state = get_json_state_simple(env, i)
+                mid_actions[i] = rule_agents[i].get_action(json_state)
+                history.add(step, json_state, {}, history_actions)
+                lazy.debug("History:\n{}\n\n", lambda: pformat([info._asdict() for info in history.get_history(1)]))
+            if mid_actions[i]:
+                end, actions[i], _ = mid_agents[i].get_action(mid_actions[i][0], **mid_actions[i][1])
+                if end:
+                    mid_actions[i] = None
+        for action in actions:
+            env.step(action)
+        step_times.append(time.perf_counter() - s_time)
+    return sum(step_times) / steps, max(step_times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", type=str, nargs="+", default=["burger", "burger_aa"])
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--rotation", type=str, default="100 MB")
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, "w")
+    log_dir = tempfile.mkdtemp()
+    print(f"episodes={args.episodes} steps={args.steps}")
+    print(f"{'level':>12} {'sinks':>16} {'time/step':>10} {'max':>10}")
+    for level in args.levels:
+        for sinks in ["SUCCESS", "TRACE file", "TRACE enqueued"]:
+            logger.remove()
+            logger.add(devnull, level="SUCCESS")
+            if sinks == "TRACE file":
+                add_file_sink(f"{log_dir}/trace.log", "TRACE", enqueue=False, rotation=args.rotation)
+            elif sinks == "TRACE enqueued":
+                add_file_sink(f"{log_dir}/trace_enqueued.log", "TRACE", rotation=args.rotation)
+            results = [run_episode(level, args.steps, seed) for seed in range(args.episodes)]
+            logger.complete()
+            step_time = sum(mean for mean, _ in results) / args.episodes
+            max_time = max(longest for _, longest in results)
+            print(f"{level:>12} {sinks:>16} {step_time * 1e3:>8.3f}ms {max_time * 1e3:>8.1f}ms")
+    logger.remove()
+
+
+if __name__ == "__main__":
+    main()
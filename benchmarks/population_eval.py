@@ -0,0 +1,342 @@
+"""
+Headless evaluation of AI agents against the scripted partners of `agents.biased_agent`, over a matrix of
+(agent x partner x level x seed), with the games run in parallel worker processes.
+
+Every game replays the exp2 runners (`llm_agent_run_*_exp2.py`): the scripted partner is agent 0 and the AI agent is
+agent 1, both driving `MidAgent`s with the same 45 / 50 tick watchdog, and the ReAct / Reflexion agents are prompted
+every `--react-interval` steps (Reflexion also reflects when `to_reflection` says so). Unlike the runners the games do
+not wait for the 0.25s ticks nor for the LLM: a call blocks the game until it is answered by
+    --llm stand-in   the local stand-in of `llms.llm_cache`, which assigns no task (the agent plays its FSM)
+    --llm replay     outputs recorded in --cache, the stand-in for prompts not in it
+    --llm record     outputs recorded in --cache, `get_openai_llm_output` (--model) for prompts not in it, recorded
+Prompts only depend on the game, so a recorded cache replays a matrix without any LLM calls.
+
+Usage:
+    python -m benchmarks.population_eval --agents fsm react --partners beef lettuce assemble_serve \
+        --levels burger burger_aa --seeds 0 1 2 --steps 500 --workers 8
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from itertools import product
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+from loguru import logger
+
+from agents.biased_agent import (
+    AssembleServeAgent,
+    PrepareBeefAgent,
+    PrepareLettuceAgent,
+    SwitchAgent,
+)
+from agents.mid_agent import MidAgent
+from agents.react_llm_agent import ReActAgent, ReActAgentNoFSM
+from agents.reflexion_llm_agent import ReflexionAgent, ReflexionAgentNoFSM
+from agents.rule_agent import RuleAgent
+from agents.text_agent import TextAgent
+from benchmarks.valid_action_cache import RECIPES, get_json_state_simple
+from llms.llm_cache import LLMCache, stand_in_llm_output
+from utils.history import History
+from utils.reservation_planner import ReservationTable
+from utils.state_record import count_deliveries
+
+PARTNER_IDX = 0
+AGENT_IDX = 1
+
+AGENTS = {
+    "fsm": RuleAgent,
+    "react": ReActAgent,
+    "react_nofsm": ReActAgentNoFSM,
+    "reflexion": ReflexionAgent,
+    "reflexion_nofsm": ReflexionAgentNoFSM,
+}
+
+# same as biased_agent_name of the exp2 runners, the switching partners change policy at step 250
+SINGLE_PARTNERS = {"beef": PrepareBeefAgent, "lettuce": PrepareLettuceAgent, "assemble_serve": AssembleServeAgent}
+PARTNERS = list(SINGLE_PARTNERS) + [
+    "beef_to_lettuce",
+    "beef_to_assemble_serve",
+    "lettuce_to_beef",
+    "lettuce_to_assemble_serve",
+    "assemble_serve_to_beef",
+    "assemble_serve_to_lettuce",
+    "fsm",
+]
+SWITCH_STEP = 250
+
+
+@dataclass
+class GameSpec:
+    agent: str
+    partner: str
+    level: str
+    seed: int
+    steps: int = 500
+    llm: str = "stand-in"
+    cache: str = "results/population_eval/llm_cache.jsonl"
+    model: str = "4o-mini"
+    react_interval: int = 25
+    react_history: int = 5
+    reflection_history: int = 15
+
+
+def make_partner(name: str, text_agent: TextAgent, world):
+    if name == "fsm":
+        return RuleAgent(text_agent, world)
+    if name in SINGLE_PARTNERS:
+        return SINGLE_PARTNERS[name](text_agent, world)
+    first, second = name.split("_to_")
+    return SwitchAgent(
+        [0, SWITCH_STEP], [SINGLE_PARTNERS[first](text_agent, world), SINGLE_PARTNERS[second](text_agent, world)]
+    )
+
+
+def make_agent(spec: GameSpec, text_agent: TextAgent, world):
+    agent_cls = AGENTS[spec.agent]
+    if agent_cls is RuleAgent:
+        return RuleAgent(text_agent, world)
+    kwargs = {"max_n_react_turn": spec.react_history}
+    if agent_cls in [ReflexionAgent, ReflexionAgentNoFSM]:
+        kwargs["max_n_reflection_event"] = spec.reflection_history
+    return agent_cls(text_agent, world, **kwargs)
+
+
+def make_llm(spec: GameSpec):
+    if spec.llm == "stand-in":
+        return stand_in_llm_output, None
+    if spec.llm == "record":
+        from llms.get_llm_output import get_openai_llm_output
+
+        cache = LLMCache(spec.cache, mode="record", fallback=get_openai_llm_output)
+    else:
+        cache = LLMCache(spec.cache, mode="replay")
+    return cache, cache.stats
+
+
+def step_mid_agent(mid_agent: MidAgent, mid_action, n_execution: int):
+    """
+    One tick of a mid action with the watchdog of the exp2 runners: (action, mid action left, n_execution).
+    """
+    end, action, _ = mid_agent.get_action(mid_action[0], **mid_action[1])
+    n_execution += 1
+    if end:
+        mid_action = None
+        n_execution = 0
+    if n_execution >= 45:
+        action = 0
+        if n_execution >= 50:
+            mid_action = None
+            n_execution = 0
+    return action, mid_action, n_execution
+
+
+def play_game(spec: GameSpec) -> dict:
+    random.seed(spec.seed)
+    np.random.seed(spec.seed)
+    env = CookingEnvironment(spec.level, 2, False, spec.steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+    world = env.world
+
+    # the agent and its scripted partner plan their moves around each other's paths
+    reservations = ReservationTable()
+    text_agents = [TextAgent(world, i, reservations=reservations) for i in range(2)]
+    mid_agents = [MidAgent(text_agent, world) for text_agent in text_agents]
+    partner = make_partner(spec.partner, text_agents[PARTNER_IDX], world)
+    agent = make_agent(spec, text_agents[AGENT_IDX], world)
+    uses_llm = spec.agent != "fsm"
+    reflects = isinstance(agent, (ReflexionAgent, ReflexionAgentNoFSM))
+    llm, llm_stats = make_llm(spec) if uses_llm else (None, None)
+
+    history = History(max_steps=spec.steps)
+    # the runners leave `action` to the default of History.add, one dict shared by all entries, and so would the next
+    # game of the worker process: share one per game
+    history_actions = {}
+    mid_action_cursor = world.mid_action_log.cursor()
+    mid_actions = [None, None]
+    n_executions = [0, 0]
+    n_llm_calls = 0
+    llm_time = 0.0
+
+    def ask_llm(messages) -> str:
+        nonlocal n_llm_calls, llm_time
+        s_time = time.perf_counter()
+        output = asyncio.run(llm(spec.model, messages))
+        n_llm_calls += 1
+        llm_time += time.perf_counter() - s_time
+        return output
+
+    n_orders = 0
+
+    def take_state(agent_idx: int) -> dict:
+        # taking a state empties the deliver log of the world, count the orders delivered since the previous one
+        nonlocal n_orders
+        json_state = get_json_state_simple(env, agent_idx)
+        n_orders += count_deliveries(json_state["deliver_log"])
+        return json_state
+
+    s_time = time.perf_counter()
+    for step in range(spec.steps):
+        actions = [0, 0]
+
+        # scripted partner, random moves when it has nothing to do
+        if not mid_actions[PARTNER_IDX]:
+            json_state = take_state(PARTNER_IDX)
+            if isinstance(partner, SwitchAgent):
+                mid_actions[PARTNER_IDX] = partner.get_action(json_state, step)
+            else:
+                mid_actions[PARTNER_IDX] = partner.get_action(json_state)
+        if mid_actions[PARTNER_IDX]:
+            actions[PARTNER_IDX], mid_actions[PARTNER_IDX], n_executions[PARTNER_IDX] = step_mid_agent(
+                mid_agents[PARTNER_IDX], mid_actions[PARTNER_IDX], n_executions[PARTNER_IDX]
+            )
+        else:
+            actions[PARTNER_IDX] = random.choice([0, 1, 2, 3, 4])
+
+        # AI agent
+        if not mid_actions[AGENT_IDX]:
+            json_state = take_state(AGENT_IDX)
+            if reflects and agent.to_reflection(json_state):
+                agent.update_reflection(ask_llm(agent.get_reflection_llm_input()))
+            mid_actions[AGENT_IDX] = agent.get_action(json_state)
+            history.add(step, json_state, {}, history_actions)
+        if mid_actions[AGENT_IDX]:
+            actions[AGENT_IDX], mid_actions[AGENT_IDX], n_executions[AGENT_IDX] = step_mid_agent(
+                mid_agents[AGENT_IDX], mid_actions[AGENT_IDX], n_executions[AGENT_IDX]
+            )
+
+        for action in actions:
+            env.step(action)
+        for a_i, mid_action in mid_action_cursor.poll():
+            history.add_action(mid_action, a_i)
+
+        if uses_llm and step % spec.react_interval == 0:
+            agent.update_trajectory(history.get_formatted_history(1, AGENT_IDX))
+            if reflects:
+                llm_input = agent.get_reflection_react_llm_input()
+            else:
+                llm_input = agent.get_react_llm_input()
+            llm_output = ask_llm(llm_input)
+            thought_task = agent.update_assigned_tasks(llm_output)
+            if thought_task:
+                agent.update_react(thought_task[0], thought_task[1])
+            else:
+                agent.update_react(llm_output, "")
+    elapsed = time.perf_counter() - s_time
+    take_state(AGENT_IDX)  # the orders delivered since the last state
+
+    return {
+        "agent": spec.agent,
+        "partner": spec.partner,
+        "level": spec.level,
+        "seed": spec.seed,
+        "score": env.total_score,
+        "orders": n_orders,
+        "steps": spec.steps,
+        "time": elapsed,
+        "llm_calls": n_llm_calls,
+        "llm_time": llm_time,
+        "llm_cache_hits": llm_stats.hits if llm_stats else 0,
+    }
+
+
+def silence_logs():
+    logger.remove()
+
+
+def run_matrix(specs, workers: int):
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=silence_logs) as executor:
+        futures = {executor.submit(play_game, spec): spec for spec in specs}
+        for future in as_completed(futures):
+            spec = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"{spec.agent:>16} {spec.partner:>26} {spec.level:>18} seed={spec.seed} failed: {e!r}")
+    return results
+
+
+def print_table(results):
+    groups = defaultdict(list)
+    for result in results:
+        groups[(result["agent"], result["partner"], result["level"])].append(result)
+
+    print(
+        f"{'agent':>16} {'partner':>26} {'level':>18} {'games':>5} {'score':>14} {'orders':>6} "
+        f"{'steps/s':>8} {'llm calls':>9} {'cached':>7}"
+    )
+    for (agent, partner, level), group in sorted(groups.items()):
+        scores = [result["score"] for result in group]
+        score_std = statistics.stdev(scores) if len(scores) > 1 else 0.0
+        orders = statistics.mean(result["orders"] for result in group)
+        steps_per_s = sum(result["steps"] for result in group) / sum(result["time"] for result in group)
+        llm_calls = sum(result["llm_calls"] for result in group)
+        cached = sum(result["llm_cache_hits"] for result in group) / llm_calls if llm_calls else 0.0
+        print(
+            f"{agent:>16} {partner:>26} {level:>18} {len(group):>5} "
+            f"{statistics.mean(scores):>7.1f} ± {score_std:>4.1f} {orders:>6.1f} "
+            f"{steps_per_s:>8.0f} {llm_calls:>9} {cached:>7.0%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=str, nargs="+", default=["fsm", "react"], choices=list(AGENTS))
+    parser.add_argument("--partners", type=str, nargs="+", default=list(SINGLE_PARTNERS), choices=PARTNERS)
+    parser.add_argument("--levels", type=str, nargs="+", default=["burger"])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--llm", type=str, default="stand-in", choices=["stand-in", "replay", "record"])
+    parser.add_argument("--cache", type=str, default=GameSpec.cache)
+    parser.add_argument("--model", type=str, default=GameSpec.model)
+    parser.add_argument("--react-interval", type=int, default=GameSpec.react_interval)
+    parser.add_argument("--csv", type=str, default=None, help="write one row per game")
+    args = parser.parse_args()
+
+    specs = [
+        GameSpec(
+            agent,
+            partner,
+            level,
+            seed,
+            steps=args.steps,
+            llm=args.llm,
+            cache=args.cache,
+            model=args.model,
+            react_interval=args.react_interval,
+        )
+        for agent, partner, level, seed in product(args.agents, args.partners, args.levels, args.seeds)
+    ]
+    print(f"{len(specs)} games of {args.steps} steps, {args.workers} workers, llm={args.llm}")
+
+    s_time = time.perf_counter()
+    results = run_matrix(specs, args.workers)
+    elapsed = time.perf_counter() - s_time
+
+    print_table(results)
+    n_steps = sum(result["steps"] for result in results)
+    print(
+        f"\n{len(results)} games in {elapsed:.1f}s: {len(results) / elapsed:.2f} games/s, {n_steps / elapsed:.0f} steps/s"
+    )
+
+    if args.csv and results:
+        os.makedirs(os.path.dirname(args.csv) or ".", exist_ok=True)
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(sorted(results, key=lambda r: (r["agent"], r["partner"], r["level"], r["seed"])))
+        print(f"Saved {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Wasted moves and planning time of two `TextAgent`s walking to random stations, with `find_path` versus the
+reservation planner (`utils.reservation_planner`).
+
+Each agent is sent to a random counter or station it can reach and gets a new one when it stands next to it. Wasted
+moves are the agent ticks spent walking beyond the shortest walks (with no other agent around) of the finished trips,
+as a share of all agent ticks; trips given up (`approach_destination` returning -2) are counted separately.
+
+Usage:
+    python -m benchmarks.reservation_paths --levels bottleneck forced_coordination burger burger_aa --steps 600
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+
+from agents.text_agent import TextAgent, get_neighbor_position
+from benchmarks.valid_action_cache import RECIPES
+from utils.distance_field import DistanceField
+from utils.reservation_planner import ReservationTable
+
+
+def pick_station(text_agent: TextAgent, rng: random.Random):
+    """
+    A random counter or station the agent can reach and is not next to, with the length of the shortest walk to it.
+    """
+    level_array = text_agent.world.level_array
+    field = DistanceField(level_array, text_agent.agent.location)
+    stations = [
+        ((x, y), distance)
+        for x in range(len(level_array))
+        for y in range(len(level_array[0]))
+        if level_array[x][y] == 1 and (distance := field.interaction_distance((x, y)))
+    ]
+    return rng.choice(stations)
+
+
+def run_episode(level: str, steps: int, seed: int, reservations: bool):
+    rng = random.Random(seed)
+    random.seed(seed)
+    np.random.seed(seed)
+    env = CookingEnvironment(level, 2, False, steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+
+    table = ReservationTable() if reservations else None
+    text_agents = [TextAgent(env.world, i, reservations=table) for i in range(2)]
+    trips = [None, None]
+
+    n_trips = n_given_up = n_trip_ticks = shortest = 0
+    planner_time = 0.0
+    for t in range(steps):
+        actions = []
+        for i, text_agent in enumerate(text_agents):
+            if trips[i] is None:
+                station, distance = pick_station(text_agent, rng)
+                trips[i] = (station, distance, t)
+                text_agent.destination = station
+            station, distance, start = trips[i]
+            if station in get_neighbor_position(text_agent.agent.location):
+                n_trips += 1
+                shortest += distance
+                trips[i] = None
+                actions.append(0)
+                continue
+            n_trip_ticks += 1
+            s_time = time.perf_counter()
+            action = text_agent.approach_destination()
+            planner_time += time.perf_counter() - s_time
+            if action == -2:
+                n_given_up += 1
+                trips[i] = None
+                action = 0
+            actions.append(action)
+        for action in actions:
+            env.step(action)
+
+    # ticks spent walking beyond the shortest walks of the finished trips, including the unfinished ones
+    wasted = n_trip_ticks - shortest
+    return n_trips, n_given_up, wasted, planner_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--levels", type=str, nargs="+", default=["bottleneck", "forced_coordination", "burger", "burger_aa"]
+    )
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=600)
+    args = parser.parse_args()
+
+    print(f"episodes={args.episodes} steps={args.steps}")
+    print(f"{'level':>20} {'planner':>12} {'trips':>6} {'given up':>9} {'wasted':>7} {'time/tick':>10}")
+    for level in args.levels:
+        for reservations in [False, True]:
+            n_trips = n_given_up = wasted = 0
+            planner_time = 0.0
+            for seed in range(args.episodes):
+                results = run_episode(level, args.steps, seed, reservations)
+                n_trips += results[0]
+                n_given_up += results[1]
+                wasted += results[2]
+                planner_time += results[3]
+            name = "reservations" if reservations else "find_path"
+            n_ticks = args.episodes * args.steps
+            # share of the agent ticks
+            wasted_share = wasted / (2 * n_ticks)
+            print(
+                f"{level:>20} {name:>12} {n_trips:>6} {n_given_up:>9} {wasted_share:>7.1%} "
+                f"{planner_time / n_ticks * 1e3:>8.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Loading the game logs of the `Participants/` corpus with `str(dict)` states versus typed state records.
+
+Every game log is parsed with `analysis/parse_game_logs.py::parse_game_log` as it is (one `eval` per timestep), then
+converted with `utils.state_record.to_state_records`, written as a `TrajectoryWriter` file and parsed again, which
+decodes the states column-wise. Both parses must give the same frame.
+
+Usage:
+    python -m benchmarks.state_records --participants Participants
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from utils.state_record import to_state_records
+from utils.trajectory_log import TRAJ_KEYS, TrajectoryWriter, load_trajectory
+
+GAME_LOG = re.compile(r"_-?\d+_[\d.]+\.json$")
+
+
+def load_parse_game_logs():
+    # the analysis scripts are not a package
+    path = Path(__file__).parent.parent / "analysis" / "parse_game_logs.py"
+    spec = importlib.util.spec_from_file_location("parse_game_logs", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def write_records(traj_infos: dict, path: str):
+    writer = TrajectoryWriter(path)
+    writer.append("state_fields", traj_infos["state_fields"][0])
+    for key in TRAJ_KEYS:
+        for record in traj_infos[key]:
+            writer.append(key, record)
+    await writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--participants", type=str, default="Participants")
+    args = parser.parse_args()
+
+    parse_game_logs = load_parse_game_logs()
+    paths = sorted(p for p in Path(args.participants).glob("*.json") if GAME_LOG.search(p.name))
+    str_time = record_time = 0.0
+    n_rows = 0
+    str_bytes = record_bytes = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in paths:
+            s_time = time.perf_counter()
+            str_df, _ = parse_game_logs.parse_game_log(path)
+            str_time += time.perf_counter() - s_time
+
+            record_path = f"{tmp_dir}/{path.stem}.jsonl"
+            asyncio.run(write_records(to_state_records(load_trajectory(str(path))), record_path))
+            s_time = time.perf_counter()
+            record_df, _ = parse_game_logs.parse_game_log(record_path)
+            record_time += time.perf_counter() - s_time
+
+            pd.testing.assert_frame_equal(str_df, record_df, check_dtype=False)
+            n_rows += len(str_df)
+            str_bytes += path.stat().st_size
+            record_bytes += Path(record_path).stat().st_size
+
+    print(f"{len(paths)} game logs, {n_rows} timesteps")
+    print(f"{'states':>13} {'size':>9} {'parse':>8} {'per step':>9}")
+    for name, size, elapsed in [("str(dict)", str_bytes, str_time), ("state_record", record_bytes, record_time)]:
+        print(f"{name:>13} {size / 2**20:>7.1f}MB {elapsed:>7.2f}s {elapsed / n_rows * 1e6:>7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
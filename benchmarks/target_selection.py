@@ -0,0 +1,86 @@
+"""
+Steps per delivered order and planner time of scripted `MidAgent`s on open and divided burger layouts.
+
+Two scripted partners (`agents.biased_agent`) drive `MidAgent`s as in `benchmarks.valid_action_cache`. Planner time is
+the time spent choosing mid actions and turning them into environment actions, i.e. everything but `env.step`.
+
+Usage:
+    python -m benchmarks.target_selection --levels burger burger_aa burger_force_coor --episodes 3 --steps 600
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+
+from agents.biased_agent import AssembleServeAgent, PrepareBeefAgent
+from agents.mid_agent import MidAgent
+from agents.text_agent import TextAgent
+from benchmarks.valid_action_cache import RECIPES, get_json_state_simple
+from utils.state_record import count_deliveries
+
+
+def run_episode(level: str, steps: int, seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+    env = CookingEnvironment(level, 2, False, steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+
+    text_agents = [TextAgent(env.world, i) for i in range(2)]
+    mid_agents = [MidAgent(text_agents[i], env.world) for i in range(2)]
+    rule_agents = [PrepareBeefAgent(text_agents[0], env.world), AssembleServeAgent(text_agents[1], env.world)]
+    mid_actions = [None, None]
+
+    planner_time = 0.0
+    n_delivered = 0
+    for _ in range(steps):
+        s_time = time.perf_counter()
+        actions = []
+        for i in range(2):
+            if not mid_actions[i]:
+                mid_agents[i].mid_planner.get_valid_mid_actions()
+                mid_actions[i] = rule_agents[i].get_action(get_json_state_simple(env, i))
+            action = 0
+            if mid_actions[i]:
+                end, action, _ = mid_agents[i].get_action(mid_actions[i][0], **mid_actions[i][1])
+                if end:
+                    mid_actions[i] = None
+            actions.append(action)
+        planner_time += time.perf_counter() - s_time
+        for action in actions:
+            env.step(action)
+        # taking a state empties the deliver log, so count the deliveries of every step
+        n_delivered += count_deliveries(get_json_state_simple(env, 0)["deliver_log"])
+
+    return n_delivered, env.total_score, planner_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", type=str, nargs="+", default=["burger", "burger_aa", "burger_force_coor"])
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=600)
+    args = parser.parse_args()
+
+    print(f"episodes={args.episodes} steps={args.steps}")
+    print(f"{'level':>18} {'orders':>7} {'steps/order':>12} {'score':>6} {'planner':>8} {'per step':>9}")
+    for level in args.levels:
+        n_delivered = score = 0
+        planner_time = 0.0
+        for seed in range(args.episodes):
+            episode_delivered, episode_score, episode_time = run_episode(level, args.steps, seed)
+            n_delivered += episode_delivered
+            score += episode_score
+            planner_time += episode_time
+        n_steps = args.episodes * args.steps
+        steps_per_order = n_steps / n_delivered if n_delivered else float("inf")
+        print(
+            f"{level:>18} {n_delivered:>7} {steps_per_order:>12.1f} {score:>6} {planner_time:>7.2f}s "
+            f"{planner_time / n_steps * 1e3:>7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
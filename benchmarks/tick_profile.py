@@ -0,0 +1,97 @@
+"""
+Per-stage breakdown of the step of two FSM agents (`RuleAgent` driving `MidAgent`, as in the runners) with
+`utils.tick_profiler.TickProfiler`, and the step time with the profiler disabled and enabled.
+
+Usage:
+    python -m benchmarks.tick_profile --levels burger burger_aa --steps 500
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+from loguru import logger
+
+from agents.mid_agent import MidAgent
+from agents.rule_agent import RuleAgent
+from agents.text_agent import TextAgent
+from benchmarks.valid_action_cache import RECIPES, get_json_state_simple
+from utils.tick_profiler import TickProfiler
+
+
+def run_episode(level: str, steps: int, seed: int, profiler: TickProfiler) -> float:
+    """
+    Mean step time.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    env = CookingEnvironment(level, 2, False, steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+    world = env.world
+    event_cursor = world.event_log.cursor()
+    mid_action_cursor = world.mid_action_log.cursor()
+
+    text_agents = [TextAgent(world, i) for i in range(2)]
+    mid_agents = [MidAgent(text_agent, world) for text_agent in text_agents]
+    rule_agents = [RuleAgent(text_agent, world) for text_agent in text_agents]
+    mid_actions = [None, None]
+
+    s_time = time.perf_counter()
+    for _ in range(steps):
+        actions = [0, 0]
+        for i in range(2):
+            if not mid_actions[i]:
+                with profiler.stage("json_state"):
+                    json_state = get_json_state_simple(env, i)
+                with profiler.stage("agent"):
+                    mid_actions[i] = rule_agents[i].get_action(json_state)
+            if mid_actions[i]:
+                with profiler.stage("mid_agent"):
+                    end, actions[i], _ = mid_agents[i].get_action(mid_actions[i][0], **mid_actions[i][1])
+                if end:
+                    mid_actions[i] = None
+        with profiler.stage("env_step"):
+            for action in actions:
+                env.step(action)
+        with profiler.stage("events"):
+            list(event_cursor.poll())
+        with profiler.stage("mid_actions"):
+            list(mid_action_cursor.poll())
+        with profiler.stage("json_state"):
+            str(get_json_state_simple(env, 0))
+        profiler.tick()
+    return (time.perf_counter() - s_time) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", type=str, nargs="+", default=["burger", "burger_aa"])
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=500)
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"episodes={args.episodes} steps={args.steps}")
+    for level in args.levels:
+        step_times = {}
+        for enabled in [False, True]:
+            profiler = TickProfiler(enabled, dump_interval=0)
+            step_times[enabled] = [run_episode(level, args.steps, seed, profiler) for seed in range(args.episodes)]
+        print(
+            f"{level}: time/step disabled {sum(step_times[False]) / args.episodes * 1e3:.3f}ms, "
+            f"enabled {sum(step_times[True]) / args.episodes * 1e3:.3f}ms"
+        )
+        print(f"{'stage':>12} {'count':>7} {'ms/tick':>8} {'mean':>8} {'p50':>8} {'p99':>8} {'max':>8}")
+        summary = profiler.summary()
+        n_ticks = summary["ticks"][1]
+        for name, times in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_ms"]):
+            print(
+                f"{name:>12} {times['count']:>7} {times['total_ms'] / n_ticks:>8.3f} {times['mean_ms']:>8.3f} "
+                f"{times['p50_ms']:>8.3f} {times['p99_ms']:>8.3f} {times['max_ms']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Hit rate and timing of the memoized `TextAgent.get_valid_actions` and `MidPlanner.get_valid_mid_actions`.
+
+Plays episodes with two scripted partners (`agents.biased_agent`) driving `MidAgent`s, queries the valid mid actions
+of an agent whenever it needs a new mid action (as a prompt-building LLM agent would) and prints the `CacheStats`
+summed over the agents.
+
+Usage:
+    python -m benchmarks.valid_action_cache --level burger --episodes 3 --steps 600
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+
+from agents.biased_agent import AssembleServeAgent, PrepareBeefAgent
+from agents.mid_agent import MidAgent
+from agents.text_agent import TextAgent
+from utils.cache_stats import CacheStats
+
+RECIPES = ["BeefBurgerDeliver", "LettuceBurgerDeliver", "BeefLettuceBurgerDeliver"]
+
+
+def get_json_state_simple(env: CookingEnvironment, agent_idx: int):
+    # same as OvercookedMaker.get_json_state_simple
+    world_state = env.world.get_json_state_simple(agent_idx)
+    world_state["orders"] = [{"name": r.foodname, "remain_time": r.remain_time} for r in env.recipe_graphs]
+    return world_state
+
+
+def run_episode(level: str, steps: int, seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+    env = CookingEnvironment(level, 2, False, steps, RECIPES, obs_spaces=["dense"], max_order=4)
+    env.reset()
+
+    text_agents = [TextAgent(env.world, i) for i in range(2)]
+    mid_agents = [MidAgent(text_agents[i], env.world) for i in range(2)]
+    rule_agents = [PrepareBeefAgent(text_agents[0], env.world), AssembleServeAgent(text_agents[1], env.world)]
+    mid_actions = [None, None]
+
+    s_time = time.perf_counter()
+    for _ in range(steps):
+        actions = []
+        for i in range(2):
+            if not mid_actions[i]:
+                mid_agents[i].mid_planner.get_valid_mid_actions()
+                mid_actions[i] = rule_agents[i].get_action(get_json_state_simple(env, i))
+            action = 0
+            if mid_actions[i]:
+                end, action, _ = mid_agents[i].get_action(mid_actions[i][0], **mid_actions[i][1])
+                if end:
+                    mid_actions[i] = None
+            actions.append(action)
+        for action in actions:
+            env.step(action)
+    elapsed = time.perf_counter() - s_time
+
+    return (
+        elapsed,
+        env.total_score,
+        [text_agent.valid_actions_stats for text_agent in text_agents],
+        [mid_agent.mid_planner.valid_mid_actions_stats for mid_agent in mid_agents],
+    )
+
+
+def merge(stats_list):
+    merged = CacheStats()
+    for stats in stats_list:
+        merged.hits += stats.hits
+        merged.misses += stats.misses
+        merged.hit_time += stats.hit_time
+        merged.miss_time += stats.miss_time
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--level", type=str, default="burger")
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=600)
+    args = parser.parse_args()
+
+    text_stats, mid_stats = [], []
+    print(f"level={args.level} episodes={args.episodes} steps={args.steps}")
+    for seed in range(args.episodes):
+        elapsed, score, episode_text_stats, episode_mid_stats = run_episode(args.level, args.steps, seed)
+        print(f"seed={seed} score={score} time={elapsed:.2f}s")
+        text_stats += episode_text_stats
+        mid_stats += episode_mid_stats
+    print(f"TextAgent.get_valid_actions:       {merge(text_stats)}")
+    print(f"MidPlanner.get_valid_mid_actions:  {merge(mid_stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Load test of a running game server (`webapp/app_human_llm.py`) with simulated participants.
+
+Every client goes through the flow of `webapp/static/index.html`: POST /getsettings and /<id>/getphase, open the
+websocket /<id>/connect, optionally send "MODE_SWITCH:<mode>", then send an "action instruction feedback" message
+every `STEP_INTERVAL` while it receives the states. The inputs are random moves with an instruction or a feedback
+now and then, or the moves of the human in a saved trajectory (`--replay`).
+
+For every number of clients the table shows
+    fps         states received per second by a client (mean and slowest client), 4 when no frame is dropped
+    latency     from the tick publishing a state (its "wall_time") to the client receiving it, the server and the
+                clients must share a clock, i.e. run on the same host
+    jitter      how far the intervals between the ticks of the received states drift from `STEP_INTERVAL`
+    lateness    mean lateness of the server ticks during the run from the /metrics of the server, if served
+
+The server starts a game per login, so the clients log in `--login-interval` seconds apart, and the measurements
+start when the last client is connected. Client `i` logs in as the same user in every run and gets its game back,
+so runs must be shorter than a warm-up game (phase -1).
+
+Usage:
+    python webapp/app_human_llm.py --seed 0 --fsm --shards 4
+    python -m benchmarks.webapp_load --clients 1 5 10 15 --seconds 30
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.request
+from typing import List, Optional, Tuple
+
+import numpy as np
+import websockets
+
+from utils.trajectory_log import load_trajectory
+
+# same as webapp.app_human_llm.STEP_INTERVAL
+STEP_INTERVAL = 0.25
+# instructions and feedback of the buttons of webapp/static/index.html
+INSTRUCTIONS = [4, 5, 6, 7, 9]
+FEEDBACK = [1]
+
+
+def post(host: str, path: str, data: dict) -> dict:
+    request = urllib.request.Request(f"http://{host}{path}", data=json.dumps(data).encode(), method="POST")
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def scrape_lateness(host: str) -> Optional[tuple]:
+    """
+    Sum and count of `game_tick_lateness_seconds` over the games, None if the server has no /metrics.
+    """
+    try:
+        with urllib.request.urlopen(f"http://{host}/metrics", timeout=10) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    total, count = 0.0, 0
+    for line in text.splitlines():
+        if line.startswith("game_tick_lateness_seconds_sum"):
+            total += float(line.rsplit(" ", 1)[1])
+        elif line.startswith("game_tick_lateness_seconds_count"):
+            count += int(float(line.rsplit(" ", 1)[1]))
+    return total, count
+
+
+def load_replay(path: str, agent: int) -> List[int]:
+    """
+    Actions of `agent` at every step of a saved trajectory.
+    """
+    return [record["action"][agent] for record in load_trajectory(path)["traj"] if "action" in record]
+
+
+class Client:
+    def __init__(self, idx: int, args, replay: Optional[List[int]]):
+        self.idx = idx
+        self.args = args
+        self.replay = replay
+        self.rng = random.Random(idx)
+        self.user = {"name": f"load{idx}", "phone": str(10000 + idx)}
+        self.game_id = None
+        self.error = None
+        # filled between `start` and `stop` of the measurement
+        self.measuring = False
+        self.receive_times: List[float] = []
+        self.latencies: List[float] = []
+        self.tick_intervals: List[float] = []
+        self.last_wall_time = None
+        self.fps = 0.0
+
+    def next_input(self, step: int) -> str:
+        if self.replay:
+            action = self.replay[step % len(self.replay)]
+        else:
+            action = self.rng.randint(0, 5)
+        instruction, feedback = 0, 0
+        if self.rng.random() < self.args.message_rate:
+            if self.rng.random() < 0.8:
+                instruction = self.rng.choice(INSTRUCTIONS)
+            else:
+                feedback = self.rng.choice(FEEDBACK)
+        return f"{action} {instruction} {feedback}"
+
+    async def send_inputs(self, ws):
+        step = 0
+        while True:
+            await ws.send(self.next_input(step))
+            step += 1
+            await asyncio.sleep(STEP_INTERVAL)
+
+    def on_state(self, message: str):
+        received = time.time()
+        state = json.loads(message)
+        wall_time = state.get("wall_time")
+        if self.measuring:
+            self.receive_times.append(received)
+            if wall_time is not None:
+                self.latencies.append(received - wall_time)
+                if self.last_wall_time is not None:
+                    self.tick_intervals.append(wall_time - self.last_wall_time)
+        self.last_wall_time = wall_time
+        return state
+
+    async def run(self, connected: asyncio.Event, stop: asyncio.Event):
+        host = self.args.host
+        try:
+            settings = await asyncio.to_thread(post, host, "/getsettings", self.user)
+            self.game_id = settings["agentid"]
+            await asyncio.to_thread(post, host, f"/{self.game_id}/getphase", self.user)
+            async with websockets.connect(f"ws://{host}/{self.game_id}/connect", max_size=None) as ws:
+                if self.args.mode:
+                    await ws.send(f"MODE_SWITCH:{self.args.mode}")
+                sender = asyncio.create_task(self.send_inputs(ws))
+                try:
+                    # the first state shows that the game runs
+                    self.on_state(await asyncio.wait_for(ws.recv(), timeout=60))
+                    connected.set()
+                    stopped = asyncio.create_task(stop.wait())
+                    while not stop.is_set():
+                        received = asyncio.create_task(ws.recv())
+                        await asyncio.wait([received, stopped], return_when=asyncio.FIRST_COMPLETED)
+                        if not received.done():
+                            received.cancel()
+                            break
+                        if self.on_state(received.result())["time"] == 0:
+                            self.error = "game ended"
+                            break
+                finally:
+                    sender.cancel()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            connected.set()
+
+
+async def run_load(args, n_clients: int, replay: Optional[List[int]]) -> Tuple[List[Client], Optional[float]]:
+    clients = [Client(idx, args, replay) for idx in range(n_clients)]
+    stop = asyncio.Event()
+    tasks = []
+    for client in clients:
+        connected = asyncio.Event()
+        tasks.append(asyncio.create_task(client.run(connected, stop)))
+        await asyncio.wait_for(connected.wait(), timeout=120)
+        await asyncio.sleep(args.login_interval)
+
+    lateness_before = await asyncio.to_thread(scrape_lateness, args.host)
+    for client in clients:
+        client.measuring = True
+    start = time.time()
+    await asyncio.sleep(args.seconds)
+    for client in clients:
+        client.measuring = False
+    duration = time.time() - start
+    lateness_after = await asyncio.to_thread(scrape_lateness, args.host)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    for client in clients:
+        client.fps = len(client.receive_times) / duration
+    lateness = None
+    if lateness_before is not None and lateness_after is not None and lateness_after[1] > lateness_before[1]:
+        lateness = (lateness_after[0] - lateness_before[0]) / (lateness_after[1] - lateness_before[1])
+    return clients, lateness
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1:63000")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 5, 10, 15])
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--login-interval", type=float, default=1.5)
+    parser.add_argument(
+        "--message-rate", type=float, default=0.02, help="chance of an instruction or feedback per input"
+    )
+    parser.add_argument("--mode", type=str, default=None, choices=["ai_led", "human_led"])
+    parser.add_argument("--replay", type=str, default=None, help="trajectory (.json or .jsonl) to replay the moves of")
+    parser.add_argument("--replay-agent", type=int, default=0)
+    args = parser.parse_args()
+
+    replay = load_replay(args.replay, args.replay_agent) if args.replay else None
+    print(f"host={args.host} seconds={args.seconds} inputs={'replay ' + args.replay if replay else 'random'}")
+    print(
+        f"{'clients':>7} {'fps':>6} {'min fps':>7} {'latency p50':>11} {'p95':>8} {'max':>8} "
+        f"{'jitter mean':>11} {'max':>8} {'lateness':>8} {'errors':>6}"
+    )
+    for n_clients in args.clients:
+        clients, lateness = asyncio.run(run_load(args, n_clients, replay))
+        for client in clients:
+            if client.error:
+                print(f"client {client.idx} (game {client.game_id}): {client.error}")
+        latencies = np.array([latency for client in clients for latency in client.latencies]) * 1e3
+        jitter = np.abs(np.array([i for client in clients for i in client.tick_intervals]) - STEP_INTERVAL) * 1e3
+        fps = [client.fps for client in clients]
+        print(
+            f"{n_clients:>7} {np.mean(fps):>6.2f} {min(fps):>7.2f} "
+            + (
+                f"{np.percentile(latencies, 50):>9.1f}ms {np.percentile(latencies, 95):>6.1f}ms "
+                f"{latencies.max():>6.1f}ms "
+                if len(latencies)
+                else f"{'-':>11} {'-':>8} {'-':>8} "
+            )
+            + (f"{jitter.mean():>9.1f}ms {jitter.max():>6.1f}ms " if len(jitter) else f"{'-':>11} {'-':>8} ")
+            + (f"{lateness * 1e3:>6.1f}ms " if lateness is not None else f"{'-':>8} ")
+            + f"{sum(client.error is not None for client in clients):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
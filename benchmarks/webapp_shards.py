@@ -0,0 +1,150 @@
+"""
+Tick-interval jitter of the game server with all games on one event loop versus sharded over processes.
+
+Every game replays the per-tick work of `webapp.app_human_llm.run_inner_loop` that does not wait on a human or an LLM:
+a scripted `MidAgent` and a random "human" act, the environment steps, the frame is rendered and PNG encoded, then the
+loop sleeps `STEP_INTERVAL`. The front end records when each game publishes a state (directly on the event loop, or
+when it arrives through `webapp.game_shards.ShardPool`) and the table shows how far the intervals between two frames of
+a game drift from `STEP_INTERVAL` as the number of games grows.
+
+Usage:
+    python -m benchmarks.webapp_shards --games 1 5 10 15 --shards 0 4 --seconds 10
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+from gym_cooking.environment.cooking_zoo import CookingEnvironment
+from gym_cooking.environment.game.graphic_pipeline import GraphicPipeline
+from PIL import Image
+
+from agents.biased_agent import AssembleServeAgent
+from agents.mid_agent import MidAgent
+from agents.text_agent import TextAgent
+from webapp.game_shards import ShardPool, shard_game_ids
+
+RECIPES = ["BeefBurgerDeliver", "LettuceBurgerDeliver", "BeefLettuceBurgerDeliver"]
+# same as webapp.app_human_llm.STEP_INTERVAL
+STEP_INTERVAL = 0.25
+
+
+def process_frame(frame):
+    # same as webapp.app_human_llm.process_frame
+    image = Image.fromarray(frame)
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG", compress_level=9, optimize=True)
+    return base64.b64encode(buffered.getvalue()).decode("utf8")
+
+
+class Game:
+    def __init__(self, level: str, seed: int):
+        random.seed(seed)
+        np.random.seed(seed)
+        self.rng = random.Random(seed)
+        self.env = CookingEnvironment(level, 2, False, 100000, RECIPES, obs_spaces=["dense"], max_order=4)
+        self.env.reset()
+        self.graphic_pipeline = GraphicPipeline(self.env, display=False)
+        self.graphic_pipeline.on_init()
+        text_agent = TextAgent(self.env.world, 1)
+        self.mid_agent = MidAgent(text_agent, self.env.world)
+        self.rule_agent = AssembleServeAgent(text_agent, self.env.world)
+        self.mid_action = None
+
+    def tick(self) -> dict:
+        action = 0
+        if not self.mid_action:
+            world_state = self.env.world.get_json_state_simple(1)
+            world_state["orders"] = [{"name": r.foodname, "remain_time": r.remain_time} for r in self.env.recipe_graphs]
+            self.mid_action = self.rule_agent.get_action(world_state)
+        if self.mid_action:
+            end, action, _ = self.mid_agent.get_action(self.mid_action[0], **self.mid_action[1])
+            if end:
+                self.mid_action = None
+        self.env.step(self.rng.randint(0, 5))
+        self.env.step(action)
+        frame = self.graphic_pipeline.on_render("rgb_array")
+        return {"frame": process_frame(frame), "score": self.env.total_score}
+
+
+async def play(game: Game, publish, seconds: float):
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        publish(game.tick())
+        await asyncio.sleep(STEP_INTERVAL)
+
+
+def run_shard(shard_idx, conn, n_games, n_shards, level, seconds):
+    game_ids = shard_game_ids(shard_idx, n_shards, n_games)
+    games = {id: Game(level, id) for id in game_ids}
+
+    async def serve():
+        await asyncio.gather(
+            *[play(game, lambda s, id=id: conn.send(("state", id, s)), seconds) for id, game in games.items()]
+        )
+        conn.send(("done", shard_idx))
+
+    asyncio.run(serve())
+
+
+async def measure(n_games: int, n_shards: int, level: str, seconds: float):
+    arrivals = defaultdict(list)
+    if n_shards == 0:
+        games = [Game(level, id) for id in range(n_games)]
+        await asyncio.gather(
+            *[
+                play(game, lambda s, id=id: arrivals[id].append(time.perf_counter()), seconds)
+                for id, game in enumerate(games)
+            ]
+        )
+    else:
+        n_shards = min(n_shards, n_games)
+        done = []
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def handle(kind, id, *payload):
+            if kind == "done":
+                done.append(id)
+                if len(done) == n_shards:
+                    finished.set_result(None)
+            elif kind == "state":
+                arrivals[id].append(time.perf_counter())
+
+        pool = ShardPool(n_shards, run_shard, args=(n_games, n_shards, level, seconds))
+        pool.attach(handle, lambda shard_idx: finished.done() or finished.set_result(None))
+        await finished
+        pool.close()
+
+    intervals = np.concatenate([np.diff(times) for times in arrivals.values() if len(times) > 1])
+    lateness = intervals - STEP_INTERVAL
+    return np.mean(intervals), np.percentile(lateness, 50), np.percentile(lateness, 95), np.max(lateness)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--level", type=str, default="burger")
+    parser.add_argument("--games", type=int, nargs="+", default=[1, 5, 10, 15])
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 4])
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"level={args.level} seconds={args.seconds} STEP_INTERVAL={STEP_INTERVAL}s")
+    print(f"{'games':>5} {'shards':>6} {'mean interval':>14} {'p50 late':>9} {'p95 late':>9} {'max late':>9}")
+    # shards are forked before the single-loop runs create any pygame state in this process
+    for n_shards in sorted(args.shards, reverse=True):
+        for n_games in args.games:
+            mean, p50, p95, late_max = asyncio.run(measure(n_games, n_shards, args.level, args.seconds))
+            print(
+                f"{n_games:>5} {n_shards:>6} {mean * 1e3:>12.0f}ms {p50 * 1e3:>7.0f}ms {p95 * 1e3:>7.0f}ms "
+                f"{late_max * 1e3:>7.0f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,7 @@ class RecipeNode:
         self.conditions = conditions or []
         self.contains = contains or []
         self.world_objects = []
+        self.object_locations = set()
         self.name = name
         self.node_type = node_type
         self.contains_num = contains_num
@@ -52,6 +53,11 @@ class Recipe:
         self.remain_time = remain_time
         self.score_factor = score_factor
         self.foodname = foodname
+        # world and change counters seen by the last update, see `update_recipe_state`
+        self.world = None
+        self.state_version = -1
+        self.deliver_version = -1
+        self.evaluated_version = -1
 
     def file_name(self):
         return self.filename
@@ -63,7 +69,11 @@ class Recipe:
             refactors[node.id_num] = int(node.refactor)
         return refactors
 
-    def goals_completed(self, num_goals):
+    def goals_completed(self, num_goals, world: CookingWorld = None):
+        # node states are only refreshed eagerly when a DeliverSquare changes; pass the world
+        # to bring them up to date before reading the goal vector
+        if world is not None and (world is not self.world or self.evaluated_version != world.state_version):
+            self.evaluate_nodes(world)
         goals = np.zeros(num_goals, dtype=np.int32)
         for node in self.node_list:
             # goals[node.id_num] = int(not node.achieved)
@@ -75,18 +85,24 @@ class Recipe:
 
     def reset_state(self):
         self.complete_num = 0
+        self.world = None
+        self.state_version = -1
+        self.deliver_version = -1
+        self.evaluated_version = -1
         for node in self.node_list:
             node.achieved = False
             node.achieved_num = 0
             node.world_objects = []
+            node.object_locations = set()
 
-    def update_recipe_state(self, world: CookingWorld):
+    def evaluate_nodes(self, world: CookingWorld):
         # check which node is achieved
         # reason for reversed: each time, check the condition of its child to build a tree
         for node in reversed(self.node_list):
             node.achieved = False
             node.achieved_num = 0
             node.world_objects = []
+            node.object_locations = set()
             node.players = []
 
             # no chance to achieve
@@ -99,12 +115,26 @@ class Recipe:
                 conditions, players = self.check_conditions(node, obj)
                 if conditions:
                     node.world_objects.append(obj)
+                    node.object_locations.add(obj.location)
                     node.achieved = True
                     node.achieved_num += 1
-                    # print("achieve")
-            # if self.complete_num > 0:
-            #     print("complete")
             node.achieved_num += self.complete_num * node.contains_num
+        self.evaluated_version = world.state_version
+
+    def update_recipe_state(self, world: CookingWorld):
+        # nothing was added, removed, merged or processed since the last call
+        if world is self.world and world.state_version == self.state_version:
+            return 0, [], []
+        deliver_changed = world is not self.world or world.deliver_version != self.deliver_version
+        self.world = world
+        self.state_version = world.state_version
+        self.deliver_version = world.deliver_version
+        # the root is a DeliverSquare, so it can only be reached by a change on a delivery tile;
+        # inner nodes are refreshed lazily by `goals_completed`
+        if not deliver_changed:
+            return 0, [], []
+
+        self.evaluate_nodes(world)
         if self.root_node.achieved:
             # print("complete")
             self.complete_num += 1
@@ -132,18 +162,10 @@ class Recipe:
             if getattr(world_object, condition[0]) != condition[1]:
                 return False, []
         else:
-            all_contained = []
             all_players = []
             # check if the containers contains all the needed objects
-            for contains in node.contains:
-                # all_contained.append(any([obj.location == world_object.location for obj in contains.world_objects]))
-                contained = []
-                for obj in contains.world_objects:
-                    if obj.location == world_object.location:
-                        contained.append(True)
-                        # all_players.append(obj.player)
-                all_contained.append(any(contained))
-            return all(all_contained), all_players
+            all_contained = all(world_object.location in contains.object_locations for contains in node.contains)
+            return all_contained, all_players
 
     def remove_object(self, world: CookingWorld):
         world_objects = self.node_list[1].world_objects
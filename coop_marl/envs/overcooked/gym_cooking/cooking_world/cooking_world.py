@@ -6,6 +6,7 @@ from pathlib import Path
 from typing import Dict, List, Union
 
 import numpy as np
+from gym_cooking.cooking_world.event_log import EventLog, EventRecord, MidActionRecord
 from gym_cooking.cooking_world.world_objects import *
 from loguru import logger
 
@@ -130,6 +131,17 @@ class CookingWorld:
         self.deliver_log: list[tuple[int | str, str, int, dict]] = []
         # (idx, name, score)
 
+        # change counters read by Recipe.update_recipe_state, so recipes are only
+        # re-evaluated when something happened (and the root only when it happened
+        # on a DeliverSquare)
+        self.state_version = 0
+        self.deliver_version = 0
+        self.deliver_locations = set()
+
+        # append-only streams of EventRecord / MidActionRecord, polled incrementally by the runners
+        self.event_log = EventLog()
+        self.mid_action_log = EventLog()
+
     def perceive_agent_event(self, idx) -> Union[str, None]:
         agent: Agent = self.agents[idx]
         if len(agent.event_list) == 0:
@@ -147,6 +159,42 @@ class CookingWorld:
         return {agent_id: agent.event_list.copy() for agent_id, agent in enumerate(self.agents)}
 
     def get_mid_actions(self) -> Dict[int, List[str]]:
+        mid_action_all = {}
+        for agent_id, agent in enumerate(self.agents):
+            mid_action_list = []
+            for i in range(len(agent.event_list)):
+                mid_action_list.extend(self.match_mid_actions(agent.event_list, i))
+            mid_action_all[agent_id] = mid_action_list
+        return mid_action_all
+
+    def poll_events(self, since: int = 0):
+        """
+        `EventRecord`s appended after offset `since` and the next offset, see `EventLog.poll`
+        """
+        return self.event_log.poll(since)
+
+    def poll_mid_actions(self, since: int = 0):
+        """
+        `MidActionRecord`s appended after offset `since` and the next offset, see `EventLog.poll`
+        """
+        return self.mid_action_log.poll(since)
+
+    def record_event(self, agent: Agent, event: str):
+        """
+        append `event` to the agent's event list and emit it, together with the mid actions it completes,
+        to the event logs
+        """
+        agent.event_list.append(event)
+        agent_id = self.agents.index(agent)
+        self.event_log.append(EventRecord(agent_id, event))
+        for mid_action in self.match_mid_actions(agent.event_list, len(agent.event_list) - 1):
+            self.mid_action_log.append(MidActionRecord(agent_id, mid_action))
+
+    @staticmethod
+    def match_mid_actions(event_list: List[str], i: int) -> List[list]:
+        """
+        mid actions recognized at index `i` of an event list; only looks at the last four events up to `i`
+        """
         agent_holding = None
 
         def _one_step_work(event_now: str):
@@ -514,35 +562,59 @@ class CookingWorld:
                 mid_action = ["serve", "beeflettuceburger"]
             return mid_action
 
-        mid_action_all = {}
-        for agent_id, agent in enumerate(self.agents):
-            event_list = agent.event_list
-            mid_action_list = []
-            for i, event_now in enumerate(event_list):
-                event_now = event_list[i]
-                event_last = event_list[i - 1] if i > 0 else ""
-                event_last2 = event_list[i - 2] if i > 1 else ""
-                event_last3 = event_list[i - 3] if i > 2 else ""
-                action1 = _one_step_work(event_now)
-                action2 = _two_step_action(event_now, event_last)
-                action3 = _three_step_action(event_now, event_last, event_last2)
-                action4 = _four_step_action(event_now, event_last, event_last2, event_last3)
-                if action1 != None:
-                    mid_action_list.append(action1)
-                if action2 != None and action2 != action1:
-                    mid_action_list.append(action2)
-                if action3 != None and action3 != action2:
-                    mid_action_list.append(action3)
-                if action4 != None and action4 != action3:
-                    mid_action_list.append(action4)
-            mid_action_all[agent_id] = mid_action_list
-        return mid_action_all
+        event_now = event_list[i]
+        event_last = event_list[i - 1] if i > 0 else ""
+        event_last2 = event_list[i - 2] if i > 1 else ""
+        event_last3 = event_list[i - 3] if i > 2 else ""
+        action1 = _one_step_work(event_now)
+        action2 = _two_step_action(event_now, event_last)
+        action3 = _three_step_action(event_now, event_last, event_last2)
+        action4 = _four_step_action(event_now, event_last, event_last2, event_last3)
+        mid_action_list = []
+        if action1 != None:
+            mid_action_list.append(action1)
+        if action2 != None and action2 != action1:
+            mid_action_list.append(action2)
+        if action3 != None and action3 != action2:
+            mid_action_list.append(action3)
+        if action4 != None and action4 != action3:
+            mid_action_list.append(action4)
+        return mid_action_list
+
+    def state_fingerprint(self) -> tuple:
+        """
+        hashable summary of the state agents act on: agent positions and holdings, and the type, location and
+        chop/blend/fire state of every dynamic object; equal fingerprints mean the same valid actions
+        """
+        agents = tuple((agent.location, type(agent.holding).__name__) for agent in self.agents)
+        objects = tuple(
+            (
+                type(obj).__name__,
+                obj.location,
+                getattr(obj, "chop_state", None),
+                getattr(obj, "blend_state", None),
+                getattr(obj, "put_num", None),
+                len(obj.content) if isinstance(obj, Container) else None,
+            )
+            for obj in self.get_dynamic_object_list()
+        )
+        return agents, objects
+
+    def mark_changed(self, *locations):
+        """
+        record that objects at `locations` were added, removed, merged or changed state
+        """
+        self.state_version += 1
+        if any(location in self.deliver_locations for location in locations):
+            self.deliver_version += 1
 
     def add_object(self, obj):
         self.world_objects[type(obj).__name__].append(obj)
+        self.mark_changed(obj.location)
 
     def delete_object(self, obj):
         self.world_objects[type(obj).__name__].remove(obj)
+        self.mark_changed(obj.location)
 
     def accepts(self, static_object: StaticObject, dynamic_object: DynamicObject) -> bool:
         if static_object.accepts([dynamic_object]) and len(self.get_objects_at(static_object.location)) == 1:
@@ -550,6 +622,7 @@ class CookingWorld:
         return False
 
     def index_objects(self):
+        self.deliver_locations = {obj.location for obj in self.world_objects["DeliverSquare"]}
         for type_name, obj_list in self.world_objects.items():
             for abstract_class in ABSTRACT_GAME_CLASSES:
                 if issubclass(StringToClass[type_name], abstract_class):
@@ -588,7 +661,10 @@ class CookingWorld:
                         fire = Fire(obj.location)
                         self.add_object(fire)
 
+                states = [getattr(d_obj, "blend_state", None) for d_obj in dynamic_objects]
                 obj.progress(dynamic_objects)
+                if states != [getattr(d_obj, "blend_state", None) for d_obj in dynamic_objects]:
+                    self.mark_changed(obj.location)
 
     def perform_agent_actions(self, agents, actions):
         # for i, action in enumerate(actions):
@@ -633,6 +709,9 @@ class CookingWorld:
             interaction_location = self.get_target_location(agent, agent.orientation)
             if any([agent.location == interaction_location for agent in self.agents]):
                 return reward, action_reward
+            # walking never changes what is on a tile (held objects move with the agent),
+            # so interactions are the only agent actions that invalidate recipe state
+            self.mark_changed(agent.location, interaction_location)
             dynamic_objects = self.get_objects_at(interaction_location, DynamicObject)
             static_object = self.get_objects_at(interaction_location, StaticObject)[0]
             # get food from station
@@ -802,29 +881,18 @@ class CookingWorld:
             # update current event list
             # print(current_event)
             if current_event:
-                if len(agent.event_list) > 0:
-                    if current_event == "chop_lettuce(doing)":
-                        # if agent.event_list[-1] != "chop_lettuce(doing)":
-                        #     agent.event_list.append(current_event)
-                        # else:
-                        #     agent.event_list[-1] = current_event
-                        agent.event_list.append(current_event)
-                    elif current_event == "put_out_fire(doing)":
-                        # if agent.event_list[-1] != "put_out_fire(doing)":
-                        #     agent.event_list.append(current_event)
-                        # else:
-                        #     agent.event_list[-1] = current_event
-                        agent.event_list.append(current_event)
-                    elif (
+                # the additional plate event is only kept when the agent already had events
+                record_additional = (
+                    len(agent.event_list) > 0
+                    and (
                         current_event.startswith("put_onto_plate")
                         or current_event in ["put_bread_onto_plate", "put_lettuce_onto_plate"]
-                    ) and additional_event is not None:
-                        agent.event_list.append(current_event)
-                        agent.event_list.append(additional_event)
-                    else:
-                        agent.event_list.append(current_event)
-                else:
-                    agent.event_list.append(current_event)
+                    )
+                    and additional_event is not None
+                )
+                self.record_event(agent, current_event)
+                if record_additional:
+                    self.record_event(agent, additional_event)
 
                 agent.current_event = current_event
             else:
@@ -1300,6 +1368,17 @@ class CookingWorld:
         else:
             return {"name": ClassToString[obj.__class__], "status": ""}
 
+    def get_holding_desc(self, agent_index):
+        """
+        get the name and status of what the agent holds (the food of a plate), None if nothing
+        """
+        agent = self.agents[agent_index]
+        if not agent.holding:
+            return None
+        if isinstance(agent.holding, Plate) and len(agent.holding.content) > 0:
+            return self._get_object_desc(agent.holding.content[0])
+        return self._get_object_desc(agent.holding)
+
     def get_json_state_simple(self, agent_index):
         json_state = {
             "objects": {
@@ -1336,15 +1415,8 @@ class CookingWorld:
         other_agent_idxs = list(range(0, agent_index)) + list(range(agent_index + 1, len(self.agents)))
         other_agent_locations = [agent.location for agent in other_agents]
 
-        for agent_idx, agent in zip(other_agent_idxs, other_agents):
-            if agent.holding:
-                if isinstance(agent.holding, Plate) and len(agent.holding.content) > 0:
-                    obj_desc = self._get_object_desc(agent.holding.content[0])
-                else:
-                    obj_desc = self._get_object_desc(agent.holding)
-            else:
-                obj_desc = None
-            json_state["inventory_other_player"][agent_idx] = obj_desc
+        for agent_idx in other_agent_idxs:
+            json_state["inventory_other_player"][agent_idx] = self.get_holding_desc(agent_idx)
 
         for obj in dynamic_objects:
             if obj.location in other_agent_locations:
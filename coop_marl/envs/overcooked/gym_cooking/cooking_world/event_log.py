@@ -0,0 +1,52 @@
+from typing import Any, List, NamedTuple, Tuple
+
+
+class EventRecord(NamedTuple):
+    agent_id: int
+    event: str
+
+
+class MidActionRecord(NamedTuple):
+    agent_id: int
+    mid_action: list
+
+
+class EventLog:
+    """
+    Append-only log of records emitted by the world.
+
+    Consumers remember the offset returned by `poll` (or hold an `EventCursor`) and only read what was appended
+    since, so per-tick processing is proportional to the number of new records rather than the episode length.
+    """
+
+    def __init__(self):
+        self.records: List[Any] = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, record):
+        self.records.append(record)
+
+    def poll(self, since: int = 0) -> Tuple[List[Any], int]:
+        """
+        return the records appended after `since` and the offset to pass to the next call
+        """
+        return self.records[since:], len(self.records)
+
+    def cursor(self, since: int = 0) -> "EventCursor":
+        return EventCursor(self, since)
+
+
+class EventCursor:
+    """
+    Per-consumer read position in an `EventLog`.
+    """
+
+    def __init__(self, log: EventLog, offset: int = 0):
+        self.log = log
+        self.offset = offset
+
+    def poll(self) -> List[Any]:
+        records, self.offset = self.log.poll(self.offset)
+        return records
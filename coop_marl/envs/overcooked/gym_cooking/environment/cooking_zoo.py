@@ -244,7 +244,9 @@ class CookingEnvironment(AECEnv):
             }
 
         self.action_spaces = {agent: gym.spaces.Discrete(6) for agent in self.possible_agents}
-        self.held_obj = []
+        # (agent, held object, *state) combinations already rewarded in this episode
+        self.held_obj = set()
+        self.deliver_version = -1
 
     def get_obs_size(self):
         all_objs = copy.deepcopy(self.world.world_objects)
@@ -317,7 +319,8 @@ class CookingEnvironment(AECEnv):
 
         self.t = 0
         self.world = CookingWorld(agent_type=agent_type)
-        self.held_obj = []
+        self.held_obj = set()
+        self.deliver_version = -1
 
         # For tracking data during an episode.
         self.termination_info = ""
@@ -431,7 +434,7 @@ class CookingEnvironment(AECEnv):
             num_observation = {
                 "numeric_observation": self.current_tensor_observation[agent],
                 "agent_location": np.asarray(self.world_agent_mapping[agent].location, np.int32),
-                "goal_vector": self.recipe_mapping[agent].goals_completed(NUM_GOALS),
+                "goal_vector": self.recipe_mapping[agent].goals_completed(NUM_GOALS, self.world),
             }
             observation.append(num_observation)
         if "symbolic" in self.obs_spaces:
@@ -574,21 +577,21 @@ class CookingEnvironment(AECEnv):
                             food_names = [type(food).__name__ for food in agent.holding.content]
                             state = food_names
 
-                    obj_with_state = set({agent, holding_obj, *state})
+                    obj_with_state = frozenset({agent, holding_obj, *state})
                     if obj_with_state not in self.held_obj:
-                        self.held_obj.append(obj_with_state)
+                        self.held_obj.add(obj_with_state)
                         rewards += self.interact_reward
                         interact_rewards += 1
 
         for idx, recipe in enumerate(self.recipe_graphs):
-            goals_before = np.array(recipe.goals_completed(NUM_GOALS))
+            # only does work when the world changed since the last step
             completed, players, final_players = recipe.update_recipe_state(self.world)
             if completed > 0:
                 self.recipe_graphs.remove(recipe)
             if len(players) > 0:
                 print(completed, players, final_players)
+            # goal vectors as of the last delivery check, see Recipe.goals_completed
             open_goals[idx] = np.array(recipe.goals_completed(NUM_GOALS))
-            np.array(recipe.refactor(NUM_GOALS))
             # bonus = recipe.completed() * self.complete_reward
             bonus = completed * self.complete_reward
             score += recipe.complete_num * self.complete_reward * recipe.score_factor
@@ -608,11 +611,11 @@ class CookingEnvironment(AECEnv):
 
             rewards[idx] += bonus
             # rewards[idx] += progress_reward
-            if rewards[idx] < 0:
-                print(f"Goals before: {goals_before}")
-                print(f"Goals after: {open_goals}")
         # food in recipes is already moved
-        _, _, wrong_objects = self.world.clear_deliver(None)
+        wrong_objects = []
+        if self.world.deliver_version != self.deliver_version:
+            _, _, wrong_objects = self.world.clear_deliver(None)
+            self.deliver_version = self.world.deliver_version
         score += len(wrong_objects) * self.punish_reward
         if len(wrong_objects) > 0:
             for w_obj in wrong_objects:
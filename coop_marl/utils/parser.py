@@ -58,6 +58,8 @@ def create_parser():
     parser.add_argument("--fsm", action="store_true")
     parser.add_argument("--no-model", action="store_true")
     parser.add_argument("--display", "-d", action="store_true")
+    # skip rendering on the ticks that start late, the players then see stale frames while the game loop is loaded
+    parser.add_argument("--skip_render_when_behind", action="store_true")
     return parser
 
 
@@ -90,7 +92,11 @@ def create_parser_act():
         choices=valid_models_act,
     )
     parser.add_argument("--fsm", action="store_true")
+    # wait for each LLM answer instead of requesting the next action ahead and falling back on rules
+    parser.add_argument("--blocking", action="store_true")
     parser.add_argument("--display", "-d", action="store_true")
+    # skip rendering on the ticks that start late, the players then see stale frames while the game loop is loaded
+    parser.add_argument("--skip_render_when_behind", action="store_true")
     return parser
 
 
@@ -131,6 +137,8 @@ def create_parser_biased_agent():
     parser.add_argument("--fsm", action="store_true")
     parser.add_argument("--no-model", action="store_true")
     parser.add_argument("--display", "-d", action="store_true")
+    # skip rendering on the ticks that start late, the players then see stale frames while the game loop is loaded
+    parser.add_argument("--skip_render_when_behind", action="store_true")
     return parser
 
 
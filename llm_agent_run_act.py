@@ -10,6 +10,7 @@ from gym_cooking.cooking_world.cooking_world import CookingWorld
 from loguru import logger
 
 from agents.action_llm_agent import LLMActionAgent
+from agents.action_pipeline import ActionPipeline, ActionPipelineStats
 from agents.mid_agent import MidAgent
 from agents.rule_agent import RuleAgent
 from agents.text_agent import TextAgent
@@ -17,6 +18,11 @@ from coop_marl.controllers import LLMController
 from coop_marl.envs.overcooked.overcooked_maker import OvercookedMaker
 from coop_marl.utils import Arrdict, create_parser_act, parse_args, utils
 from utils.history import History
+from utils.lazy_log import lazy
+from utils.log_setup import setup_logging
+from utils.reservation_planner import ReservationTable
+from utils.tick_profiler import TickProfiler
+from utils.tick_scheduler import TickScheduler
 
 KeyToTuple_right = {
     pygame.K_RETURN: 5,
@@ -99,12 +105,28 @@ async def get_mid_action():
     global mid_action
     global history_buffer
     global env
-    global rule_agent, llm_idx
+    global rule_agent, llm_idx, action_pipeline
     global current_steps, max_steps
     global traj_infos
 
+    decision_step = None
     while True:
-        if not mid_action:
+        if not mid_action and action_pipeline is not None:
+            ## the LLM answers in the background, select at most once per step or when an answer comes back
+            if current_steps != decision_step or action_pipeline.ready:
+                decision_step = current_steps
+                with tick_profiler.stage("json_state"):
+                    json_state_simple = env.get_json_state_simple(llm_idx)
+                history_buffer.add(current_steps, json_state_simple, {})
+                s_time = time.time()
+                with tick_profiler.stage("agent"):
+                    mid_action, source = action_pipeline.select(
+                        history_buffer.get_formatted_history(1, llm_idx), json_state_simple, current_steps
+                    )
+                if mid_action:
+                    logger.warning(f"Action Pipeline Output ({source}): {mid_action}")
+                logger.trace(f"Action selection time: {time.time() - s_time: .4f}")
+        elif not mid_action:
             json_state_simple = env.get_json_state_simple(llm_idx)
             message_dict = {}
             ## mid action of LLM is saved here
@@ -118,7 +140,8 @@ async def get_mid_action():
                 if mid_action:
                     logger.warning(f"LLMAction Agent Output: {mid_action}")
             else:
-                mid_action = rule_agent.get_action(json_state_simple)
+                with tick_profiler.stage("agent"):
+                    mid_action = rule_agent.get_action(json_state_simple)
                 traj_infos["urgent_response"].append(
                     {
                         "t": current_steps,
@@ -134,12 +157,21 @@ async def get_mid_action():
             e_time = time.time()
             logger.success(f"Action inference time: {e_time - s_time: .2f}")
             # logger.success(f"Action Output: {mid_action}")
-            logger.debug("History:\n" + pformat([info._asdict() for info in history_buffer.get_history(1)]) + "\n" * 2)
+            lazy.debug("History:\n{}\n\n", lambda: pformat([info._asdict() for info in history_buffer.get_history(1)]))
         if current_steps >= max_steps:
+            if action_pipeline is not None:
+                action_pipeline.close()
             break
         await asyncio.sleep(0.01)
 
 
+def store_result(result: str) -> None:
+    if action_pipeline is not None:
+        action_pipeline.finish(result)
+    elif isinstance(rule_agent, LLMActionAgent):
+        rule_agent.store_result(result)
+
+
 async def run_game():
     global current_action_right, human_message
     global text_agent, mid_agent, rule_agent
@@ -149,6 +181,7 @@ async def run_game():
     global mid_action
     global traj_infos
     global llm_idx
+    global action_stats
 
     ## reset the env
     outcome = env.reset()
@@ -161,18 +194,17 @@ async def run_game():
     rule_agent.update(text_agent, env._env.unwrapped.world, env.get_json_state_simple(llm_idx))
 
     world: CookingWorld = env._env.unwrapped.world
-    agent_text_actions = {a_i: [] for a_i in range(env._env.num_agents)}
-    agent_mid_actions = {a_i: [] for a_i in range(env._env.num_agents)}
+    event_cursor = world.event_log.cursor()
+    mid_action_cursor = world.mid_action_log.cursor()
 
-    json_state = world.get_json_state(llm_idx)
-    logger.trace("state\n" + pformat(json_state))
-    valid_actions = text_agent.get_valid_actions()
-    logger.trace("valid text actions\n" + pformat(sorted(valid_actions)))
+    lazy.trace("state\n{}", lambda: pformat(world.get_json_state(llm_idx)))
+    lazy.trace("valid text actions\n{}", lambda: pformat(sorted(text_agent.get_valid_actions())))
 
     mid_action = None
     action = 0
     current_action = [0, 0]
     episode_s_time = time.time()
+    ticker = TickScheduler(0.25, skip_render_when_behind=args.skip_render_when_behind)
 
     current_traj_element = {
         "t": 0,
@@ -190,23 +222,23 @@ async def run_game():
 
         for i, k in enumerate(inp.data.keys()):
             if i == llm_idx:
+                action_stats.record_tick(idle=not mid_action)
                 if not mid_action:
                     current_traj_element["mid_action"] = None
 
                 elif mid_action:
                     current_traj_element["mid_action"] = mid_action
-                    end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
+                    with tick_profiler.stage("mid_agent"):
+                        end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
                     if end:
                         ## when the task at hand is finished
                         mid_action = None
                         if "Failed" in status:
                             logger.success(status)
-                            if isinstance(rule_agent, LLMActionAgent):
-                                rule_agent.store_result("Failed")
+                            store_result("Failed")
                         else:
                             logger.debug(status)
-                            if isinstance(rule_agent, LLMActionAgent):
-                                rule_agent.store_result("Success")
+                            store_result("Success")
                 current_action[i] = action
                 decision[k] = Arrdict(action=action)
 
@@ -218,32 +250,36 @@ async def run_game():
         # decision = controller.select_actions(current_action, inp)
         current_traj_element["action"] = deepcopy(current_action)
 
+        current_traj_element["wall_time"] = time.time()
         traj_infos["traj"].append(current_traj_element)
-        outcome, info = env.step(decision)
-        env.render(mode=True)
-        text_actions = world.get_events()
+        with tick_profiler.stage("env_step"):
+            outcome, info = env.step(decision)
+        if not ticker.skip_render:
+            with tick_profiler.stage("render"):
+                env.render(mode=True)
+        text_actions = {}
+        with tick_profiler.stage("events"):
+            for a_i, event in event_cursor.poll():
+                text_actions.setdefault(a_i, []).append(event)
+        with tick_profiler.stage("json_state"):
+            state_record = str(env.get_json_state_simple(llm_idx))
         current_traj_element = {
             "t": env.timestep,
             "score": info["player_0"]["score"],
-            "state": str(env.get_json_state_simple(llm_idx)),
+            "state": state_record,
             "message": [],
             "mid_action": None,
         }
-        for a_i, t_acts in text_actions.items():
-            if len(t_acts) > len(agent_text_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform text_action {t_acts[len(agent_text_actions[a_i]):]}")
-                agent_text_actions[a_i] = t_acts
-                traj_infos["text_action"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
-
-        mid_actions = world.get_mid_actions()
-
-        for a_i, m_acts in mid_actions.items():
-            if len(m_acts) > len(agent_mid_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform mid_action {m_acts[len(agent_mid_actions[a_i]):]}")
-                agent_mid_actions[a_i].append(m_acts[len(agent_mid_actions[a_i])])
+        for a_i, t_acts in sorted(text_actions.items()):
+            logger.debug(f"Agent {a_i} perform text_action {t_acts}")
+            traj_infos["text_action"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
+
+        with tick_profiler.stage("mid_actions"):
+            for a_i, done_mid_action in mid_action_cursor.poll():
+                logger.debug(f"Agent {a_i} perform mid_action {done_mid_action}")
                 ## each mid_action of LLM has already been saved when generated
                 if a_i != llm_idx:
-                    history_buffer.add_action(agent_mid_actions[a_i][-1], a_i)
+                    history_buffer.add_action(done_mid_action, a_i)
 
         ## got a human message
         if human_message:
@@ -259,12 +295,26 @@ async def run_game():
         current_action_right = 0
         human_message = ""
 
+        if tick_profiler.tick():
+            traj_infos["tick_profile"].append(tick_profiler.dump())
+            logger.info(f"Tick profile: {tick_profiler}")
+
         if current_steps >= max_steps:
             json_state_simple = env.get_json_state_simple(llm_idx)
             logger.error(f"Final Score: {pformat(json_state_simple['total_score'])}")
             break
 
-        await asyncio.sleep(0.25)
+        await ticker.wait()
+
+    logger.info(f"Ticks: {ticker}")
+    if tick_profiler.enabled:
+        traj_infos["tick_profile"].append(tick_profiler.dump())
+        traj_infos["tick_profile_total"] = tick_profiler.summary()
+        logger.success(f"Tick profile: {tick_profiler}")
+    logger.success(f"Actions: {action_stats}")
+    traj_infos["action_stats"] = action_stats.as_dict()
+    if action_pipeline is not None:
+        traj_infos["urgent_response"].extend(action_pipeline.responses)
 
 
 async def warm_start():
@@ -276,13 +326,7 @@ async def warm_start():
 
 
 if __name__ == "__main__":
-    logger.remove()
-    logger.add(sys.stdout, level="SUCCESS")
-    os.makedirs("logs", exist_ok=True)
-    f = open("logs/llm_agent_act.log", "w")
-    logger.add(f, level="TRACE")
-    f = open("logs/llm_agent_act_less.log", "w")
-    logger.add(f, level="INFO")
+    setup_logging("llm_agent_act")
     args, conf, env_conf, _ = parse_args(create_parser_act())
 
     # utils.set_random_seed(args.seed)
@@ -320,13 +364,19 @@ if __name__ == "__main__":
         "urgent_response": [],  # time, input, output, latency
         "reflection": [],  # time, input, output, latency
         "text_action": [],  # time, agent, action
+        "action_stats": {},  # mid action sources and idle ticks of the LLM agent
+        "tick_profile": [],  # per-stage times of the game loop, see utils.tick_profiler
     }
+    ## time the stages of the game loop when TICK_PROFILE is set
+    tick_profiler = TickProfiler.from_env()
 
     del env_conf["name"]
     env = OvercookedMaker(**env_conf, display=args.display)
     action_spaces = env.action_spaces
 
-    text_agent = TextAgent(env._env.unwrapped.world, llm_idx)
+    # the AI agent plans its moves around its partner, expected to stay where it is
+    reservations = ReservationTable()
+    text_agent = TextAgent(env._env.unwrapped.world, llm_idx, reservations=reservations)
 
     mid_agent = MidAgent(text_agent, env._env.unwrapped.world)
     if FSM:
@@ -342,6 +392,9 @@ if __name__ == "__main__":
             None,
             urgent_response_history_n_event,
         )
+    ## request the next action while the current one runs, rules fill in until the LLM answers
+    action_pipeline = None if FSM or args.blocking else ActionPipeline(rule_agent)
+    action_stats = action_pipeline.stats if action_pipeline is not None else ActionPipelineStats()
 
     ## save all history in the buffer
     history_buffer = History(max_steps=max_steps)
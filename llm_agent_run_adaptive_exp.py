@@ -17,6 +17,11 @@ from coop_marl.envs.overcooked.overcooked_maker import OvercookedMaker
 from coop_marl.utils import Arrdict, create_parser, parse_args, utils
 from llms.get_llm_output import get_openai_llm_output
 from utils.history import History
+from utils.lazy_log import lazy
+from utils.log_setup import setup_logging
+from utils.reservation_planner import ReservationTable
+from utils.tick_profiler import TickProfiler
+from utils.tick_scheduler import TickScheduler
 
 # 键盘映射
 KeyToTuple_right = {
@@ -292,7 +297,8 @@ def initialize_round(round_name: str):
         "start_time": round_start_time,
         "initial_mode": initial_mode,
         "button_valid": round_config["button_valid"],
-        "description": round_config["description"]
+        "description": round_config["description"],
+        "tick_profile": [],  # per-stage times of the game loop, see utils.tick_profiler
     }
     
     logger.info(f"=== Starting {round_name} ===")
@@ -355,18 +361,17 @@ async def run_game():
     rule_agent.update(text_agent, env._env.unwrapped.world, env.get_json_state_simple(llm_idx))
 
     world: CookingWorld = env._env.unwrapped.world
-    agent_text_actions = {a_i: [] for a_i in range(env._env.num_agents)}
-    agent_mid_actions = {a_i: [] for a_i in range(env._env.num_agents)}
+    event_cursor = world.event_log.cursor()
+    mid_action_cursor = world.mid_action_log.cursor()
 
-    json_state = world.get_json_state(llm_idx)
-    logger.trace("state\n" + pformat(json_state))
-    valid_actions = text_agent.get_valid_actions()
-    logger.trace("valid text actions\n" + pformat(sorted(valid_actions)))
+    lazy.trace("state\n{}", lambda: pformat(world.get_json_state(llm_idx)))
+    lazy.trace("valid text actions\n{}", lambda: pformat(sorted(text_agent.get_valid_actions())))
 
     mid_action = None
     action = 0
     current_action = [0, 0]
     episode_s_time = time.time()
+    ticker = TickScheduler(0.25, skip_render_when_behind=args.skip_render_when_behind)
 
     current_traj_element = {
         "t": 0,
@@ -389,15 +394,18 @@ async def run_game():
             if i == llm_idx:
                 if not mid_action:
                     current_traj_element["mid_action"] = None
-                    json_state_simple = env.get_json_state_simple(llm_idx)
+                    with tick_profiler.stage("json_state"):
+                        json_state_simple = env.get_json_state_simple(llm_idx)
 
                     if NO_MODEL:
                         s_time = time.time()
-                        mid_action = rule_agent.get_action(json_state_simple)
+                        with tick_profiler.stage("agent"):
+                            mid_action = rule_agent.get_action(json_state_simple)
                         logger.info(f"LLM input {json_state_simple}")
                         logger.success(f"FSM LLM Output: {mid_action}, Used {time.time() - s_time: .4f}s")
                     else:
-                        mid_action = rule_agent.get_action(json_state_simple)
+                        with tick_profiler.stage("agent"):
+                            mid_action = rule_agent.get_action(json_state_simple)
                     
                     message_dict = {}
                     history_buffer.add(
@@ -406,14 +414,15 @@ async def run_game():
                         message_dict,
                     )
 
-                    logger.debug(
-                        "History:\n" + pformat([info._asdict() for info in history_buffer.get_history(1)]) + "\n" * 2
+                    lazy.debug(
+                        "History:\n{}\n\n", lambda: pformat([info._asdict() for info in history_buffer.get_history(1)])
                     )
                 
                 if mid_action:
                     logger.info(f"DPT Agent: {mid_action}")
                     current_traj_element["mid_action"] = mid_action
-                    end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
+                    with tick_profiler.stage("mid_agent"):
+                        end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
                     
                     if end:
                         mid_action = None
@@ -457,16 +466,25 @@ async def run_game():
         current_traj_element["mode_switches"] = mode_switch_count
         
         experiment_data["rounds"][current_round]["trajectory"] = experiment_data["rounds"].get(current_round, {}).get("trajectory", [])
+        current_traj_element["wall_time"] = time.time()
         experiment_data["rounds"][current_round]["trajectory"].append(current_traj_element)
         
-        outcome, info = env.step(Arrdict(action=decision))
-        env.render(mode=True)
-        text_actions = world.get_events()
+        with tick_profiler.stage("env_step"):
+            outcome, info = env.step(Arrdict(action=decision))
+        if not ticker.skip_render:
+            with tick_profiler.stage("render"):
+                env.render(mode=True)
+        text_actions = {}
+        with tick_profiler.stage("events"):
+            for a_i, event in event_cursor.poll():
+                text_actions.setdefault(a_i, []).append(event)
 
+        with tick_profiler.stage("json_state"):
+            state_record = str(env.get_json_state_simple(llm_idx))
         current_traj_element = {
             "t": env.timestep,
             "score": info["player_0"]["score"],
-            "state": str(env.get_json_state_simple(llm_idx)),
+            "state": state_record,
             "message": [],
             "mid_action": None,
             "controlled_by_fsm": None,
@@ -474,20 +492,15 @@ async def run_game():
             "mode": rule_agent.mode,
         }
 
-        for a_i, t_acts in text_actions.items():
-            if len(t_acts) > len(agent_text_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform text_action {t_acts[len(agent_text_actions[a_i]):]}")
-                agent_text_actions[a_i] = t_acts
-                experiment_data["rounds"][current_round]["text_actions"] = experiment_data["rounds"].get(current_round, {}).get("text_actions", [])
-                experiment_data["rounds"][current_round]["text_actions"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
+        for a_i, t_acts in sorted(text_actions.items()):
+            logger.debug(f"Agent {a_i} perform text_action {t_acts}")
+            experiment_data["rounds"][current_round]["text_actions"] = experiment_data["rounds"].get(current_round, {}).get("text_actions", [])
+            experiment_data["rounds"][current_round]["text_actions"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
         
-        mid_actions = world.get_mid_actions()
-
-        for a_i, m_acts in mid_actions.items():
-            if len(m_acts) > len(agent_mid_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform mid_action {m_acts[len(agent_mid_actions[a_i]):]}")
-                agent_mid_actions[a_i].append(m_acts[len(agent_mid_actions[a_i])])
-                history_buffer.add_action(agent_mid_actions[a_i][-1], a_i)
+        with tick_profiler.stage("mid_actions"):
+            for a_i, done_mid_action in mid_action_cursor.poll():
+                logger.debug(f"Agent {a_i} perform mid_action {done_mid_action}")
+                history_buffer.add_action(done_mid_action, a_i)
 
         current_steps = env.timestep
         logger.debug(f"Step {current_steps} / {max_steps}")
@@ -506,6 +519,8 @@ async def run_game():
                 logger.info(f"Final score: {info['player_0']['score']}")
                 logger.info(f"Button clicks: {button_click_count}")
                 logger.info(f"Mode switches: {mode_switch_count}")
+                if tick_profiler.enabled:
+                    experiment_data["rounds"][current_round]["tick_profile"].append(tick_profiler.dump())
                 
                 # 初始化下一个round
                 initialize_round(next_round)
@@ -544,12 +559,22 @@ async def run_game():
                 f"Step: {current_steps} / {max_steps}, FPS: {current_steps / (time.time() - episode_s_time): .2f}"
             )
 
+        if tick_profiler.tick():
+            experiment_data["rounds"][current_round]["tick_profile"].append(tick_profiler.dump())
+            logger.info(f"Tick profile: {tick_profiler}")
+
         if current_steps >= max_steps:
             json_state_simple = env.get_json_state_simple(llm_idx)
             logger.error(f"Final Score: {pformat(json_state_simple['total_score'])}")
             break
 
-        await asyncio.sleep(0.25)
+        await ticker.wait()
+
+    logger.info(f"Ticks: {ticker}")
+    if tick_profiler.enabled:
+        experiment_data["rounds"][current_round]["tick_profile"].append(tick_profiler.dump())
+        experiment_data["tick_profile_total"] = tick_profiler.summary()
+        logger.success(f"Tick profile: {tick_profiler}")
 
 
 async def warm_start():
@@ -560,12 +585,7 @@ async def warm_start():
 
 
 if __name__ == "__main__":
-    logger.remove()
-    logger.add(sys.stdout, level="SUCCESS")
-    f = open("logs/llm_agent_adaptive.log", "w")
-    logger.add(f, level="TRACE")
-    f = open("logs/llm_agent_adaptive_less.log", "w")
-    logger.add(f, level="INFO")
+    setup_logging("llm_agent_adaptive")
     
     args, conf, env_conf, _ = parse_args(create_parser())
 
@@ -606,7 +626,9 @@ if __name__ == "__main__":
     env = OvercookedMaker(**env_conf, display=args.display)
     action_spaces = env.action_spaces
 
-    text_agent = TextAgent(env._env.unwrapped.world, llm_idx)
+    # the AI agent plans its moves around its partner, expected to stay where it is
+    reservations = ReservationTable()
+    text_agent = TextAgent(env._env.unwrapped.world, llm_idx, reservations=reservations)
     mid_agent = MidAgent(text_agent, env._env.unwrapped.world)
 
     # 创建AdaptiveDPTAgent
@@ -630,6 +652,8 @@ if __name__ == "__main__":
         )
 
     history_buffer = History(max_steps=max_steps)
+    # time the stages of the game loop when TICK_PROFILE is set
+    tick_profiler = TickProfiler.from_env()
 
     agent_list = [None, None]
     agent_list[llm_idx] = text_agent
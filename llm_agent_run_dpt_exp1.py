@@ -17,6 +17,11 @@ from coop_marl.envs.overcooked.overcooked_maker import OvercookedMaker
 from coop_marl.utils import Arrdict, create_parser, parse_args, utils
 from llms.get_llm_output import get_openai_llm_output
 from utils.history import History
+from utils.lazy_log import lazy
+from utils.log_setup import setup_logging
+from utils.reservation_planner import ReservationTable
+from utils.tick_profiler import TickProfiler
+from utils.tick_scheduler import TickScheduler
 
 KeyToTuple_right = {
     pygame.K_RETURN: 5,
@@ -173,19 +178,18 @@ async def run_game():
     rule_agent.update(text_agent, env._env.unwrapped.world, env.get_json_state_simple(llm_idx))
 
     world: CookingWorld = env._env.unwrapped.world
-    agent_text_actions = {a_i: [] for a_i in range(env._env.num_agents)}
-    agent_mid_actions = {a_i: [] for a_i in range(env._env.num_agents)}
+    event_cursor = world.event_log.cursor()
+    mid_action_cursor = world.mid_action_log.cursor()
 
-    json_state = world.get_json_state(llm_idx)
-    logger.trace("state\n" + pformat(json_state))
-    valid_actions = text_agent.get_valid_actions()
-    logger.trace("valid text actions\n" + pformat(sorted(valid_actions)))
+    lazy.trace("state\n{}", lambda: pformat(world.get_json_state(llm_idx)))
+    lazy.trace("valid text actions\n{}", lambda: pformat(sorted(text_agent.get_valid_actions())))
 
     mid_action = None
     action = 0
 
     current_action = [0, 0]
     episode_s_time = time.time()
+    ticker = TickScheduler(0.25, skip_render_when_behind=args.skip_render_when_behind)
     # init_mid_action = False
 
     current_traj_element = {
@@ -207,8 +211,10 @@ async def run_game():
             if i == llm_idx:
                 if not mid_action:
                     current_traj_element["mid_action"] = None
-                    json_state_simple = env.get_json_state_simple(llm_idx)
-                    mid_action = rule_agent.get_action(json_state_simple)
+                    with tick_profiler.stage("json_state"):
+                        json_state_simple = env.get_json_state_simple(llm_idx)
+                    with tick_profiler.stage("agent"):
+                        mid_action = rule_agent.get_action(json_state_simple)
                     if mid_action:
                         logger.warning(f"DPT Agent: {mid_action}")
                     message_dict = {}
@@ -220,12 +226,13 @@ async def run_game():
                     # init_mid_action = True
                     history_buffer.add(current_steps, json_state_simple, message_dict)
 
-                    logger.debug(
-                        "History:\n" + pformat([info._asdict() for info in history_buffer.get_history(1)]) + "\n" * 2
+                    lazy.debug(
+                        "History:\n{}\n\n", lambda: pformat([info._asdict() for info in history_buffer.get_history(1)])
                     )
                 if mid_action:
                     current_traj_element["mid_action"] = mid_action
-                    end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
+                    with tick_profiler.stage("mid_agent"):
+                        end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
                     # if init_mid_action and not end:
                     #     init_mid_action = False
                     #     history_buffer.add_action(mid_action, llm_idx)
@@ -244,32 +251,36 @@ async def run_game():
         # env step
         current_traj_element["action"] = deepcopy(current_action)
 
+        current_traj_element["wall_time"] = time.time()
         traj_infos["traj"].append(current_traj_element)
-        outcome, info = env.step(decision)
-        env.render(mode=True)
-        text_actions = world.get_events()
+        with tick_profiler.stage("env_step"):
+            outcome, info = env.step(decision)
+        if not ticker.skip_render:
+            with tick_profiler.stage("render"):
+                env.render(mode=True)
+        text_actions = {}
+        with tick_profiler.stage("events"):
+            for a_i, event in event_cursor.poll():
+                text_actions.setdefault(a_i, []).append(event)
+        with tick_profiler.stage("json_state"):
+            state_record = str(env.get_json_state_simple(llm_idx))
         current_traj_element = {
             "t": env.timestep,
             "score": info["player_0"]["score"],
-            "state": str(env.get_json_state_simple(llm_idx)),
+            "state": state_record,
             "message": [],
             "mid_action": None,
             "controlled_by_fsm": None,
         }
-        for a_i, t_acts in text_actions.items():
-            if len(t_acts) > len(agent_text_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform text_action {t_acts[len(agent_text_actions[a_i]):]}")
-                agent_text_actions[a_i] = t_acts
-                traj_infos["text_action"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
-        mid_actions = world.get_mid_actions()
-
-        for a_i, m_acts in mid_actions.items():
-            if len(m_acts) > len(agent_mid_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform mid_action {m_acts[len(agent_mid_actions[a_i]):]}")
-                agent_mid_actions[a_i].append(m_acts[len(agent_mid_actions[a_i])])
+        for a_i, t_acts in sorted(text_actions.items()):
+            logger.debug(f"Agent {a_i} perform text_action {t_acts}")
+            traj_infos["text_action"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
+        with tick_profiler.stage("mid_actions"):
+            for a_i, done_mid_action in mid_action_cursor.poll():
+                logger.debug(f"Agent {a_i} perform mid_action {done_mid_action}")
                 # if a_i != llm_idx:
-                #     history_buffer.add_action(agent_mid_actions[a_i][-1], a_i)
-                history_buffer.add_action(agent_mid_actions[a_i][-1], a_i)
+                #     history_buffer.add_action(done_mid_action, a_i)
+                history_buffer.add_action(done_mid_action, a_i)
 
         if human_message:
             logger.success(f"Human: {human_message}")
@@ -290,12 +301,22 @@ async def run_game():
         current_action_right = 0
         human_message = ""
 
+        if tick_profiler.tick():
+            traj_infos["tick_profile"].append(tick_profiler.dump())
+            logger.info(f"Tick profile: {tick_profiler}")
+
         if current_steps >= max_steps:
             json_state_simple = env.get_json_state_simple(llm_idx)
             logger.error(f"Final Score: {pformat(json_state_simple['total_score'])}")
             break
 
-        await asyncio.sleep(0.25)
+        await ticker.wait()
+
+    logger.info(f"Ticks: {ticker}")
+    if tick_profiler.enabled:
+        traj_infos["tick_profile"].append(tick_profiler.dump())
+        traj_infos["tick_profile_total"] = tick_profiler.summary()
+        logger.success(f"Tick profile: {tick_profiler}")
 
 
 async def warm_start():
@@ -305,12 +326,7 @@ async def warm_start():
 
 
 if __name__ == "__main__":
-    logger.remove()
-    logger.add(sys.stdout, level="SUCCESS")
-    f = open("logs/llm_agent_dpt.log", "w")
-    logger.add(f, level="TRACE")
-    f = open("logs/llm_agent_dpt_less.log", "w")
-    logger.add(f, level="INFO")
+    setup_logging("llm_agent_dpt")
     args, conf, env_conf, _ = parse_args(create_parser())
 
     utils.set_random_seed(0)
@@ -350,14 +366,19 @@ if __name__ == "__main__":
         "urgent_response": [],  # time, input, output, latency
         "reflection": [],  # time, input, output, latency
         "text_action": [],  # time, agent, action
+        "tick_profile": [],  # per-stage times of the game loop, see utils.tick_profiler
     }
+    ## time the stages of the game loop when TICK_PROFILE is set
+    tick_profiler = TickProfiler.from_env()
 
     del env_conf["name"]
     env = OvercookedMaker(**env_conf, display=args.display)
     action_spaces = env.action_spaces
     # control_agent = args.control_agent if args.control_agent is not None else env.players[0]
 
-    text_agent = TextAgent(env._env.unwrapped.world, llm_idx)
+    # the AI agent plans its moves around its partner, expected to stay where it is
+    reservations = ReservationTable()
+    text_agent = TextAgent(env._env.unwrapped.world, llm_idx, reservations=reservations)
 
     mid_agent = MidAgent(text_agent, env._env.unwrapped.world)
     if FSM:
@@ -26,6 +26,11 @@ from coop_marl.utils import create_parser_biased_agent as create_parser
 from coop_marl.utils import parse_args, utils
 from llms.get_llm_output import get_openai_llm_output
 from utils.history import History
+from utils.lazy_log import lazy
+from utils.log_setup import setup_logging
+from utils.reservation_planner import ReservationTable
+from utils.tick_profiler import TickProfiler
+from utils.tick_scheduler import TickScheduler
 
 
 async def get_biased_agent_action() -> str:
@@ -67,16 +72,20 @@ async def get_biased_agent_action() -> str:
         if current_action_right == None:
             current_action_right = 0
             if not mid_action_right:
-                json_state_simple = env.get_json_state_simple(biased_agent_idx)
+                with tick_profiler.stage("json_state"):
+                    json_state_simple = env.get_json_state_simple(biased_agent_idx)
                 logger.info(f"Biased Agent Input {json_state_simple}")
                 if isinstance(current_agent, SwitchAgent):
-                    mid_action_right = current_agent.get_action(json_state_simple, current_steps)
+                    with tick_profiler.stage("partner_agent"):
+                        mid_action_right = current_agent.get_action(json_state_simple, current_steps)
                 else:
-                    mid_action_right = current_agent.get_action(json_state_simple)
+                    with tick_profiler.stage("partner_agent"):
+                        mid_action_right = current_agent.get_action(json_state_simple)
                 if mid_action_right:
                     logger.warning(f"Biased Agent Output {mid_action_right}")
             if mid_action_right:
-                end, action_right, status = biased_mid_agent.get_action(mid_action_right[0], **mid_action_right[1])
+                with tick_profiler.stage("partner_mid_agent"):
+                    end, action_right, status = biased_mid_agent.get_action(mid_action_right[0], **mid_action_right[1])
                 n_execution += 1
                 if end:
                     if "Failed" in status:
@@ -186,18 +195,17 @@ async def run_game():
     biased_mid_agent.update(biased_text_agent, env._env.unwrapped.world)
 
     world: CookingWorld = env._env.unwrapped.world
-    agent_text_actions = {a_i: [] for a_i in range(env._env.num_agents)}
-    agent_mid_actions = {a_i: [] for a_i in range(env._env.num_agents)}
+    event_cursor = world.event_log.cursor()
+    mid_action_cursor = world.mid_action_log.cursor()
 
-    json_state = world.get_json_state(llm_idx)
-    logger.trace("state\n" + pformat(json_state))
-    valid_actions = text_agent.get_valid_actions()
-    logger.trace("valid text actions\n" + pformat(sorted(valid_actions)))
+    lazy.trace("state\n{}", lambda: pformat(world.get_json_state(llm_idx)))
+    lazy.trace("valid text actions\n{}", lambda: pformat(sorted(text_agent.get_valid_actions())))
 
     mid_action = None
     action = 0
     current_action = [0, 0]
     episode_s_time = time.time()
+    ticker = TickScheduler(0.25, skip_render_when_behind=args.skip_render_when_behind)
     # init_mid_action = False
 
     current_traj_element = {
@@ -220,11 +228,13 @@ async def run_game():
             if i == llm_idx:
                 if not mid_action:
                     current_traj_element["mid_action"][llm_idx] = None
-                    json_state_simple = env.get_json_state_simple(llm_idx)
+                    with tick_profiler.stage("json_state"):
+                        json_state_simple = env.get_json_state_simple(llm_idx)
 
                     if NO_MODEL:
                         s_time = time.time()
-                        mid_action = rule_agent.get_action(json_state_simple)
+                        with tick_profiler.stage("agent"):
+                            mid_action = rule_agent.get_action(json_state_simple)
                         traj_infos["urgent_response"].append(
                             {
                                 "t": current_steps,
@@ -236,7 +246,8 @@ async def run_game():
                         logger.info(f"LLM input {json_state_simple}")
                         logger.success(f"FSM LLM Output: {mid_action}, Used {time.time() - s_time: .4f}s")
                     else:
-                        mid_action = rule_agent.get_action(json_state_simple)
+                        with tick_profiler.stage("agent"):
+                            mid_action = rule_agent.get_action(json_state_simple)
                     message_dict = {}
                     history_buffer.add(
                         current_steps,
@@ -244,13 +255,14 @@ async def run_game():
                         message_dict,
                     )
 
-                    logger.debug(
-                        "History:\n" + pformat([info._asdict() for info in history_buffer.get_history(1)]) + "\n" * 2
+                    lazy.debug(
+                        "History:\n{}\n\n", lambda: pformat([info._asdict() for info in history_buffer.get_history(1)])
                     )
                 if mid_action:
                     logger.info(f"DPT Agent: {mid_action}")
                     current_traj_element["mid_action"][llm_idx] = mid_action
-                    end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
+                    with tick_profiler.stage("mid_agent"):
+                        end, action, status = mid_agent.get_action(mid_action[0], **mid_action[1])
                     n_execution += 1
                     # if init_mid_action and not end:
                     #     init_mid_action = False
@@ -281,34 +293,38 @@ async def run_game():
                 current_action_right = None
         # env step
         current_traj_element["action"] = deepcopy(current_action)
+        current_traj_element["wall_time"] = time.time()
         traj_infos["traj"].append(current_traj_element)
-        outcome, info = env.step(decision)
-        env.render(mode=True)
-        text_actions = world.get_events()
-
+        with tick_profiler.stage("env_step"):
+            outcome, info = env.step(decision)
+        if not ticker.skip_render:
+            with tick_profiler.stage("render"):
+                env.render(mode=True)
+        text_actions = {}
+        with tick_profiler.stage("events"):
+            for a_i, event in event_cursor.poll():
+                text_actions.setdefault(a_i, []).append(event)
+
+        with tick_profiler.stage("json_state"):
+            state_record = str(env.get_json_state_simple(llm_idx))
         current_traj_element = {
             "t": env.timestep,
             "score": info["player_0"]["score"],
-            "state": str(env.get_json_state_simple(llm_idx)),
+            "state": state_record,
             "message": [],
             "mid_action": {},
             "controlled_by_fsm": None,
         }
 
-        for a_i, t_acts in text_actions.items():
-            if len(t_acts) > len(agent_text_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform text_action {t_acts[len(agent_text_actions[a_i]):]}")
-                agent_text_actions[a_i] = t_acts
-                traj_infos["text_action"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
-        mid_actions = world.get_mid_actions()
-
-        for a_i, m_acts in mid_actions.items():
-            if len(m_acts) > len(agent_mid_actions[a_i]):
-                logger.debug(f"Agent {a_i} perform mid_action {m_acts[len(agent_mid_actions[a_i]):]}")
-                agent_mid_actions[a_i].append(m_acts[len(agent_mid_actions[a_i])])
+        for a_i, t_acts in sorted(text_actions.items()):
+            logger.debug(f"Agent {a_i} perform text_action {t_acts}")
+            traj_infos["text_action"].append({"t": env.timestep, "agent": a_i, "action": t_acts[-1]})
+        with tick_profiler.stage("mid_actions"):
+            for a_i, done_mid_action in mid_action_cursor.poll():
+                logger.debug(f"Agent {a_i} perform mid_action {done_mid_action}")
                 # if a_i != llm_idx:
-                #     history_buffer.add_action(agent_mid_actions[a_i][-1], a_i)
-                history_buffer.add_action(agent_mid_actions[a_i][-1], a_i)
+                #     history_buffer.add_action(done_mid_action, a_i)
+                history_buffer.add_action(done_mid_action, a_i)
 
         if human_message:
             logger.success(f"Human: {human_message}")
@@ -329,12 +345,22 @@ async def run_game():
             )
         human_message = ""
 
+        if tick_profiler.tick():
+            traj_infos["tick_profile"].append(tick_profiler.dump())
+            logger.info(f"Tick profile: {tick_profiler}")
+
         if current_steps >= max_steps:
             json_state_simple = env.get_json_state_simple(llm_idx)
             logger.error(f"Final Score: {pformat(json_state_simple['total_score'])}")
             break
 
-        await asyncio.sleep(0.25)
+        await ticker.wait()
+
+    logger.info(f"Ticks: {ticker}")
+    if tick_profiler.enabled:
+        traj_infos["tick_profile"].append(tick_profiler.dump())
+        traj_infos["tick_profile_total"] = tick_profiler.summary()
+        logger.success(f"Tick profile: {tick_profiler}")
 
 
 async def warm_start():
@@ -356,12 +382,7 @@ biased_agent_name = {
     9: "FSM",
 }
 if __name__ == "__main__":
-    logger.remove()
-    logger.add(sys.stdout, level="SUCCESS")
-    f = open("logs/llm_agent_dpt.log", "w")
-    logger.add(f, level="TRACE")
-    f = open("logs/llm_agent_dpt_less.log", "w")
-    logger.add(f, level="INFO")
+    setup_logging("llm_agent_dpt")
     args, conf, env_conf, _ = parse_args(create_parser())
 
     # utils.set_random_seed(args.seed)
@@ -415,7 +436,10 @@ if __name__ == "__main__":
         "urgent_response": [],  # time, input, output, latency
         "reflection": [],  # time, input, output, latency
         "text_action": [],  # time, agent, action
+        "tick_profile": [],  # per-stage times of the game loop, see utils.tick_profiler
     }
+    ## time the stages of the game loop when TICK_PROFILE is set
+    tick_profiler = TickProfiler.from_env()
 
     mid_action_right = None
     current_traj_element = None
@@ -425,11 +449,13 @@ if __name__ == "__main__":
     action_spaces = env.action_spaces
     # control_agent = args.control_agent if args.control_agent is not None else env.players[0]
 
-    text_agent = TextAgent(env._env.unwrapped.world, llm_idx)
+    # the agents plan their moves around each other's paths
+    reservations = ReservationTable()
+    text_agent = TextAgent(env._env.unwrapped.world, llm_idx, reservations=reservations)
     mid_agent = MidAgent(text_agent, env._env.unwrapped.world)
 
     biased_agent_idx = 0
-    biased_text_agent = TextAgent(env._env.unwrapped.world, biased_agent_idx)
+    biased_text_agent = TextAgent(env._env.unwrapped.world, biased_agent_idx, reservations=reservations)
     biased_mid_agent = MidAgent(text_agent, env._env.unwrapped.world)
     biased_rule_agent = RuleAgent(biased_text_agent, env._env.unwrapped.world)
     beef_agent = PrepareBeefAgent(biased_text_agent, env._env.unwrapped.world)
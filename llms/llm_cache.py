@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+
+from loguru import logger
+
+from utils.cache_stats import CacheStats
+
+# Answer of the local stand-in: a thought and no assigned tasks, the agent keeps playing its FSM
+STAND_IN_OUTPUT = """\
+```text
+Keep working on the current orders.
+```
+```json
+[]
+```"""
+
+
+async def stand_in_llm_output(model: str, messages: list[dict], params: dict = None) -> str:
+    return STAND_IN_OUTPUT
+
+
+def prompt_key(model: str, messages: list[dict]) -> str:
+    return hashlib.sha256(json.dumps([model, messages], sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Drop-in for `get_openai_llm_output` answering from a JSONL file of recorded outputs, keyed on the model and the
+    prompt messages.
+
+    mode "replay": prompts not in the file are answered by `fallback` (the local stand-in by default).
+    mode "record": prompts not in the file are sent to `fallback` (e.g. `get_openai_llm_output`) and the outputs are
+    appended to the file, one line per output, so that processes recording into the same file do not clobber it.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", fallback=stand_in_llm_output) -> None:
+        assert mode in ["replay", "record"], f"Invalid mode: {mode}"
+        self.path = path
+        self.mode = mode
+        self.fallback = fallback
+        self.stats = CacheStats()
+        self.outputs: dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.outputs[record["key"]] = record["output"]
+
+    async def __call__(self, model: str, messages: list[dict], params: dict = None) -> str:
+        s_time = time.perf_counter()
+        key = prompt_key(model, messages)
+        if key in self.outputs:
+            self.stats.record(True, time.perf_counter() - s_time)
+            return self.outputs[key]
+
+        output = await self.fallback(model, messages, params)
+        if self.mode == "record":
+            self.outputs[key] = output
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "model": model, "output": output}, ensure_ascii=False) + "\n")
+        else:
+            logger.debug(f"LLM cache miss {key[:12]}, answered by {self.fallback.__name__}")
+        self.stats.record(False, time.perf_counter() - s_time)
+        return output
@@ -0,0 +1,37 @@
+class CacheStats:
+    """
+    Hit/miss counters and time spent for a memoized computation.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.hit_time = 0.0
+        self.miss_time = 0.0
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def record(self, hit: bool, elapsed: float) -> None:
+        if hit:
+            self.hits += 1
+            self.hit_time += elapsed
+        else:
+            self.misses += 1
+            self.miss_time += elapsed
+
+    @property
+    def calls(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.calls if self.calls else 0.0
+
+    def __repr__(self) -> str:
+        mean_hit = self.hit_time / self.hits * 1e3 if self.hits else 0.0
+        mean_miss = self.miss_time / self.misses * 1e3 if self.misses else 0.0
+        return (
+            f"calls={self.calls} hit_rate={self.hit_rate:.1%} "
+            f"mean_hit={mean_hit:.3f}ms mean_miss={mean_miss:.3f}ms total={self.hit_time + self.miss_time:.3f}s"
+        )
@@ -0,0 +1,64 @@
+from collections import deque
+from typing import Iterable, Optional, Tuple
+
+UNREACHABLE = -1
+
+
+def get_neighbor_position(position: Tuple[int, int]):
+    (x, y) = position
+    return [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+
+
+class DistanceField:
+    """
+    Breadth-first distances from `start` over the walkable (0) tiles of a level array indexed `[x][y]`, with the
+    `blocked` tiles (e.g. the other agents) treated as walls.
+
+    One field answers every reachability and distance query from `start` with a lookup, where `find_path` runs an A*
+    search per query.
+    """
+
+    def __init__(self, level_array, start: Tuple[int, int], blocked: Iterable[Tuple[int, int]] = ()) -> None:
+        walkable = [[tile == 0 for tile in column] for column in level_array]
+        for x, y in blocked:
+            walkable[x][y] = False
+        self.start = tuple(start)
+        self.width = len(walkable)
+        self.height = len(walkable[0]) if walkable else 0
+        self.distances = [[UNREACHABLE] * self.height for _ in range(self.width)]
+
+        (x, y) = self.start
+        self.distances[x][y] = 0
+        queue = deque([self.start])
+        while queue:
+            position = queue.popleft()
+            distance = self.distances[position[0]][position[1]] + 1
+            for x, y in get_neighbor_position(position):
+                if (
+                    0 <= x < self.width
+                    and 0 <= y < self.height
+                    and walkable[x][y]
+                    and self.distances[x][y] == UNREACHABLE
+                ):
+                    self.distances[x][y] = distance
+                    queue.append((x, y))
+
+    def distance(self, position: Tuple[int, int]) -> Optional[int]:
+        """
+        Number of moves from `start` to `position`, None if it cannot be reached.
+        """
+        (x, y) = position
+        if not (0 <= x < self.width and 0 <= y < self.height) or self.distances[x][y] == UNREACHABLE:
+            return None
+        return self.distances[x][y]
+
+    def reachable(self, position: Tuple[int, int]) -> bool:
+        return self.distance(position) is not None
+
+    def interaction_distance(self, location: Tuple[int, int]) -> Optional[int]:
+        """
+        Number of moves from `start` to the closest tile next to `location`, from where the object at `location` can
+        be interacted with, None if there is no such tile.
+        """
+        distances = [d for d in map(self.distance, get_neighbor_position(location)) if d is not None]
+        return min(distances) if distances else None
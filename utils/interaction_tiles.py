@@ -0,0 +1,93 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.distance_field import get_neighbor_position
+
+# orientation (= move action) an agent on a tile faces to interact with the tile at offset (dx, dy)
+FACING = {(-1, 0): 1, (1, 0): 2, (0, 1): 3, (0, -1): 4}
+
+NO_REGION = -1
+
+
+class InteractionTiles:
+    """
+    Static table of a level array indexed `[x][y]` (0: floor, 1: counter / station): for every tile, the floor tiles
+    next to it from where an agent can interact with it and the orientation it must face there, and a connected
+    region label for every floor tile.
+
+    Stations, counters and cutboards never move, so a level needs one table (see `get_interaction_tiles`). The other
+    agents are not part of it.
+    """
+
+    def __init__(self, level_array) -> None:
+        self.width = len(level_array)
+        self.height = len(level_array[0]) if self.width else 0
+        walkable = [[tile == 0 for tile in column] for column in level_array]
+
+        self.tiles: Dict[Tuple[int, int], List[Tuple[Tuple[int, int], int]]] = {}
+        for x in range(self.width):
+            for y in range(self.height):
+                self.tiles[(x, y)] = [
+                    ((nx, ny), FACING[(x - nx, y - ny)])
+                    for nx, ny in get_neighbor_position((x, y))
+                    if 0 <= nx < self.width and 0 <= ny < self.height and walkable[nx][ny]
+                ]
+
+        self.regions = [[NO_REGION] * self.height for _ in range(self.width)]
+        n_regions = 0
+        for x in range(self.width):
+            for y in range(self.height):
+                if not walkable[x][y] or self.regions[x][y] != NO_REGION:
+                    continue
+                self.regions[x][y] = n_regions
+                stack = [(x, y)]
+                while stack:
+                    for tile, _ in self.tiles[stack.pop()]:
+                        if self.regions[tile[0]][tile[1]] == NO_REGION:
+                            self.regions[tile[0]][tile[1]] = n_regions
+                            stack.append(tile)
+                n_regions += 1
+        self.n_regions = n_regions
+
+    def interaction_tiles(self, location: Tuple[int, int]) -> List[Tuple[Tuple[int, int], int]]:
+        """
+        Floor tiles next to `location` with the orientation to face `location` from them.
+        """
+        return self.tiles.get(tuple(location), [])
+
+    def region(self, position: Tuple[int, int]) -> Optional[int]:
+        (x, y) = position
+        if not (0 <= x < self.width and 0 <= y < self.height) or self.regions[x][y] == NO_REGION:
+            return None
+        return self.regions[x][y]
+
+    def interaction_regions(self, location: Tuple[int, int]) -> Set[int]:
+        """
+        Regions from where the tile at `location` can be interacted with.
+        """
+        return {self.regions[x][y] for (x, y), _ in self.interaction_tiles(location)}
+
+    def can_reach(self, position: Tuple[int, int], location: Tuple[int, int]) -> bool:
+        """
+        Whether an agent on `position` can walk to `location`, or to a tile next to it if it is not floor, ignoring
+        the other agents.
+        """
+        region = self.region(position)
+        if region is None:
+            return False
+        return region == self.region(location) or region in self.interaction_regions(location)
+
+
+_tables: Dict[Tuple[Tuple[int, ...], bytes], InteractionTiles] = {}
+
+
+def get_interaction_tiles(level_array) -> InteractionTiles:
+    """
+    The `InteractionTiles` of a level array, built once per level layout.
+    """
+    array = np.asarray(level_array)
+    key = (array.shape, array.tobytes())
+    if key not in _tables:
+        _tables[key] = InteractionTiles(level_array)
+    return _tables[key]
@@ -0,0 +1,23 @@
+"""
+Logging for hot paths: the arguments of `lazy` calls are callables, run to build the message only when a sink accepts
+the level, e.g.
+
+    lazy.debug("json state:\n{}", lambda: pformat(json_state))
+
+costs a level check per call when no sink takes DEBUG, where `logger.debug("json state:\n" + pformat(json_state))`
+formats the state every time.
+"""
+
+import os
+
+from loguru import logger
+
+lazy = logger.opt(lazy=True)
+
+
+def trace_log_level(default: str = "TRACE") -> str:
+    """
+    Level of the detailed log files of the runners and the web app, `TRACE_LOG_LEVEL` if set. With "INFO" or above
+    the lazy debug / trace messages are not formatted at all.
+    """
+    return os.environ.get("TRACE_LOG_LEVEL", default)
@@ -0,0 +1,70 @@
+"""
+Log sinks of the runners and the web app.
+
+File sinks are written by a background thread (loguru `enqueue`), so the game loop only puts records on a queue,
+and the forked web app shards send theirs to the same thread. The logs of a runner start empty for every run, the
+web app appends to its logs across restarts. Logs are rotated at `ROTATION` and the rotated files are compressed.
+"""
+
+import os
+import sys
+
+from loguru import logger
+
+from utils.lazy_log import trace_log_level
+
+LOG_DIR = "logs"
+ROTATION = "100 MB"
+COMPRESSION = "gz"
+
+
+def add_file_sink(path: str, level: str, mode: str = "w", **kwargs) -> int:
+    options = {"mode": mode, "enqueue": True, "rotation": ROTATION, "compression": COMPRESSION}
+    options.update(kwargs)
+    return logger.add(path, level=level, **options)
+
+
+def setup_logging(
+    name: str, console_level: str = "SUCCESS", log_dir: str = LOG_DIR, filter=None, mode: str = "w"
+) -> None:
+    """
+    Replace the sinks with
+        stdout                      from `console_level`
+        {log_dir}/{name}.log        everything from `trace_log_level()` (TRACE unless TRACE_LOG_LEVEL is set)
+        {log_dir}/{name}_less.log   INFO and above
+        {log_dir}/{name}.jsonl      INFO and above, one JSON record per line with the level, time, source location
+                                    and `extra` fields, for later analysis
+    `filter` applies to the detailed log only, `mode` "w" truncates the logs and "a" appends to them.
+    """
+    logger.remove()
+    logger.add(sys.stdout, level=console_level)
+    os.makedirs(log_dir, exist_ok=True)
+    add_file_sink(f"{log_dir}/{name}.log", trace_log_level(), mode, filter=filter)
+    add_file_sink(f"{log_dir}/{name}_less.log", "INFO", mode)
+    add_file_sink(f"{log_dir}/{name}.jsonl", "INFO", mode, serialize=True)
+
+
+def setup_game_logging(
+    name: str, game_ids, console_level: str = "INFO", log_dir: str = LOG_DIR, mode: str = "a"
+) -> None:
+    """
+    `setup_logging` for a server running several games: the detailed records of game `id` (tagged by `in_game_log`)
+    go to {log_dir}/{name}_game{id}.log instead of {log_dir}/{name}.log, the other logs still get every record.
+    The logs are appended to by default, so that a restart of the server keeps the logs of the earlier sessions.
+    """
+    setup_logging(name, console_level, log_dir, filter=lambda record: "game" not in record["extra"], mode=mode)
+    for game_id in game_ids:
+        add_file_sink(
+            f"{log_dir}/{name}_game{game_id}.log",
+            trace_log_level(),
+            mode,
+            filter=lambda record, game_id=game_id: record["extra"].get("game") == game_id,
+        )
+
+
+async def in_game_log(game_id: int, coro):
+    """
+    Await `coro` with its log records, and those of the tasks it creates, tagged with `game=game_id`.
+    """
+    with logger.contextualize(game=game_id):
+        return await coro
@@ -0,0 +1,209 @@
+"""
+In-process counters, gauges and histograms served in the Prometheus text format, e.g.
+
+    METRICS = MetricsRegistry()
+    TICKS = METRICS.counter("game_ticks_total", "Ticks of the game loop.", ["game"])
+    ...
+    ticks = TICKS.labels(id)  # once per game loop
+    ticks.inc()  # every tick
+
+Recording is a few additions on a child cached per label values; the text is only built when `render` is called, and
+metrics with a `callback` read existing state (e.g. `CacheStats`) at that time only.
+
+`collect` returns plain data that can be sent from another process and merged by `render`, samples with the same
+labels are summed.
+"""
+
+import bisect
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# upper bounds in seconds, the +Inf bucket is added when rendering
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    A metric family. `labels(*values)` returns the child recording the samples of these label values, created on
+    first use. With a `callback` returning `{label values: value}` the samples are read when collected instead.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.children: Dict[Labels, object] = {}
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            assert len(key) == len(self.labelnames), f"{self.name} takes labels {self.labelnames}"
+            child = self.children[key] = self._new_child()
+        return child
+
+    def samples(self) -> Dict[Labels, object]:
+        if self.callback is not None:
+            return dict(self.callback())
+        return {key: child.value for key, child in self.children.items()}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Dict[Labels, object]:
+        return {key: (list(child.counts), child.sum, child.count) for key, child in self.children.items()}
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        assert metric.name not in self.metrics, f"metric {metric.name} already registered"
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (), callback=None) -> Counter:
+        return self.register(Counter(name, help, labelnames, callback))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, callback))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self) -> Dict[str, Dict]:
+        """
+        Current samples of every metric, as plain data.
+        """
+        return {
+            name: {
+                "kind": metric.kind,
+                "help": metric.help,
+                "labelnames": metric.labelnames,
+                "buckets": getattr(metric, "buckets", ()),
+                "samples": metric.samples(),
+            }
+            for name, metric in self.metrics.items()
+        }
+
+    def render(self, others: Iterable[Dict[str, Dict]] = ()) -> str:
+        """
+        The samples of this registry and of the `collect` results `others`, in the Prometheus text format.
+        """
+        families = self.collect()
+        for other in others:
+            for name, family in other.items():
+                if name not in families:
+                    families[name] = family
+                    continue
+                samples = families[name]["samples"]
+                for key, value in family["samples"].items():
+                    samples[key] = _add(samples[key], value) if key in samples else value
+        lines: List[str] = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            labelnames = family["labelnames"]
+            for key, value in sorted(family["samples"].items()):
+                if family["kind"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, n in zip(family["buckets"], counts):
+                    cumulative += n
+                    labels = _format_labels(labelnames + ("le",), key + (_format_value(bound),))
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labelnames + ('le',), key + ('+Inf',))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labelnames, key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _add(a, b):
+    if isinstance(a, tuple):
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]
+    return a + b
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _format_labels(labelnames: Labels, values: Labels) -> str:
+    if not labelnames:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labelnames, escaped)) + "}"
@@ -0,0 +1,131 @@
+"""
+Windowed cooperative A*: agents plan one after the other in space-time and reserve the tiles of their path for the
+next `horizon` ticks, so that later plans go around them or wait instead of walking into each other.
+
+`find_path` treats the other agents as walls where they stand. In a narrow aisle this makes both agents step back and
+forth, while here one of them waits for the other to pass.
+"""
+
+import heapq
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from utils.distance_field import DistanceField, get_neighbor_position
+
+DEFAULT_HORIZON = 8
+
+
+class ReservationTable:
+    """
+    Last planned path of every agent sharing the table, `path[t]` being the tile of the agent `t` ticks after planning.
+
+    There is no shared clock: a path is read from the tile its agent is on, which is its first tile if the agent has
+    not moved since planning or its second one if it made the first move. Agents without a current path are expected
+    to stay where they are.
+
+    Owners are ordered by priority, lowest first (e.g. agent indices). An agent plans around the agents of higher
+    priority and around the ones not planning, but not around the planning agents of lower priority, which give way
+    to it. Two agents meeting head-on in an aisle would otherwise both wait for the other forever.
+    """
+
+    def __init__(self, horizon: int = DEFAULT_HORIZON) -> None:
+        self.horizon = horizon
+        self.paths: Dict[Hashable, List[Tuple[int, int]]] = {}
+        # distances to a goal ignoring the agents, the heuristic of the space-time search
+        self._level_array = None
+        self._goal_fields: Dict[Tuple[int, int], DistanceField] = {}
+
+    def reserve(self, owner: Hashable, path: List[Tuple[int, int]]) -> None:
+        self.paths[owner] = [tuple(position) for position in path]
+
+    def release(self, owner: Hashable) -> None:
+        self.paths.pop(owner, None)
+
+    def clear(self) -> None:
+        self.paths.clear()
+
+    def predicted_path(self, owner: Hashable, location: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """
+        Tiles of `owner` for the next `horizon` ticks, starting at `location`.
+        """
+        location = tuple(location)
+        path = self.paths.get(owner, [])
+        if path[:1] != [location]:
+            path = path[1:] if path[1:2] == [location] else [location]
+        return (path + [path[-1]] * self.horizon)[: self.horizon + 1]
+
+    def goal_field(self, level_array, goal: Tuple[int, int]) -> DistanceField:
+        if level_array is not self._level_array:
+            self._level_array = level_array
+            self._goal_fields = {}
+        if goal not in self._goal_fields:
+            self._goal_fields[goal] = DistanceField(level_array, goal)
+        return self._goal_fields[goal]
+
+    def plan(self, level_array, owner: Hashable, start: Tuple[int, int], goal: Tuple[int, int], others) -> List:
+        """
+        Plan and reserve the path of `owner` from `start` to `goal` around the predicted paths of the `others`, a list
+        of (owner, location) of the other agents, except the ones giving way to it.
+
+        Returns:
+            List[Tuple[int, int]]: Tiles of the path, `path[0]` is `start` and repeated tiles are waits. It ends at
+            `goal`, or after `horizon` ticks on the way to it. Empty if `goal` cannot be reached.
+        """
+        start, goal = tuple(start), tuple(goal)
+        field = self.goal_field(level_array, goal)
+        if field.distance(start) is None:
+            self.release(owner)
+            return []
+
+        occupied: Set[Tuple[Tuple[int, int], int]] = set()
+        moves: Set[Tuple[Tuple[int, int], Tuple[int, int], int]] = set()
+        for other, location in others:
+            if other in self.paths and other > owner:
+                continue
+            other_path = self.predicted_path(other, location)
+            for t, position in enumerate(other_path):
+                occupied.add((position, t))
+                if t > 0:
+                    moves.add((other_path[t - 1], position, t - 1))
+
+        path = space_time_search(field, start, goal, occupied, moves, self.horizon)
+        self.reserve(owner, path)
+        return path
+
+
+def space_time_search(field: DistanceField, start, goal, occupied, moves, horizon: int) -> List[Tuple[int, int]]:
+    """
+    A* over (tile, tick) with waits, up to `horizon` ticks, with the distances of `field` (to `goal`, ignoring the
+    agents) as heuristic.
+
+    A move to a tile is allowed if the tile is free at both ticks, so an agent never follows right behind another one
+    nor swaps places with it. Past the horizon the plan is finished with the distance of `field`.
+    """
+    h_start = field.distance(start)
+    queue = [(h_start, h_start, 0, start)]
+    parents: Dict[Tuple[Tuple[int, int], int], Optional[Tuple[Tuple[int, int], int]]] = {(start, 0): None}
+    best = None
+    while queue:
+        f, h, t, position = heapq.heappop(queue)
+        if position == goal or t == horizon:
+            best = (position, t)
+            break
+        for next_position in [position] + get_neighbor_position(position):
+            h_next = field.distance(next_position)
+            if h_next is None or (next_position, t + 1) in parents:
+                continue
+            if (next_position, t + 1) in occupied:
+                continue
+            if next_position != position and ((next_position, t) in occupied or (next_position, position, t) in moves):
+                continue
+            parents[(next_position, t + 1)] = (position, t)
+            heapq.heappush(queue, (t + 1 + h_next, h_next, t + 1, next_position))
+
+    if best is None:
+        # boxed in for the whole horizon
+        return [start]
+    path = []
+    node = best
+    while node is not None:
+        path.append(node[0])
+        node = parents[node]
+    return path[::-1]
@@ -0,0 +1,95 @@
+import ast
+from typing import Dict, List, Optional
+
+# keys of the "objects" counts of CookingWorld.get_json_state_simple, in order
+OBJECT_KEYS = (
+    ("Beef", "Fresh"),
+    ("Beef", "In-progress"),
+    ("Beef", "Well-cooked"),
+    ("Beef", "Overcooked"),
+    ("Lettuce", "Unchopped"),
+    ("Lettuce", "Chopped"),
+    ("Bread", ""),
+    ("BeefLettuce", ""),
+    ("BeefBurger", ""),
+    ("LettuceBurger", ""),
+    ("BeefLettuceBurger", ""),
+    ("Plate", "Empty"),
+    ("FireExtinguisher", ""),
+    ("Fire", ""),
+)
+# same as max_order of the environment configs
+N_ORDER_SLOTS = 4
+
+OBJECT_FIELDS = tuple(f"n_{name}_{status}" if status else f"n_{name}" for name, status in OBJECT_KEYS)
+
+STATE_FIELDS = (
+    list(OBJECT_FIELDS)
+    + ["n_empty_counters", "holding", "other_player_holding", "n_delivered", "total_score", "n_orders"]
+    + [f"order_{i}_{column}" for i in range(N_ORDER_SLOTS) for column in ("name", "remain_time")]
+)
+
+
+def count_deliveries(deliver_log: List) -> int:
+    """
+    Number of orders delivered in a "deliver_log", which also lists the missed orders.
+    """
+    return sum(entry[0] != "Missed" for entry in deliver_log)
+
+
+def _format_holding(holding: Optional[Dict]) -> Optional[str]:
+    if holding is None:
+        return None
+    return f"{holding['name']} {holding['status']}".strip()
+
+
+def encode_state(json_state_simple: Dict, holding: Optional[Dict] = None) -> List:
+    """
+    Flatten a state of `OvercookedMaker.get_json_state_simple` into a row of `STATE_FIELDS`, with `holding` the
+    `CookingWorld.get_holding_desc` of the agent of the state.
+
+    Holdings are "name" or "name status", the other player is the single one, orders beyond `N_ORDER_SLOTS` are only
+    counted in "n_orders" and unused order slots are None. `get_json_state_simple` empties the deliver log of the world,
+    so "n_delivered" counts the orders delivered since the previous state taken.
+    """
+    objects = json_state_simple["objects"]
+    record = [objects.get(key, 0) for key in OBJECT_KEYS]
+
+    other_holding = next(iter(json_state_simple["inventory_other_player"].values()), None)
+    orders = json_state_simple.get("orders", [])
+    record += [
+        json_state_simple["counters"]["Empty"],
+        _format_holding(holding),
+        _format_holding(other_holding),
+        count_deliveries(json_state_simple["deliver_log"]),
+        json_state_simple["total_score"],
+        len(orders),
+    ]
+
+    for i in range(N_ORDER_SLOTS):
+        if i < len(orders):
+            record += [orders[i]["name"], orders[i]["remain_time"]]
+        else:
+            record += [None, None]
+    return record
+
+
+def encode_state_str(state: str) -> List:
+    """
+    `encode_state` for the `str(dict)` states of trajectories saved before the records, which do not have the holding
+    of the agent.
+    """
+    return encode_state(ast.literal_eval(state))
+
+
+def to_state_records(traj_infos: Dict) -> Dict:
+    """
+    Copy of a trajectory saved before the records with the "state" of every step replaced by its "state_record".
+    """
+    traj_infos = dict(traj_infos)
+    traj_infos["state_fields"] = [STATE_FIELDS]
+    traj_infos["traj"] = [
+        {**{k: v for k, v in element.items() if k != "state"}, "state_record": encode_state_str(element["state"])}
+        for element in traj_infos["traj"]
+    ]
+    return traj_infos
@@ -0,0 +1,163 @@
+"""
+Per-stage timing of the game loops, e.g.
+
+    profiler = TickProfiler.from_env()
+    while ...:
+        with profiler.stage("env_step"):
+            outcome, info = env.step(decision)
+        ...
+        if profiler.tick():
+            traj_writer.append("tick_profile", profiler.dump())
+
+Profiling is opt-in: it is on when `TICK_PROFILE` is set (to anything but "0"), and `stage` is a shared no-op
+context manager otherwise.
+"""
+
+import bisect
+import os
+import time
+from contextlib import nullcontext
+from typing import Dict, Optional
+
+# upper bounds of the histogram buckets in milliseconds, the last bucket counts the longer stages
+BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+DUMP_INTERVAL = 240  # ticks, one minute of game at 0.25s a tick
+
+_NO_TIMER = nullcontext()
+
+
+class StageTimes:
+    """
+    Count, total, longest time and histogram of the runs of a stage.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, seconds * 1e3)] += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket of the `q` quantile in milliseconds, capped by the longest run.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max * 1e3)
+        return self.max * 1e3
+
+    def as_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1e3, 3),
+            "mean_ms": round(self.total / self.count * 1e3, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "max_ms": round(self.max * 1e3, 3),
+            "buckets": self.buckets,
+        }
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "TickProfiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class TickProfiler:
+    """
+    Per-stage `StageTimes` of a game, over the whole game and over the window since the last `dump`. `tick` counts the
+    ticks of the game loop and tells when a periodic dump is due, every `dump_interval` ticks (never with 0).
+
+    A stage that awaits also counts the time of the other tasks that run meanwhile, e.g. the websocket "send" of the
+    web app.
+    """
+
+    def __init__(self, enabled: bool = True, dump_interval: int = DUMP_INTERVAL) -> None:
+        self.enabled = enabled
+        self.dump_interval = dump_interval
+        self.n_ticks = 0
+        self.stages: Dict[str, StageTimes] = {}
+        self.window: Dict[str, StageTimes] = {}
+        self.window_start = 0
+
+    @classmethod
+    def from_env(cls, dump_interval: Optional[int] = None) -> "TickProfiler":
+        """
+        Profiler enabled by `TICK_PROFILE`, dumping every `TICK_PROFILE_INTERVAL` ticks if set.
+        """
+        enabled = os.environ.get("TICK_PROFILE", "0") not in ("", "0")
+        if dump_interval is None:
+            dump_interval = int(os.environ.get("TICK_PROFILE_INTERVAL", DUMP_INTERVAL))
+        return cls(enabled, dump_interval)
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NO_TIMER
+        return _StageTimer(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        if name not in self.stages:
+            self.stages[name] = StageTimes()
+        self.stages[name].add(seconds)
+        if name not in self.window:
+            self.window[name] = StageTimes()
+        self.window[name].add(seconds)
+
+    def tick(self) -> bool:
+        """
+        Count a tick, and return whether a periodic `dump` is due.
+        """
+        if not self.enabled:
+            return False
+        self.n_ticks += 1
+        return self.dump_interval > 0 and self.n_ticks - self.window_start >= self.dump_interval
+
+    def dump(self) -> Dict:
+        """
+        Stage times of the window since the last dump, and start a new window.
+        """
+        record = {
+            "ticks": [self.window_start, self.n_ticks],
+            "stages": {name: times.as_dict() for name, times in self.window.items()},
+        }
+        self.window = {}
+        self.window_start = self.n_ticks
+        return record
+
+    def summary(self) -> Dict:
+        """
+        Stage times of the whole game.
+        """
+        return {
+            "ticks": [0, self.n_ticks],
+            "stages": {name: times.as_dict() for name, times in self.stages.items()},
+        }
+
+    def __repr__(self) -> str:
+        if not self.enabled:
+            return "disabled"
+        per_tick = {name: times.total / max(self.n_ticks, 1) * 1e3 for name, times in self.stages.items()}
+        return f"ticks={self.n_ticks} " + " ".join(
+            f"{name}={per_tick[name]:.2f}ms/tick(max={times.max * 1e3:.1f}ms)"
+            for name, times in sorted(self.stages.items(), key=lambda item: -per_tick[item[0]])
+        )
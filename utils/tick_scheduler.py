@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TickScheduler:
+    """
+    Fixed-rate scheduler for a game loop: tick `n` is due at `start + n * interval`, so the time spent on the work
+    of a tick is absorbed by the following sleep instead of being added to the period as with
+    `await asyncio.sleep(interval)`.
+
+    A tick that starts more than `max_lateness` after its deadline is `behind`. With `skip_render_when_behind` the
+    caller skips rendering on such ticks (`skip_render`), at the cost of stale frames while the loop is loaded.
+    When the loop falls more than `max_catch_up` ticks behind (e.g. it was paused while the player was disconnected),
+    the schedule restarts from now instead of running the missed ticks back to back, and that tick counts as on time
+    in the lateness statistics.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        max_lateness: Optional[float] = None,
+        max_catch_up: int = 4,
+        skip_render_when_behind: bool = False,
+    ) -> None:
+        self.interval = interval
+        self.max_lateness = interval if max_lateness is None else max_lateness
+        self.max_catch_up = max_catch_up
+        self.skip_render_when_behind = skip_render_when_behind
+        self.start_time = time.perf_counter()
+        self.n_ticks = 0
+        self.n_resyncs = 0
+        self.lateness = 0.0
+        self.total_lateness = 0.0
+        self.max_seen_lateness = 0.0
+
+    @property
+    def deadline(self) -> float:
+        return self.start_time + self.n_ticks * self.interval
+
+    @property
+    def behind(self) -> bool:
+        return self.lateness > self.max_lateness
+
+    @property
+    def skip_render(self) -> bool:
+        return self.skip_render_when_behind and self.behind
+
+    async def wait(self) -> float:
+        """
+        Sleep until the deadline of the next tick and return how late it starts, in seconds.
+        """
+        self.n_ticks += 1
+        delay = self.deadline - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        now = time.perf_counter()
+        self.lateness = max(0.0, now - self.deadline)
+        if self.lateness > self.max_catch_up * self.interval:
+            self.start_time = now - self.n_ticks * self.interval
+            self.n_resyncs += 1
+            self.lateness = 0.0
+        self.total_lateness += self.lateness
+        self.max_seen_lateness = max(self.max_seen_lateness, self.lateness)
+        return self.lateness
+
+    def __repr__(self) -> str:
+        mean = self.total_lateness / self.n_ticks * 1e3 if self.n_ticks else 0.0
+        return (
+            f"ticks={self.n_ticks} interval={self.interval * 1e3:.0f}ms mean_late={mean:.1f}ms "
+            f"max_late={self.max_seen_lateness * 1e3:.1f}ms resyncs={self.n_resyncs}"
+        )
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+# lists of the JSON trajectory layout saved by the game server
+TRAJ_KEYS = ("traj", "urgent_response", "reflection", "text_action")
+
+
+class TrajectoryWriter:
+    """
+    Append-only trajectory file, one compact JSON line `[key, record]` per record, where `key` is one of the lists of
+    the JSON trajectory layout. Records are serialized when they are appended, so the caller must not change them
+    afterwards, and written by a background task that flushes and fsyncs the file every `flush_interval` seconds,
+    so that a crash loses at most the last interval of a game.
+
+    Without a `path` the records are dropped, e.g. for games that are not saved.
+    """
+
+    def __init__(self, path: Optional[str], flush_interval: float = 1.0) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.n_records = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._file = open(path, "w", encoding="utf-8") if path else None
+        self._task = asyncio.create_task(self._run()) if path else None
+        self._closed = False
+
+    def append(self, key: str, record: Any) -> None:
+        if self._file is None or self._closed:
+            return
+        self._queue.put_nowait(json.dumps([key, record], ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.n_records += 1
+
+    @property
+    def pending(self) -> int:
+        """
+        Records appended but not written yet.
+        """
+        return self._queue.qsize()
+
+    async def close(self) -> None:
+        """
+        Write the queued records and close the file.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _run(self) -> None:
+        last_sync = time.perf_counter()
+        try:
+            while True:
+                line = await self._queue.get()
+                if line is None:
+                    break
+                self._file.write(line)
+                if time.perf_counter() - last_sync >= self.flush_interval:
+                    await asyncio.to_thread(self._sync)
+                    last_sync = time.perf_counter()
+            await asyncio.to_thread(self._sync)
+        finally:
+            self._file.close()
+
+
+def load_trajectory(path: str) -> Dict[str, List]:
+    """
+    Read a trajectory saved as JSON or written by `TrajectoryWriter` into the JSON layout. A line torn by a crash at
+    the end of the file is skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        if not path.endswith(".jsonl"):
+            return json.load(f)
+        lines = f.read().splitlines()
+    traj_infos = {key: [] for key in TRAJ_KEYS}
+    for i, line in enumerate(lines):
+        try:
+            key, record = json.loads(line)
+        except json.JSONDecodeError:
+            if i == len(lines) - 1:
+                break
+            raise
+        traj_infos.setdefault(key, []).append(record)
+    return traj_infos
@@ -4,7 +4,6 @@ import io
 import json
 import os
 import random
-import sys
 import time
 from copy import deepcopy
 from pprint import pformat
@@ -30,6 +29,15 @@ from coop_marl.envs.overcooked.overcooked_maker import OvercookedMaker
 from coop_marl.utils import Arrdict, create_parser, parse_args, utils
 from llms.get_llm_output import get_openai_llm_output
 from utils.history import History
+from utils.lazy_log import lazy
+from utils.log_setup import in_game_log, setup_game_logging
+from utils.metrics import CONTENT_TYPE, MetricsRegistry
+from utils.reservation_planner import ReservationTable
+from utils.state_record import STATE_FIELDS, encode_state
+from utils.tick_profiler import TickProfiler
+from utils.tick_scheduler import TickScheduler
+from utils.trajectory_log import TrajectoryWriter
+from webapp.game_shards import ShardPool, attach_reader, shard_game_ids
 
 GAME_ID = 0
 MAX_GAME = 15
@@ -41,11 +49,15 @@ STEP_INTERVAL = 0.25
 if STEP_INTERVAL != 0.25:
     logger.warning(f"STEP_INTERVAL is set to {STEP_INTERVAL}, which is only for debug!!!")
 
+# reuse the last frame on the ticks that start late, set by --skip_render_when_behind
+SKIP_RENDER_WHEN_BEHIND = False
+
 MAX_INFO_LENGTH = 10
 
 PROGRESS_EVENT = asyncio.Event()
 PROGRESS_LOCK = asyncio.Lock()
 HUMAN_INPUT_LOCK = asyncio.Lock()
+METRICS_LOCK = asyncio.Lock()
 
 EXPERIMENT_TYPE = 0
 TYPE_TO_NAME = {0: "HA", 1: "H", 2: "A", 3: "N"}
@@ -109,6 +121,61 @@ progress_savepath = "./data/progress.json"
 app = Quart(__name__)
 
 
+def cache_samples(kind):
+    """
+    `kind` ("hits" or "misses") of the memoized computations of the agents of the games simulated in this process.
+    """
+    samples = {}
+    for idx, env in enumerate(envs):
+        if env is None:
+            continue
+        for cache, stats in [
+            ("valid_actions", text_agents[idx].valid_actions_stats),
+            ("distance_field", text_agents[idx].distance_field_stats),
+            ("valid_mid_actions", mid_agents[idx].mid_planner.valid_mid_actions_stats),
+        ]:
+            samples[(cache,)] = samples.get((cache,), 0) + getattr(stats, kind)
+    return samples
+
+
+def trajectory_queue_samples():
+    return {(str(idx),): writer.pending for idx, writer in enumerate(traj_writers) if writer is not None}
+
+
+# served by /metrics, the shards send theirs when it is scraped
+METRICS = MetricsRegistry()
+GAME_ACTIVE = METRICS.gauge("game_active", "1 while the game loop of the game runs.", ["game"])
+GAME_TICKS = METRICS.counter("game_ticks_total", "Ticks of the game loop.", ["game"])
+GAME_TICK_LATENESS = METRICS.histogram(
+    "game_tick_lateness_seconds",
+    "How late the ticks of the game loop start.",
+    ["game"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+LLM_LATENCY = METRICS.histogram(
+    "llm_request_seconds",
+    "Latency of the LLM requests.",
+    ["call", "model"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0),
+)
+LLM_ERRORS = METRICS.counter("llm_request_errors_total", "LLM requests that failed.", ["call", "model"])
+FRAME_ENCODE = METRICS.histogram(
+    "frame_encode_seconds",
+    "PNG encoding time of the rendered frames.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+WS_MESSAGES = METRICS.counter("websocket_sent_messages_total", "States sent to the players.", ["game"])
+WS_BYTES = METRICS.counter("websocket_sent_bytes_total", "Bytes of the states sent to the players.", ["game"])
+METRICS.counter(
+    "cache_hits_total", "Hits of the memoized agent computations.", ["cache"], lambda: cache_samples("hits")
+)
+METRICS.counter(
+    "cache_misses_total", "Misses of the memoized agent computations.", ["cache"], lambda: cache_samples("misses")
+)
+METRICS.gauge("trajectory_queue_depth", "Trajectory records waiting to be written.", ["game"], trajectory_queue_samples)
+shard_metrics_requests = {}
+
+
 def update_info_list(info_list, character, new_info, timestep):
     length = len(info_list)
     if length > MAX_INFO_LENGTH:
@@ -129,22 +196,34 @@ def update_agent_info(info_list, new_info, timestep):
 
 
 def process_frame(frame):
+    s_time = time.perf_counter()
     image = Image.fromarray(frame)
     buffered = io.BytesIO()
     image.save(buffered, format="PNG", compress_level=9, optimize=True)
     base64_encoded = base64.b64encode(buffered.getvalue()).decode("utf8")
+    FRAME_ENCODE.observe(time.perf_counter() - s_time)
 
     # logger.info(f"png process_frame time: {e_time - s_time}, size: {len(base64_encoded)/1024:.2f}KB")
     return base64_encoded
 
 
+def save_tick_profile(id):
+    profiler = tick_profilers[id]
+    if profiler.enabled:
+        traj_writers[id].append("tick_profile", profiler.dump())
+        traj_writers[id].append("tick_profile_total", profiler.summary())
+        logger.info(f"{id} tick profile: {profiler}")
+
+
 async def run_inner_loop(id, outcome, current_traj_element, info_list):
     global half_max_steps, quarter_and_half_max_steps
 
     env = envs[id]
     controller = controllers[id]
+    profiler = tick_profilers[id]
+    ticks = GAME_TICKS.labels(id)
+    tick_lateness = GAME_TICK_LATENESS.labels(id)
     dummy_decision = controller.get_prev_decision_view()
-    world = env._env.unwrapped.world
     episode_end = False
     if game_phases[id] >= 0:
         _max_steps = half_max_steps
@@ -153,6 +232,8 @@ async def run_inner_loop(id, outcome, current_traj_element, info_list):
         _max_steps = quarter_and_half_max_steps
         logger.info(f"run_inner_loop: phase {game_phases[id]} < 0, _max_steps = {_max_steps} (quarter_and_half_max_steps = {quarter_and_half_max_steps})")
 
+    ticker = TickScheduler(STEP_INTERVAL, skip_render_when_behind=SKIP_RENDER_WHEN_BEHIND)
+    data = None
     while True:
         # for each step
         while True:
@@ -173,11 +254,13 @@ async def run_inner_loop(id, outcome, current_traj_element, info_list):
                 if i == llm_idxs[id]:
                     if not mid_actions[id]:
                         current_traj_element["mid_action"] = None
-                        json_state_simple = envs[id].get_json_state_simple(llm_idxs[id])
+                        with profiler.stage("json_state"):
+                            json_state_simple = envs[id].get_json_state_simple(llm_idxs[id])
                         if PHASE_2_AGENT[game_phases[id]] == "reflexion":
                             to_reflections[id] = rule_agents[id].to_reflection(json_state_simple)
                         try:
-                            action_result = rule_agents[id].get_action(json_state_simple)
+                            with profiler.stage("agent"):
+                                action_result = rule_agents[id].get_action(json_state_simple)
                             logger.debug(f"Agent {type(rule_agents[id]).__name__} returned: {action_result} (type: {type(action_result)})")
                             mid_actions[id] = action_result
                         except Exception as e:
@@ -190,15 +273,15 @@ async def run_inner_loop(id, outcome, current_traj_element, info_list):
                                 json_state_simple,
                                 message_dict,
                             )
-                            logger.debug(
-                                "History:\n"
-                                + pformat([info._asdict() for info in history_buffers[id].get_history(1)])
-                                + "\n" * 2
+                            lazy.debug(
+                                "History:\n{}\n\n",
+                                lambda: pformat([info._asdict() for info in history_buffers[id].get_history(1)]),
                             )
                     elif mid_actions[id]:
                         current_traj_element["mid_action"] = mid_actions[id]
                         try:
-                            end, action, sta = mid_agents[id].get_action(mid_actions[id][0], **mid_actions[id][1])
+                            with profiler.stage("mid_agent"):
+                                end, action, sta = mid_agents[id].get_action(mid_actions[id][0], **mid_actions[id][1])
                         except Exception as e:
                             logger.error(e)
                             end = True
@@ -231,12 +314,15 @@ async def run_inner_loop(id, outcome, current_traj_element, info_list):
         transition = Arrdict(inp=inp, decision=decision)
 
         # env step
-        traj_infos[id]["traj"].append(current_traj_element)
+        current_traj_element["wall_time"] = time.time()
         # Save state_before before env.step for order completion check
-        state_before = envs[id].get_json_state_simple(llm_idxs[id])
-        outcome, info = env.step(decision)
+        with profiler.stage("json_state"):
+            state_before = envs[id].get_json_state_simple(llm_idxs[id])
+        with profiler.stage("env_step"):
+            outcome, info = env.step(decision)
         # Save state_after after env.step for order completion check
-        state_after = env.get_json_state_simple(llm_idxs[id])
+        with profiler.stage("json_state"):
+            state_after = env.get_json_state_simple(llm_idxs[id])
         # Check for order completion by deliver_log or total_score
         deliver_log_before = state_before.get('deliver_log', [])
         deliver_log_after = state_after.get('deliver_log', [])
@@ -250,50 +336,49 @@ async def run_inner_loop(id, outcome, current_traj_element, info_list):
                 current_traj_element["message"].append((llm_idxs[id], "good job"))
         last_total_score[id] = total_score_after
         logger.debug(f"""Timestep and score: {info["player_0"]["t"]}, {info["player_0"]["score"]}""")
-        # total_score = sum(traj_infos[id]["score"])
-        total_score = sum(ele["score"] for ele in traj_infos[id]["traj"])
+        traj_writers[id].append("traj", current_traj_element)
+        total_scores[id] += current_traj_element["score"]
+        total_score = total_scores[id]
+        # from state_after, the state taken next would miss the deliveries of this step
+        state_record = encode_state(state_after, env._env.unwrapped.world.get_holding_desc(llm_idxs[id]))
         current_traj_element = {
             "t": info["player_0"]["t"],
             "score": info["player_0"]["score"],
-            "state": str(env.get_json_state_simple(llm_idxs[id])),
+            "state_record": state_record,
             "message": [],
         }
-        logger.debug(current_traj_element["state"])
+        logger.debug(current_traj_element["state_record"])
 
         transition["outcome"] = outcome
 
         if game_phases[id] >= 0:
-            try:
-                text_actions = world.get_events()
-            except Exception as e:
-                logger.error(e)
-                text_actions = {}
-            for a_i, t_acts in text_actions.items():
-                if len(t_acts) > len(agent_text_actions[id][a_i]):
-                    logger.trace(f"Agent {a_i} perform text_action {t_acts[len(agent_text_actions[id][a_i]):]}")
-                    agent_text_actions[id][a_i] = t_acts
-                    traj_infos[id]["text_action"].append({"t": current_steps[id], "agent": a_i, "action": t_acts[-1]})
+            text_actions = {}
+            with profiler.stage("events"):
+                for a_i, event in event_cursors[id].poll():
+                    text_actions.setdefault(a_i, []).append(event)
+            for a_i, t_acts in sorted(text_actions.items()):
+                logger.trace(f"Agent {a_i} perform text_action {t_acts}")
+                traj_writers[id].append("text_action", {"t": current_steps[id], "agent": a_i, "action": t_acts[-1]})
         if game_phases[id] > 0:
-            try:
-                current_mid_actions = world.get_mid_actions()
-            except Exception as e:
-                logger.error(e)
-                current_mid_actions = {}
-
-            for a_i, m_acts in current_mid_actions.items():
-                if len(m_acts) > len(agent_mid_actions[id][a_i]):
-                    # logger.debug(f"Agent {a_i} perform mid_action {m_acts[len(agent_mid_actions[id][a_i]):]}")
-                    agent_mid_actions[id][a_i].append(m_acts[len(agent_mid_actions[id][a_i])])
-                    history_buffers[id].add_action(agent_mid_actions[id][a_i][-1], a_i)
-
-        frame = env.render(mode=render_mode)
-        data = process_frame(frame)
+            with profiler.stage("mid_actions"):
+                for a_i, mid_action in mid_action_cursors[id].poll():
+                    # logger.debug(f"Agent {a_i} perform mid_action {mid_action}")
+                    history_buffers[id].add_action(mid_action, a_i)
+
+        # when the tick is late (and skipping is on), keep sending the last frame to catch up with the schedule
+        if data is None or not ticker.skip_render:
+            with profiler.stage("render"):
+                frame = env.render(mode=render_mode)
+            with profiler.stage("process_frame"):
+                data = process_frame(frame)
 
         # After agent acts, set agent message in AI-led mode
         if game_phases[id] > 0:
             if rule_agents[id].mode == "ai_led" and rule_agents[id].send_message:
-                json_state_simple = envs[id].get_json_state_simple(llm_idxs[id])
-                assignment = rule_agents[id].get_message(json_state_simple)
+                with profiler.stage("json_state"):
+                    json_state_simple = envs[id].get_json_state_simple(llm_idxs[id])
+                with profiler.stage("agent_message"):
+                    assignment = rule_agents[id].get_message(json_state_simple)
                 # Only send assignment if it's different from the last one sent
                 if assignment and assignment != last_sent_assignment[id]:
                     logger.info(f"Send assignment: {assignment}")
@@ -340,6 +425,8 @@ async def run_inner_loop(id, outcome, current_traj_element, info_list):
             "score": total_score,
             "info_list": info_list,
             "agent_mode": rule_agents[id].mode if rule_agents[id] is not None else "unknown",
+            # when the tick published the state, for the latency measured by benchmarks/webapp_load.py
+            "wall_time": time.time(),
         }
 
         updated[id] = True
@@ -355,32 +442,215 @@ async def run_inner_loop(id, outcome, current_traj_element, info_list):
             if current_steps[id] > 0 and current_steps[id] % reflection_interval_n_timestep == 0:
                 to_reflections[id] = True
 
+        ticks.inc()
+        if profiler.tick():
+            traj_writers[id].append("tick_profile", profiler.dump())
+            logger.info(f"{id} tick profile: {profiler}")
+
         if _max_steps - info["player_0"]["t"] == 0:
-            if game_phases[id] >= 0:
-                filename = f"{traj_names[id]}".replace(":", "_")
-                traj_path = f"{traj_savepath}/{filename}.json".replace("\\", "/")
-                with open(traj_path, "w") as f:
-                    logger.info(f"save traj to {traj_path}")
-                    json.dump(traj_infos[id], f, ensure_ascii=False)
+            save_tick_profile(id)
+            await traj_writers[id].close()
+            if traj_writers[id].path:
+                logger.info(f"saved traj to {traj_writers[id].path}")
             await asyncio.sleep(1)
             status[id] = False
             episode_end = True
             logger.info(f"Game finished at step {_max_steps} for {id_name_phone_list[id]} in phase {game_phases[id]}")
             break
-        await asyncio.sleep(STEP_INTERVAL)
+        tick_lateness.observe(await ticker.wait())
 
-    return episode_end
+    # an unfinished game keeps the records written so far
+    if not episode_end:
+        save_tick_profile(id)
+    await traj_writers[id].close()
+    logger.info(f"{id} ticks: {ticker}")
 
+    return episode_end
 
-async def startgame(id):
 
+async def play_episode(id):
     global urgent_response_history_n_event, reflection_history_n_event
     global half_max_steps, quarter_and_half_max_steps
+
+    env = envs[id]
+    controllers[id].get_prev_decision_view()
+
+    # records of "traj": time, state_record, action, score, message, mid_action
+    # "urgent_response" and "reflection": time, input, output, latency
+    # "text_action": time, agent, action
+    traj_path = None
+    if game_phases[id] >= 0:
+        filename = f"{traj_names[id]}".replace(":", "_")
+        traj_path = f"{traj_savepath}/{filename}.jsonl".replace("\\", "/")
+    traj_writers[id] = TrajectoryWriter(traj_path)
+    # columns of the "state_record" of the steps
+    traj_writers[id].append("state_fields", STATE_FIELDS)
+    # "tick_profile": per-stage times of the game loop when TICK_PROFILE is set, see utils.tick_profiler
+    tick_profilers[id] = TickProfiler.from_env()
+    total_scores[id] = 0
+
+    if game_phases[id] >= 0:
+        _max_steps = half_max_steps
+        logger.info(f"startgame: phase {game_phases[id]} >= 0, _max_steps = {_max_steps} (half_max_steps = {half_max_steps})")
+    else:
+        _max_steps = quarter_and_half_max_steps
+        logger.info(f"startgame: phase {game_phases[id]} < 0, _max_steps = {_max_steps} (quarter_and_half_max_steps = {quarter_and_half_max_steps})")
+
+    outcome = env.reset(_max_steps)
+
+    env._env.unwrapped.world.agents[1 - llm_idxs[id]].color = "black"
+    if game_phases[id] <= 0:
+        env._env.unwrapped.world.agents[llm_idxs[id]].color = "blue"
+    elif PHASE_2_AGENT[game_phases[id]] == "react":
+        env._env.unwrapped.world.agents[llm_idxs[id]].color = "red"
+    elif PHASE_2_AGENT[game_phases[id]] == "reflexion":
+        env._env.unwrapped.world.agents[llm_idxs[id]].color = "orange"
+    elif PHASE_2_AGENT[game_phases[id]] == "wtom":
+        env._env.unwrapped.world.agents[llm_idxs[id]].color = "pink"
+    elif PHASE_2_AGENT[game_phases[id]] == "wotom":
+        env._env.unwrapped.world.agents[llm_idxs[id]].color = "magenta"
+    frame = env.render(mode=render_mode)
+    data = process_frame(frame)
+
+    # RESET
+    info_list = []
+    state[id] = {"frame": data, "time": _max_steps, "score": 0, "info_list": info_list}
+    updated[id] = True
+    current_traj_element = {
+        "t": 0,
+        "score": 0,
+        "state_record": encode_state(
+            env.get_json_state_simple(llm_idxs[id]), env._env.unwrapped.world.get_holding_desc(llm_idxs[id])
+        ),
+        "message": [],
+        "assigned_tasks": [],
+    }
+
+    mid_actions[id] = None
+
+    if game_phases[id] > 0:
+        if PHASE_2_AGENT[game_phases[id]] == "wotom":
+            if FSM:
+                rule_agents[id] = CommInferAgent(
+                    text_agents[id],
+                    envs[id]._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    infer_human=False,
+                )
+            else:
+                rule_agents[id] = CommInferAgentNoFSM(
+                    text_agents[id],
+                    env._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    infer_human=False,
+                )
+        elif PHASE_2_AGENT[game_phases[id]] == "wtom":
+            if FSM:
+                rule_agents[id] = CommInferAgent(
+                    text_agents[id],
+                    envs[id]._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    infer_human=True,
+                )
+            else:
+                rule_agents[id] = CommInferAgentNoFSM(
+                    text_agents[id],
+                    env._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    infer_human=True,
+                )
+        elif PHASE_2_AGENT[game_phases[id]] == "adaptive_dpt":
+            # Set initial mode for each phase
+            if game_phases[id] in [9, 10, 12]:
+                initial_mode = "human_led"
+            elif game_phases[id] == 11:
+                initial_mode = "ai_led"
+            else:
+                initial_mode = "human_led"
+            rule_agents[id] = AdaptiveDPTAgent(
+                text_agents[id],
+                envs[id]._env.unwrapped.world,
+                initial_mode=initial_mode,
+                send_message=SEND_MESSAGE,
+                receive_message=RECEIVE_MESSAGE,
+                infer_human=True,
+            )
+        elif PHASE_2_AGENT[game_phases[id]] == "reflexion":
+            if FSM:
+                rule_agents[id] = ReflexionAgent(
+                    text_agents[id],
+                    envs[id]._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    max_n_react_turn=urgent_response_history_n_event,
+                    max_n_reflection_event=reflection_history_n_event,
+                )
+            else:
+                rule_agents[id] = ReflexionAgentNoFSM(
+                    text_agents[id],
+                    env._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    max_n_react_turn=urgent_response_history_n_event,
+                    max_n_reflection_event=reflection_history_n_event,
+                )
+        elif PHASE_2_AGENT[game_phases[id]] == "react":
+            if FSM:
+                rule_agents[id] = ReActAgent(
+                    text_agents[id],
+                    envs[id]._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    max_n_react_turn=urgent_response_history_n_event,
+                )
+            else:
+                rule_agents[id] = ReActAgentNoFSM(
+                    text_agents[id],
+                    env._env.unwrapped.world,
+                    send_message=SEND_MESSAGE,
+                    receive_message=RECEIVE_MESSAGE,
+                    max_n_react_turn=urgent_response_history_n_event,
+                )
+        else:
+            logger.error(f"game_phases[id] {game_phases[id]} error!")
+
+    logger.info(f"game phase {game_phases[id]} with steps {_max_steps} for {id_name_phone_list[id]} in game id {id}")
+
+    if game_phases[id] >= 0:
+        world = env._env.unwrapped.world
+        event_cursors[id] = world.event_log.cursor()
+        mid_action_cursors[id] = world.mid_action_log.cursor()
+
+    if game_phases[id] > 0:
+        text_agents[id].update_agent(world, llm_idxs[id])
+        # MARK: world will change after reset
+        mid_agents[id].update(text_agents[id], world)
+        rule_agents[id].update(text_agents[id], world, envs[id].get_json_state_simple(llm_idxs[id]))
+        history_buffers[id].reset(_max_steps)
+
+    GAME_ACTIVE.labels(id).set(1)
+    try:
+        return await run_inner_loop(id, outcome, current_traj_element, info_list)
+    finally:
+        GAME_ACTIVE.labels(id).set(0)
+
+
+async def play_episode_in_shard(id):
+    shard_episodes[id] = asyncio.get_running_loop().create_future()
+    shard_pool.send("start", id, game_phases[id], traj_names[id], id_name_phone_list[id])
+    episode_end = await shard_episodes[id]
+    if episode_end:
+        status[id] = False
+    return episode_end
+
+
+async def startgame(id):
     try:
         logger.info(f"startgame {id}")
-        env = envs[id]
-        controller = controllers[id]
-        controller.get_prev_decision_view()
 
         while True:
             # for each episode
@@ -396,161 +666,15 @@ async def startgame(id):
             while game_phases[id] is None:
                 await asyncio.sleep(1)
 
-            traj_infos[id] = {
-                "traj": [],  # time, state, action, score, message, mid_action
-                "urgent_response": [],  # time, input, output, latency
-                "reflection": [],  # time, input, output, latency
-                "text_action": [],  # time, agent, action
-            }
-
             await PROGRESS_EVENT.wait()
             PROGRESS_EVENT.clear()
-            if game_phases[id] >= 0:
-                _max_steps = half_max_steps
-                logger.info(f"startgame: phase {game_phases[id]} >= 0, _max_steps = {_max_steps} (half_max_steps = {half_max_steps})")
-            else:
-                _max_steps = quarter_and_half_max_steps
-                logger.info(f"startgame: phase {game_phases[id]} < 0, _max_steps = {_max_steps} (quarter_and_half_max_steps = {quarter_and_half_max_steps})")
-
-            outcome = env.reset(_max_steps)
-
-            env._env.unwrapped.world.agents[1 - llm_idxs[id]].color = "black"
-            if game_phases[id] <= 0:
-                env._env.unwrapped.world.agents[llm_idxs[id]].color = "blue"
-            elif PHASE_2_AGENT[game_phases[id]] == "react":
-                env._env.unwrapped.world.agents[llm_idxs[id]].color = "red"
-            elif PHASE_2_AGENT[game_phases[id]] == "reflexion":
-                env._env.unwrapped.world.agents[llm_idxs[id]].color = "orange"
-            elif PHASE_2_AGENT[game_phases[id]] == "wtom":
-                env._env.unwrapped.world.agents[llm_idxs[id]].color = "pink"
-            elif PHASE_2_AGENT[game_phases[id]] == "wotom":
-                env._env.unwrapped.world.agents[llm_idxs[id]].color = "magenta"
-            frame = env.render(mode=render_mode)
-            data = process_frame(frame)
-
-            # RESET
-            info_list = []
-            state[id] = {"frame": data, "time": _max_steps, "score": 0, "info_list": info_list}
-            updated[id] = True
-            current_traj_element = {
-                "t": 0,
-                "score": 0,
-                "state": str(env.get_json_state_simple(llm_idxs[id])),
-                "message": [],
-                "assigned_tasks": [],
-            }
-
-            mid_actions[id] = None
-
-            if game_phases[id] > 0:
-                if PHASE_2_AGENT[game_phases[id]] == "wotom":
-                    if FSM:
-                        rule_agents[id] = CommInferAgent(
-                            text_agents[id],
-                            envs[id]._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            infer_human=False,
-                        )
-                    else:
-                        rule_agents[id] = CommInferAgentNoFSM(
-                            text_agents[id],
-                            env._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            infer_human=False,
-                        )
-                elif PHASE_2_AGENT[game_phases[id]] == "wtom":
-                    if FSM:
-                        rule_agents[id] = CommInferAgent(
-                            text_agents[id],
-                            envs[id]._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            infer_human=True,
-                        )
-                    else:
-                        rule_agents[id] = CommInferAgentNoFSM(
-                            text_agents[id],
-                            env._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            infer_human=True,
-                        )
-                elif PHASE_2_AGENT[game_phases[id]] == "adaptive_dpt":
-                    # Set initial mode for each phase
-                    if game_phases[id] in [9, 10, 12]:
-                        initial_mode = "human_led"
-                    elif game_phases[id] == 11:
-                        initial_mode = "ai_led"
-                    else:
-                        initial_mode = "human_led"
-                    rule_agents[id] = AdaptiveDPTAgent(
-                        text_agents[id],
-                        envs[id]._env.unwrapped.world,
-                        initial_mode=initial_mode,
-                        send_message=SEND_MESSAGE,
-                        receive_message=RECEIVE_MESSAGE,
-                        infer_human=True,
-                    )
-                elif PHASE_2_AGENT[game_phases[id]] == "reflexion":
-                    if FSM:
-                        rule_agents[id] = ReflexionAgent(
-                            text_agents[id],
-                            envs[id]._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            max_n_react_turn=urgent_response_history_n_event,
-                            max_n_reflection_event=reflection_history_n_event,
-                        )
-                    else:
-                        rule_agents[id] = ReflexionAgentNoFSM(
-                            text_agents[id],
-                            env._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            max_n_react_turn=urgent_response_history_n_event,
-                            max_n_reflection_event=reflection_history_n_event,
-                        )
-                elif PHASE_2_AGENT[game_phases[id]] == "react":
-                    if FSM:
-                        rule_agents[id] = ReActAgent(
-                            text_agents[id],
-                            envs[id]._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            max_n_react_turn=urgent_response_history_n_event,
-                        )
-                    else:
-                        rule_agents[id] = ReActAgentNoFSM(
-                            text_agents[id],
-                            env._env.unwrapped.world,
-                            send_message=SEND_MESSAGE,
-                            receive_message=RECEIVE_MESSAGE,
-                            max_n_react_turn=urgent_response_history_n_event,
-                        )
-                else:
-                    logger.error(f"game_phases[id] {game_phases[id]} error!")
-
-            logger.info(
-                f"game phase {game_phases[id]} with steps {_max_steps} for {id_name_phone_list[id]} in game id {id}"
-            )
-
-            if game_phases[id] >= 0:
-                world = env._env.unwrapped.world
-                agent_text_actions[id] = {a_i: [] for a_i in range(env._env.num_agents)}
-                agent_mid_actions[id] = {a_i: [] for a_i in range(env._env.num_agents)}
-
-            if game_phases[id] > 0:
-                text_agents[id].update_agent(world, llm_idxs[id])
-                # MARK: world will change after reset
-                mid_agents[id].update(text_agents[id], world)
-                rule_agents[id].update(text_agents[id], world, envs[id].get_json_state_simple(llm_idxs[id]))
-                history_buffers[id].reset(_max_steps)
 
             episode_end = False
             try:
-                episode_end = await run_inner_loop(id, outcome, current_traj_element, info_list)
+                if shard_pool is not None:
+                    episode_end = await play_episode_in_shard(id)
+                else:
+                    episode_end = await play_episode(id)
             except KeyboardInterrupt:
                 logger.error("Ctrl+C detected")
                 raise
@@ -603,8 +727,10 @@ async def react(id) -> str:
                 ## interact with an LLM, generate thought and action together
                 llm_output = await get_openai_llm_output(MODEL, llm_input)
                 e_time = time.time()
-                traj_infos[id]["urgent_response"].append(
-                    {"t": current_steps[id], "input": llm_input, "output": llm_output, "latency": e_time - s_time}
+                LLM_LATENCY.labels("react", MODEL).observe(e_time - s_time)
+                traj_writers[id].append(
+                    "urgent_response",
+                    {"t": current_steps[id], "input": llm_input, "output": llm_output, "latency": e_time - s_time},
                 )
                 logger.success(f"ReAct LLM Output, Used {e_time - s_time: .4f}s")
                 logger.trace("ReAct LLM Output")
@@ -621,6 +747,7 @@ async def react(id) -> str:
                 raise
             except Exception as e:
                 logger.error(e)
+                LLM_ERRORS.labels("react", MODEL).inc()
                 to_urgent_responses[id] = False
 
         # if current_steps >= max_steps:
@@ -649,8 +776,10 @@ async def reflection(id) -> str:
                 s_time = time.time()
                 llm_output = await get_openai_llm_output(MODEL, llm_input)
                 e_time = time.time()
-                traj_infos[id]["reflection"].append(
-                    {"t": current_steps[id], "input": llm_input, "output": llm_output, "latency": e_time - s_time}
+                LLM_LATENCY.labels("reflection", MODEL).observe(e_time - s_time)
+                traj_writers[id].append(
+                    "reflection",
+                    {"t": current_steps[id], "input": llm_input, "output": llm_output, "latency": e_time - s_time},
                 )
                 logger.info(f"Game {id} Reflection LLM Output, Used {e_time - s_time: .4f}s")
                 logger.debug(llm_output)
@@ -662,6 +791,7 @@ async def reflection(id) -> str:
                 raise
             except Exception as e:
                 logger.error(e)
+                LLM_ERRORS.labels("reflection", MODEL).inc()
                 to_reflections[id] = False
         # if current_steps[id] >= max_steps:
         #     break
@@ -683,8 +813,10 @@ async def urgent_response(id) -> str:
                 s_time = time.time()
                 llm_output = await get_openai_llm_output(MODEL, llm_input)
                 e_time = time.time()
-                traj_infos[id]["urgent_response"].append(
-                    {"t": current_steps[id], "input": llm_input, "output": llm_output, "latency": e_time - s_time}
+                LLM_LATENCY.labels("urgent_response", MODEL).observe(e_time - s_time)
+                traj_writers[id].append(
+                    "urgent_response",
+                    {"t": current_steps[id], "input": llm_input, "output": llm_output, "latency": e_time - s_time},
                 )
                 logger.info(f"Game {id} Urgent Response LLM Output, Used {e_time - s_time: .4f}s")
                 logger.debug(f"Output:\n{llm_output}")
@@ -692,8 +824,8 @@ async def urgent_response(id) -> str:
                 rule_agents[id].update_assigned_tasks(llm_output)
                 if rule_agents[id].message:
                     history_buffers[id].add_message(rule_agents[id].message, llm_idxs[id])
-                traj_infos[id]["urgent_response"].append(
-                    {"t": current_steps[id], "input": llm_input, "output": llm_output}
+                traj_writers[id].append(
+                    "urgent_response", {"t": current_steps[id], "input": llm_input, "output": llm_output}
                 )
                 to_urgent_responses[id] = False
             except KeyboardInterrupt:
@@ -701,6 +833,7 @@ async def urgent_response(id) -> str:
                 raise
             except Exception as e:
                 logger.error(e)
+                LLM_ERRORS.labels("urgent_response", MODEL).inc()
                 to_urgent_responses[id] = False
         # if current_steps[id] >= max_steps:
         #     break
@@ -711,9 +844,13 @@ async def urgent_response(id) -> str:
 async def startup():
     loop = asyncio.get_event_loop()
     loop.create_task(start_games())
-    loop.create_task(start_reflections())
-    loop.create_task(start_reacts())
-    loop.create_task(start_urgent_responses())
+    if shard_pool is not None:
+        # the LLM loops run next to the simulation in the shard processes
+        shard_pool.attach(handle_shard_message, handle_shard_closed)
+    else:
+        loop.create_task(start_reflections())
+        loop.create_task(start_reacts())
+        loop.create_task(start_urgent_responses())
     loop.create_task(start_check_connections())
 
 
@@ -722,74 +859,143 @@ async def start_check_connections():
 
 
 async def start_games():
-    await asyncio.gather(*[startgame(i) for i in range(MAX_GAME)])
+    await asyncio.gather(*[in_game_log(i, startgame(i)) for i in range(MAX_GAME)])
 
 
 async def start_reflections():
-    await asyncio.gather(*[reflection(i) for i in range(MAX_GAME)])
+    await asyncio.gather(*[in_game_log(i, reflection(i)) for i in range(MAX_GAME)])
 
 
 async def start_reacts():
-    await asyncio.gather(*[react(i) for i in range(MAX_GAME)])
+    await asyncio.gather(*[in_game_log(i, react(i)) for i in range(MAX_GAME)])
 
 
 async def start_urgent_responses():
-    await asyncio.gather(*[urgent_response(i) for i in range(MAX_GAME)])
+    await asyncio.gather(*[in_game_log(i, urgent_response(i)) for i in range(MAX_GAME)])
+
+
+def set_connection(id, value):
+    connection[id] = value
+    if shard_pool is not None:
+        shard_pool.send("connection", id, value)
+
+
+def handle_shard_message(kind, id, *payload):
+    if kind == "state":
+        state[id] = payload[0]
+        updated[id] = True
+    elif kind == "end":
+        episode_end, is_game_healthy[id] = payload
+        shard_episodes[id].set_result(episode_end)
+    elif kind == "metrics":
+        # `id` is the shard index
+        if id in shard_metrics_requests and not shard_metrics_requests[id].done():
+            shard_metrics_requests[id].set_result(payload[0])
+    else:
+        logger.error(f"unknown message {kind} from the shard of game {id}")
+
+
+def handle_shard_closed(shard_idx):
+    logger.error(f"shard {shard_idx} exited, its games are disabled")
+    for id in shard_game_ids(shard_idx, shard_pool.n_shards, MAX_GAME):
+        is_game_healthy[id] = False
+        if shard_episodes[id] is not None and not shard_episodes[id].done():
+            shard_episodes[id].set_result(False)
 
 
 async def sending(id):
     logger.trace("start sending")
+    if shard_pool is not None:
+        tick_profilers[id] = TickProfiler.from_env()
+    sent_messages = WS_MESSAGES.labels(id)
+    sent_bytes = WS_BYTES.labels(id)
     while True:
         if status[id] == False:
             updated[id] = False
             break
         if updated[id]:
-            await websocket.send(json.dumps(state[id]))
+            with tick_profilers[id].stage("encode_state"):
+                message = json.dumps(state[id])
+            with tick_profilers[id].stage("send"):
+                await websocket.send(message)
+            sent_messages.inc()
+            sent_bytes.inc(len(message))
             updated[id] = False
             if status[id] == False:
                 break
         await asyncio.sleep(STEP_INTERVAL / 10)
+    if shard_pool is not None and tick_profilers[id].enabled:
+        # the games run in the shards, only the sending is timed here
+        logger.info(f"{id} send profile: {tick_profilers[id]}")
     logger.trace("end sending")
 
 
+def apply_input(id, recv):
+    # Check if this is a mode switch message
+    if recv.startswith("MODE_SWITCH:"):
+        mode = recv.split(":")[1].strip()
+        if mode in ["ai_led", "human_led"] and rule_agents[id] is not None:
+            success = rule_agents[id].switch_mode(mode)
+            if success:
+                logger.info(f"Game {id}: Mode switched to {mode}")
+                # Update experiment type based on mode
+                if mode == "ai_led":
+                    # AI-led mode: agent sends messages, human receives
+                    rule_agents[id].send_message = True
+                    rule_agents[id].receive_message = False
+                else:  # human_led
+                    # Human-led mode: human sends messages, agent receives
+                    rule_agents[id].send_message = False
+                    rule_agents[id].receive_message = True
+            else:
+                logger.warning(f"Game {id}: Failed to switch mode to {mode}")
+    else:
+        # Regular action/instruction/feedback message
+        action, instruction, feedback = recv.split(" ")
+        if action != 0:
+            actions[id] = int(action)
+        if instruction != 0:
+            instructions[id] = int(instruction)
+        if feedback != 0:
+            feedbacks[id] = int(feedback)
+
+
 async def receiving(id):
     logger.trace("start receiving")
     global status, actions
     while status[id]:
         recv = await websocket.receive()
         # logger.trace(action)
-        async with HUMAN_INPUT_LOCK:
-            # Check if this is a mode switch message
-            if recv.startswith("MODE_SWITCH:"):
-                mode = recv.split(":")[1].strip()
-                if mode in ["ai_led", "human_led"] and rule_agents[id] is not None:
-                    success = rule_agents[id].switch_mode(mode)
-                    if success:
-                        logger.info(f"Game {id}: Mode switched to {mode}")
-                        # Update experiment type based on mode
-                        if mode == "ai_led":
-                            # AI-led mode: agent sends messages, human receives
-                            rule_agents[id].send_message = True
-                            rule_agents[id].receive_message = False
-                        else:  # human_led
-                            # Human-led mode: human sends messages, agent receives
-                            rule_agents[id].send_message = False
-                            rule_agents[id].receive_message = True
-                    else:
-                        logger.warning(f"Game {id}: Failed to switch mode to {mode}")
-            else:
-                # Regular action/instruction/feedback message
-                action, instruction, feedback = recv.split(" ")
-                if action != 0:
-                    actions[id] = int(action)
-                if instruction != 0:
-                    instructions[id] = int(instruction)
-                if feedback != 0:
-                    feedbacks[id] = int(feedback)
+        if shard_pool is not None:
+            shard_pool.send("input", id, recv)
+        else:
+            async with HUMAN_INPUT_LOCK:
+                apply_input(id, recv)
         connection[id] = True
     logger.trace("end receiving")
 
 
+async def collect_shard_metrics(timeout=1.0):
+    """
+    `METRICS.collect()` of the shards that answer within `timeout` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    async with METRICS_LOCK:
+        for shard_idx in range(shard_pool.n_shards):
+            shard_metrics_requests[shard_idx] = loop.create_future()
+        shard_pool.broadcast("metrics")
+        done, _ = await asyncio.wait(shard_metrics_requests.values(), timeout=timeout)
+    if len(done) < shard_pool.n_shards:
+        logger.warning(f"{shard_pool.n_shards - len(done)} shards did not send their metrics")
+    return [future.result() for future in done]
+
+
+@app.route("/metrics")
+async def metrics():
+    collections = await collect_shard_metrics() if shard_pool is not None else []
+    return METRICS.render(collections), 200, {"Content-Type": CONTENT_TYPE}
+
+
 @app.route("/beforegame", methods=["POST"])
 def beforegame():
     if request.method == "POST":
@@ -979,7 +1185,7 @@ async def handle_connect(id):
 
     id = int(id)
     status[id] = True
-    connection[id] = True
+    set_connection(id, True)
     producer = asyncio.create_task(sending(id))
     consumer = asyncio.create_task(receiving(id))
 
@@ -993,7 +1199,7 @@ async def handle_connect(id):
         logger.error(f"Unexpected error for WebSocket {id}: {e}")
     finally:
         status[id] = False
-        connection[id] = False
+        set_connection(id, False)
         logger.info(f"WebSocket {id} disconnected")
 
 
@@ -1055,7 +1261,7 @@ async def save_traj_info():
                 in_game = questionnaire["in_game"]
             traj_id = data_json["traj_id"]
             save_path = os.path.normpath(traj_savepath)
-            filename = f"{traj_id}.json".replace(":", "_")
+            filename = f"{traj_id}.jsonl".replace(":", "_")
             phase = int(data_json["gamephase"])
             phase_key = f"phase_{phase}"
             if phase_key in in_game.keys():
@@ -1219,7 +1425,7 @@ async def return_html(page):
 
 @app.route("/inigame")
 def inigame():
-    [env.reset() for env in envs]
+    [env.reset() for env in envs if env is not None]
 
 
 async def check_connection(id) -> str:
@@ -1240,17 +1446,120 @@ async def check_connection(id) -> str:
                     json.dump(progress, f, ensure_ascii=False)
             id_name_phone_list[id] = None
             id_assigned[id] = False
+            if shard_pool is not None:
+                shard_pool.send("unassign", id)
             lost_time[id] = 0
         await asyncio.sleep(1)
 
 
+def create_games(game_ids):
+    """
+    Build the environments and agents of the games in `game_ids`, the other slots are left as None.
+    """
+    global envs, controllers, event_cursors, mid_action_cursors, text_agents, mid_agents
+
+    envs = [OvercookedMaker(**env_conf, display=True) if idx in game_ids else None for idx in range(MAX_GAME)]
+    [env.reset() for env in envs if env is not None]
+
+    action_spaces = envs[game_ids[0]].action_spaces
+    controllers = [MultiController(action_spaces) if env is not None else None for env in envs]
+
+    event_cursors = [env._env.unwrapped.world.event_log.cursor() if env is not None else None for env in envs]
+    mid_action_cursors = [env._env.unwrapped.world.mid_action_log.cursor() if env is not None else None for env in envs]
+
+    # the AI agent of every game plans its moves around the human, expected to stay where they are
+    text_agents = [
+        (
+            TextAgent(envs[idx]._env.unwrapped.world, llm_idxs[idx], reservations=ReservationTable())
+            if envs[idx] is not None
+            else None
+        )
+        for idx in range(MAX_GAME)
+    ]
+    mid_agents = [
+        MidAgent(text_agents[idx], envs[idx]._env.unwrapped.world) if envs[idx] is not None else None
+        for idx in range(MAX_GAME)
+    ]
+
+
+def run_shard(shard_idx, conn):
+    """
+    Entry of a shard process, forked from the front end after the configuration is parsed.
+    """
+    game_ids = shard_game_ids(shard_idx, args.shards, MAX_GAME)
+    create_games(game_ids)
+    logger.info(f"shard {shard_idx} serves games {game_ids}")
+    asyncio.run(serve_shard(game_ids, conn))
+
+
+async def serve_shard(game_ids, conn):
+    start_events = {id: asyncio.Event() for id in game_ids}
+    closed = asyncio.get_running_loop().create_future()
+
+    def handle_front_message(kind, id, *payload):
+        if kind == "start":
+            game_phases[id], traj_names[id], id_name_phone_list[id] = payload
+            id_assigned[id] = True
+            connection[id] = True
+            start_events[id].set()
+        elif kind == "connection":
+            connection[id] = payload[0]
+        elif kind == "unassign":
+            id_assigned[id] = False
+        elif kind == "input":
+            # callbacks run between two awaits of the game loop, HUMAN_INPUT_LOCK is not needed
+            apply_input(id, payload[0])
+        elif kind == "metrics":
+            conn.send(("metrics", id, METRICS.collect()))
+        else:
+            logger.error(f"unknown message {kind} for game {id}")
+
+    attach_reader(conn, handle_front_message, lambda: closed.set_result(None))
+    tasks = [asyncio.create_task(in_game_log(id, shard_game(id, conn, start_events[id]))) for id in game_ids]
+    tasks += [asyncio.create_task(forward_state(id, conn)) for id in game_ids]
+    tasks += [asyncio.create_task(in_game_log(id, react(id))) for id in game_ids]
+    tasks += [asyncio.create_task(in_game_log(id, reflection(id))) for id in game_ids]
+    tasks += [asyncio.create_task(in_game_log(id, urgent_response(id))) for id in game_ids]
+    await closed
+    logger.info(f"front end closed, shard of games {game_ids} exits")
+
+
+async def shard_game(id, conn, start_event):
+    while True:
+        await start_event.wait()
+        start_event.clear()
+        episode_end = False
+        try:
+            episode_end = await play_episode(id)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            raise
+        except:
+            is_game_healthy[id] = False
+        rule_agents[id] = None
+        id_assigned[id] = False
+        flush_state(id, conn)
+        conn.send(("end", id, episode_end, is_game_healthy[id]))
+
+
+def flush_state(id, conn):
+    if updated[id]:
+        conn.send(("state", id, state[id]))
+        updated[id] = False
+
+
+async def forward_state(id, conn):
+    while True:
+        flush_state(id, conn)
+        await asyncio.sleep(STEP_INTERVAL / 10)
+
+
 if __name__ == "__main__":
-    logger.remove()
-    logger.add(sys.stdout, level="INFO")
-    os.makedirs("logs", exist_ok=True)
-    logger.add("logs/day4.log", level="TRACE")
-    logger.add("logs/day4_less.log", level="INFO")
-    args, conf, env_conf, _ = parse_args(create_parser())
+    setup_game_logging("day4", range(MAX_GAME))
+    parser = create_parser()
+    parser.add_argument(
+        "--shards", default=0, type=int, help="number of game processes, 0 runs all games on the server loop"
+    )
+    args, conf, env_conf, _ = parse_args(parser)
 
     utils.set_random_seed(args.seed)
 
@@ -1274,14 +1583,10 @@ if __name__ == "__main__":
 
     MODEL = args.model
     FSM = args.fsm
+    SKIP_RENDER_WHEN_BEHIND = args.skip_render_when_behind
 
     reg_env_name = env_conf.name
     del env_conf["name"]
-    envs = [OvercookedMaker(**env_conf, display=True) for _ in range(MAX_GAME)]
-    [env.reset() for env in envs]
-
-    action_spaces = envs[0].action_spaces
-    controllers = [MultiController(action_spaces) for _ in range(MAX_GAME)]
 
     num_episodes = 1
     render_mode = "rgb_array"
@@ -1297,7 +1602,9 @@ if __name__ == "__main__":
 
     state = [None for _ in range(MAX_GAME)]
     updated = [False for _ in range(MAX_GAME)]
-    traj_infos = [None for _ in range(MAX_GAME)]
+    traj_writers = [None for _ in range(MAX_GAME)]
+    tick_profilers = [TickProfiler.from_env() for _ in range(MAX_GAME)]
+    total_scores = [0 for _ in range(MAX_GAME)]
 
     globalstate = False
 
@@ -1311,15 +1618,9 @@ if __name__ == "__main__":
     lost_time = [0 for _ in range(MAX_GAME)]
     id_name_phone_list = [None for _ in range(MAX_GAME)]
 
-    agent_text_actions = [{a_i: [] for a_i in range(env._env.num_agents)} for env in envs]
-    agent_mid_actions = [{a_i: [] for a_i in range(env._env.num_agents)} for env in envs]
-
     #! remember to change back to 0
     game_phases = [-1 for _ in range(MAX_GAME)]  # 0 is trail
 
-    text_agents = [TextAgent(envs[idx]._env.unwrapped.world, llm_idxs[idx]) for idx in range(MAX_GAME)]
-
-    mid_agents = [MidAgent(text_agents[idx], envs[idx]._env.unwrapped.world) for idx in range(MAX_GAME)]
     rule_agents = [None] * MAX_GAME
     game_sequence = [None for _ in range(MAX_GAME)]
     last_phases = [0 for _ in range(MAX_GAME)]
@@ -1332,6 +1633,15 @@ if __name__ == "__main__":
     last_delivered_count = [0 for _ in range(MAX_GAME)]
     last_total_score = [0.0 for _ in range(MAX_GAME)]
 
+    # with --shards the games are simulated in forked processes and this process only routes their messages
+    shard_pool = None
+    shard_episodes = [None for _ in range(MAX_GAME)]
+    if args.shards > 0:
+        envs = [None for _ in range(MAX_GAME)]
+        shard_pool = ShardPool(args.shards, run_shard)
+    else:
+        create_games(list(range(MAX_GAME)))
+
     if not os.path.exists(progress_savepath):
         os.makedirs(os.path.dirname(progress_savepath), exist_ok=True)
         with open(progress_savepath, "w", encoding="utf-8") as f:
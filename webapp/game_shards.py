@@ -0,0 +1,98 @@
+"""
+Run groups of games in worker processes.
+
+Game `id` lives in shard `id % n_shards`. The front end keeps one duplex pipe per shard and both sides exchange
+`(kind, id, *payload)` tuples over it, read on their asyncio loop through `attach_reader` so that a slow tick of one
+shard never delays the event loop of another process.
+"""
+
+import asyncio
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Callable, List, Optional
+
+from loguru import logger
+
+
+def shard_of(game_id: int, n_shards: int) -> int:
+    return game_id % n_shards
+
+
+def shard_game_ids(shard_idx: int, n_shards: int, max_game: int) -> List[int]:
+    return [i for i in range(max_game) if shard_of(i, n_shards) == shard_idx]
+
+
+def attach_reader(conn: Connection, handler: Callable, on_closed: Optional[Callable] = None):
+    """
+    Call `handler(kind, id, *payload)` on the running loop for every message received on `conn`,
+    and `on_closed()` once the other end is gone.
+    """
+    loop = asyncio.get_running_loop()
+
+    def drain():
+        try:
+            while conn.poll():
+                handler(*conn.recv())
+        except (EOFError, OSError):
+            loop.remove_reader(conn.fileno())
+            if on_closed is not None:
+                on_closed()
+
+    loop.add_reader(conn.fileno(), drain)
+
+
+def _run_worker(target: Callable, shard_idx: int, conn: Connection, front_conns: List[Connection], args: tuple):
+    # the forked worker holds copies of the front-end ends, close them so that it sees EOF when the front end exits
+    for front_conn in front_conns:
+        front_conn.close()
+    target(shard_idx, conn, *args)
+
+
+class ShardPool:
+    """
+    Front-end side of the shards: starts `target(shard_idx, conn, *args)` in `n_shards` forked processes.
+
+    Fork is required because the workers inherit the configuration parsed by the front end instead of re-parsing it,
+    so create the pool before any window, thread or event loop exists in the front end.
+    """
+
+    def __init__(self, n_shards: int, target: Callable, args: tuple = ()):
+        ctx = multiprocessing.get_context("fork")
+        self.n_shards = n_shards
+        self.conns: List[Connection] = []
+        self.processes: List[multiprocessing.Process] = []
+        for shard_idx in range(n_shards):
+            front_conn, worker_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_run_worker,
+                args=(target, shard_idx, worker_conn, [*self.conns, front_conn], args),
+                daemon=True,
+            )
+            process.start()
+            worker_conn.close()
+            self.conns.append(front_conn)
+            self.processes.append(process)
+            logger.info(f"shard {shard_idx} started in process {process.pid}")
+
+    def send(self, kind: str, game_id: int, *payload):
+        self.conns[shard_of(game_id, self.n_shards)].send((kind, game_id, *payload))
+
+    def broadcast(self, kind: str, *payload):
+        """
+        Send `(kind, shard_idx, *payload)` to every shard.
+        """
+        for shard_idx, conn in enumerate(self.conns):
+            conn.send((kind, shard_idx, *payload))
+
+    def attach(self, handler: Callable, on_closed: Callable):
+        """
+        `on_closed(shard_idx)` is called when a worker exits.
+        """
+        for shard_idx, conn in enumerate(self.conns):
+            attach_reader(conn, handler, lambda shard_idx=shard_idx: on_closed(shard_idx))
+
+    def close(self):
+        for conn in self.conns:
+            conn.close()
+        for process in self.processes:
+            process.join(timeout=5)